@@ -0,0 +1,182 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Latency measurements and reports of the benchmarks.
+
+Latencies are recorded per operation by a LatencyRecorder and summarized
+as percentiles. A LoadRecorder also records failed operations, and the
+throughput, error rate and latencies of every interval of a run.
+
+Every benchmark run produces a JSON report, logged and, if
+CONF.share.benchmark_report_dir is set, written there under a name made of
+the benchmark kind, its subject, e.g. the backend and share type, and the
+time of the run, so that the reports of successive runs can be compared.
+"""
+
+import collections
+import contextlib
+import json
+import math
+import os
+import re
+import threading
+import time
+
+from oslo_log import log
+from tempest import config
+
+CONF = config.CONF
+LOG = log.getLogger(__name__)
+
+
+def percentile(values, fraction):
+    """Returns the 'fraction' percentile of 'values', interpolated.
+
+    :param values: non-empty list of numbers.
+    :param fraction: number between 0 and 1, e.g. 0.95 for the p95.
+    """
+    ordered = sorted(values)
+    rank = fraction * (len(ordered) - 1)
+    low, high = int(math.floor(rank)), int(math.ceil(rank))
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(durations):
+    """Returns the count, mean and percentiles of a list of durations."""
+    return {
+        'count': len(durations),
+        'min': min(durations),
+        'mean': sum(durations) / len(durations),
+        'p50': percentile(durations, 0.5),
+        'p95': percentile(durations, 0.95),
+        'p99': percentile(durations, 0.99),
+        'max': max(durations),
+    }
+
+
+class LatencyRecorder(object):
+    """Thread-safe record of the durations of operations, by name."""
+
+    def __init__(self):
+        self._durations = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, operation, duration):
+        with self._lock:
+            self._durations[operation].append(duration)
+
+    @contextlib.contextmanager
+    def measure(self, operation):
+        """Records the duration of the block, if it does not raise."""
+        start = time.time()
+        yield
+        self.record(operation, time.time() - start)
+
+    def summary(self):
+        """Returns the summary of the durations of every operation."""
+        with self._lock:
+            return dict((operation, summarize(durations))
+                        for operation, durations in self._durations.items())
+
+
+class LoadRecorder(object):
+    """Thread-safe record of the outcome of operations over time.
+
+    :param interval: length in seconds of the intervals of the timeline.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._start = time.time()
+        self._samples = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def measure(self, operation):
+        """Records the duration of the block and whether it raised."""
+        start = time.time()
+        try:
+            yield
+        except Exception:
+            self._add(operation, start, False)
+            raise
+        self._add(operation, start, True)
+
+    def _add(self, operation, start, succeeded):
+        with self._lock:
+            self._samples.append(
+                (start - self._start, operation, time.time() - start,
+                 succeeded))
+
+    @staticmethod
+    def _summarize(samples, duration):
+        by_operation = collections.defaultdict(list)
+        for _, operation, elapsed, succeeded in samples:
+            by_operation[operation].append((elapsed, succeeded))
+        summary = {}
+        for operation, outcomes in by_operation.items():
+            durations = [elapsed for elapsed, ok in outcomes if ok]
+            errors = len(outcomes) - len(durations)
+            summary[operation] = {
+                'count': len(outcomes),
+                'errors': errors,
+                'error_rate': float(errors) / len(outcomes),
+                'throughput': len(durations) / duration,
+                'latency': summarize(durations) if durations else None,
+            }
+        return summary
+
+    def summary(self):
+        """Returns the outcome of every operation over the whole run."""
+        with self._lock:
+            samples = list(self._samples)
+        duration = max(time.time() - self._start, 1e-6)
+        return self._summarize(samples, duration)
+
+    def timeline(self):
+        """Returns the outcome of every operation, interval by interval.
+
+        Operations are accounted in the interval they started in.
+        """
+        with self._lock:
+            samples = list(self._samples)
+        intervals = collections.defaultdict(list)
+        for sample in samples:
+            intervals[int(sample[0] // self.interval)].append(sample)
+        return [{'start': index * self.interval,
+                 'operations': self._summarize(
+                     intervals[index], self.interval)}
+                for index in sorted(intervals)]
+
+
+def write_report(kind, subject, report):
+    """Logs a benchmark report and writes it to the report directory.
+
+    :param kind: kind of benchmark, e.g. 'throughput'.
+    :param subject: what was benchmarked, e.g. 'nfs-backend1-default'.
+    :param report: JSON serializable dict.
+    :returns: path of the written report, or None if not written.
+    """
+    LOG.info("Benchmark report %(kind)s %(subject)s: %(report)s",
+             {'kind': kind, 'subject': subject,
+              'report': json.dumps(report, sort_keys=True)})
+    directory = CONF.share.benchmark_report_dir
+    if not directory:
+        return None
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    name = re.sub(r'[^\w.-]', '_', '%s-%s-%s-%d.json' % (
+        kind, subject, time.strftime('%Y%m%d%H%M%S'), os.getpid()))
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return path
@@ -0,0 +1,260 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Record and replay of the HTTP traffic of the share clients.
+
+In 'record' mode, every request of the share clients is sent as usual and
+its response is appended to the cassette of the test worker: a gzipped
+JSON lines file in CONF.share.http_cassette_dir. In 'replay' mode, no
+request reaches Manila; responses are served from the cassettes instead.
+
+Requests are matched by signature, i.e. their method and their URL
+relative to the endpoint of the client, and by sequence: the n-th request with
+a given signature gets the n-th response recorded for it. Status polls
+beyond the recorded ones get the last recorded response. Since the ids of
+the resources are part of the URLs, and come from the replayed responses,
+most requests match regardless of the order of the tests, but replays are
+only exact when the tests run in the recorded order, e.g. serially.
+"""
+
+import atexit
+import base64
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+
+from oslo_log import log
+import six
+from six.moves.urllib import parse as urlparse
+from tempest import config
+from tempest.lib import exceptions
+
+from manila_tempest_tests.common import waiters
+from manila_tempest_tests import share_exceptions
+
+CONF = config.CONF
+LOG = log.getLogger(__name__)
+
+CASSETTE_PATTERN = 'manila-cassette-*.jsonl.gz'
+
+
+def request_signature(method, url, endpoint=None):
+    """Returns the signature of a request, independent of its endpoint.
+
+    :param endpoint: URL of the endpoint the request is sent to, e.g.
+        'https://manila.example.com:8786/v2/<project id>', whose path is
+        stripped from the one of the request.
+    """
+    parsed = urlparse.urlsplit(url)
+    path = parsed.path
+    prefix = urlparse.urlsplit(endpoint).path.rstrip('/') if endpoint else ''
+    if prefix and (path == prefix or path.startswith(prefix + '/')):
+        path = path[len(prefix):]
+    path = path or '/'
+    if parsed.query:
+        path += '?' + urlparse.urlencode(
+            sorted(urlparse.parse_qsl(parsed.query, keep_blank_values=True)))
+    return '%s %s' % (method, path)
+
+
+def load_entries(directory):
+    """Returns the entries of all the cassettes of a directory.
+
+    Entries are dicts with the keys 'time', 'signature', 'status',
+    'reason', 'headers', 'body', 'latency', 'request_size' and
+    'response_size', sorted by the time they were recorded at.
+    """
+    entries = []
+    for path in glob.glob(os.path.join(directory, CASSETTE_PATTERN)):
+        with gzip.open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line.decode('utf-8')))
+    entries.sort(key=lambda entry: entry['time'])
+    return entries
+
+
+class CassetteResponse(dict):
+    """Replayed response, like the ones of tempest's HTTP transports."""
+
+    def __init__(self, url, entry):
+        super(CassetteResponse, self).__init__(entry['headers'])
+        self.status = entry['status']
+        self['status'] = str(self.status)
+        self.reason = entry['reason']
+        self.version = 11
+        self['content-location'] = url
+
+
+class CassetteWriter(object):
+    """Appends entries to a cassette, a gzipped JSON lines file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, entry):
+        line = (json.dumps(entry, separators=(',', ':')) + '\n').encode(
+            'utf-8')
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self.path, 'ab')
+                atexit.register(self.close)
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RecordingHttp(object):
+    """HTTP transport recording all the traffic of 'http'.
+
+    :param http: transport actually sending the requests.
+    :param writer: CassetteWriter of the cassette to record to.
+    :param endpoint: optional callable returning the endpoint URL of the
+        client, see request_signature().
+    """
+
+    def __init__(self, http, writer, endpoint=None):
+        self.http = http
+        self.writer = writer
+        self.endpoint = endpoint
+        self.stats = getattr(http, 'stats', None)
+
+    def request(self, url, method, **kwargs):
+        start = time.time()
+        resp, data = self.http.request(url, method, **kwargs)
+        latency = time.time() - start
+        if not kwargs.get('preload_content', True):
+            return resp, data
+        body = kwargs.get('body')
+        entry = {
+            'time': start,
+            'signature': request_signature(
+                method, url, self.endpoint and self.endpoint()),
+            'status': resp.status,
+            'reason': resp.reason,
+            'headers': dict((k, v) for k, v in resp.items()
+                            if k not in ('status', 'content-location')),
+            'latency': latency,
+            'request_size': len(body) if isinstance(
+                body, (six.binary_type, six.text_type)) else 0,
+            'response_size': len(data or b''),
+        }
+        try:
+            entry['body'] = (data or b'').decode('utf-8')
+        except UnicodeDecodeError:
+            entry['body'] = base64.b64encode(data).decode('ascii')
+            entry['body_encoding'] = 'base64'
+        self.writer.write(entry)
+        return resp, data
+
+
+class Cassette(object):
+    """Responses recorded in a directory, served in sequence.
+
+    :param directory: directory of the cassettes.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._responses = {}
+        self._served = {}
+        self._lock = threading.Lock()
+        for entry in load_entries(directory):
+            self._responses.setdefault(entry['signature'], []).append(entry)
+        LOG.info("Replaying %(count)d signatures recorded in %(dir)s.",
+                 {'count': len(self._responses), 'dir': directory})
+
+    def next_entry(self, method, signature):
+        """Returns the next entry recorded for a request signature."""
+        with self._lock:
+            recorded = self._responses.get(signature, [])
+            index = self._served.get(signature, 0)
+            self._served[signature] = index + 1
+        if index >= len(recorded) and not (method == 'GET' and recorded):
+            raise share_exceptions.ResponseNotRecorded(
+                signature=signature, index=index, directory=self.directory)
+        return recorded[min(index, len(recorded) - 1)]
+
+
+class ReplayingHttp(object):
+    """HTTP transport serving the responses of a cassette.
+
+    :param cassette: Cassette of the recorded responses.
+    :param time_scale: factor applied to the recorded latencies, which are
+        slept through before returning the responses. 0 returns at once.
+    :param endpoint: optional callable returning the endpoint URL of the
+        client, see request_signature().
+    """
+
+    stats = None
+
+    def __init__(self, cassette, time_scale=0.0, endpoint=None):
+        self.cassette = cassette
+        self.time_scale = time_scale
+        self.endpoint = endpoint
+
+    def request(self, url, method, **kwargs):
+        entry = self.cassette.next_entry(method, request_signature(
+            method, url, self.endpoint and self.endpoint()))
+        if self.time_scale:
+            time.sleep(entry['latency'] * self.time_scale)
+        body = entry['body'].encode('utf-8')
+        if entry.get('body_encoding') == 'base64':
+            body = base64.b64decode(body)
+        return CassetteResponse(url, entry), body
+
+
+_writer = None
+_cassettes = {}
+_registry_lock = threading.Lock()
+
+
+def get_http(http, endpoint=None):
+    """Wraps the transport 'http' as per CONF.share.http_cassette_mode.
+
+    Clients of a process share the same cassette.
+
+    :param endpoint: optional callable returning the endpoint URL of the
+        client, whose path is left out of the request signatures.
+    """
+    mode = CONF.share.http_cassette_mode
+    if mode == 'off':
+        return http
+    directory = CONF.share.http_cassette_dir
+    if not directory:
+        raise exceptions.InvalidConfiguration(
+            "'http_cassette_dir' must be set to %s HTTP traffic." % mode)
+    global _writer
+    with _registry_lock:
+        if mode == 'record':
+            if _writer is None:
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                _writer = CassetteWriter(os.path.join(
+                    directory,
+                    CASSETTE_PATTERN.replace('*', str(os.getpid()))))
+            return RecordingHttp(http, _writer, endpoint=endpoint)
+        scale = CONF.share.http_replay_time_scale
+        if directory not in _cassettes:
+            _cassettes[directory] = Cassette(directory)
+            waiters.set_time_scale(scale)
+        return ReplayingHttp(_cassettes[directory], scale, endpoint=endpoint)
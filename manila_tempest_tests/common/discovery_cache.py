@@ -0,0 +1,150 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Process-wide cache of the deployment data looked up by the tests.
+
+Services, pools, availability zones and share types rarely change during a
+run, yet every test class used to list them again. Entries expire after
+CONF.share.discovery_cache_ttl seconds, and can optionally be persisted to
+CONF.share.discovery_cache_file so that parallel workers share them.
+
+Share types are dropped from the cache by the client methods changing or
+deleting them, and services and pools by the ones enabling or disabling
+services. Services changing state outside of the tests, e.g. because of an
+outage, are only seen once their entries expire.
+"""
+
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+
+from oslo_log import log
+from tempest import config
+
+CONF = config.CONF
+LOG = log.getLogger(__name__)
+
+SERVICES = 'services'
+POOLS_DETAIL = 'pools/detail'
+
+
+def share_type_key(share_type_id):
+    return 'share_type=%s' % share_type_id
+
+
+def pools_for_share_type_key(share_type_id):
+    return 'pools/' + share_type_key(share_type_id)
+
+
+class DiscoveryCache(object):
+    """TTL cache of JSON-serializable API responses.
+
+    :param ttl: number of seconds an entry stays valid. 0 disables caching.
+    :param path: optional file in which entries are persisted. Writes are
+        atomic, so concurrent workers only risk losing each other's entries,
+        which are then fetched again.
+    """
+
+    def __init__(self, ttl, path=None):
+        self.ttl = ttl
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, entry):
+        return entry is not None and time.time() - entry['time'] < self.ttl
+
+    def _read_file(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_file(self, update=None, remove=()):
+        entries = self._read_file()
+        removed = [entries.pop(key) for key in remove if key in entries]
+        if not (update or removed):
+            return
+        entries.update(update or {})
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            LOG.warning("Unable to persist the discovery cache to %(path)s: "
+                        "%(error)s", {'path': self.path, 'error': e})
+
+    def get(self, key, fetch):
+        """Returns the cached value of 'key', calling 'fetch' on a miss.
+
+        A deep copy is returned, so callers may modify it freely.
+        """
+        if not self.ttl:
+            return fetch()
+        with self._lock:
+            entry = self._entries.get(key)
+            if not self._is_fresh(entry) and self.path:
+                entry = self._read_file().get(key)
+                if self._is_fresh(entry):
+                    self._entries[key] = entry
+            if not self._is_fresh(entry):
+                entry = {'time': time.time(), 'value': fetch()}
+                self._entries[key] = entry
+                if self.path:
+                    self._write_file(update={key: entry})
+            return copy.deepcopy(entry['value'])
+
+    def invalidate(self, *keys):
+        """Drops the given entries, from the persisted file too."""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            if self.path:
+                self._write_file(remove=keys)
+
+    def clear(self):
+        """Drops all the entries, from the persisted file too."""
+        with self._lock:
+            self._entries.clear()
+            if self.path:
+                self._write_file(remove=list(self._read_file()))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the DiscoveryCache of this process, as configured."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiscoveryCache(CONF.share.discovery_cache_ttl,
+                                    path=CONF.share.discovery_cache_file)
+        return _cache
+
+
+def invalidate_services():
+    """To be called after changing the state of share services."""
+    get_cache().invalidate(SERVICES, POOLS_DETAIL)
+
+
+def invalidate_share_type(share_type_id):
+    """To be called after changing or deleting a share type."""
+    get_cache().invalidate(share_type_key(share_type_id),
+                           pools_for_share_type_key(share_type_id))
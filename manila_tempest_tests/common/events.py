@@ -0,0 +1,255 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Sources of status change events, waking the waiters up early.
+
+Waiters sleep between two status checks. When an event source is
+configured, they sleep on it instead and check again as soon as an event
+about the awaited resources arrives. Without events, e.g. if notifications
+are lost, the sleeps simply last as long as usual, so the waiters fall back
+to polling.
+
+The 'notifications' source consumes the notifications Manila emits through
+oslo.messaging, which must then be installed. The 'fake_api' source follows
+the events endpoint of the fake API, whose resource store feeds a
+LocalEventSource. Other sources can be plugged in with set_event_source().
+"""
+
+import collections
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+
+from oslo_concurrency import lockutils
+from oslo_config import cfg
+from oslo_log import log
+from six.moves.urllib import parse as urlparse
+from six.moves.urllib import request as urlrequest
+from tempest import config
+from tempest.lib import exceptions
+
+CONF = config.CONF
+LOG = log.getLogger(__name__)
+
+# Payload keys of the Manila notifications holding ids of resources.
+NOTIFICATION_ID_KEYS = (
+    'share_id', 'snapshot_id', 'share_instance_id', 'snapshot_instance_id',
+    'share_replica_id', 'replica_id', 'access_id', 'share_group_id',
+    'share_group_snapshot_id',
+)
+NOTIFICATION_PREFIXES = ('share', 'snapshot', 'access', 'consistency')
+
+
+class EventSource(object):
+    """Dispatches status change events to the threads waiting on them.
+
+    Every event bumps a counter of the resource it is about. Waiters read
+    the counters of their resources with version() before checking the
+    status, then block in wait() until the counters change, so that an
+    event arriving during the check is not missed.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._counters = collections.defaultdict(int)
+
+    def start(self):
+        """Starts receiving events."""
+
+    def stop(self):
+        """Stops receiving events."""
+
+    def publish(self, resource_type, resource_id, status=None):
+        """Records an event about a resource and wakes its waiters."""
+        LOG.debug("Status event for %(type)s %(id)s: %(status)s.",
+                  {'type': resource_type, 'id': resource_id,
+                   'status': status})
+        with self._condition:
+            self._counters[resource_id] += 1
+            self._condition.notify_all()
+
+    def version(self, resource_ids):
+        """Returns the number of events received about 'resource_ids'."""
+        with self._condition:
+            return sum(self._counters.get(rid, 0) for rid in resource_ids)
+
+    def wait(self, resource_ids, version, timeout):
+        """Waits for an event about 'resource_ids' newer than 'version'.
+
+        Events about other resources do not end the wait.
+
+        :returns: True if such an event arrived before 'timeout' seconds.
+        """
+        deadline = time.time() + timeout
+        with self._condition:
+            while self.version(resource_ids) == version:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self.version(resource_ids) != version
+
+
+class LocalEventSource(EventSource):
+    """Event source fed by the process itself, e.g. by a fake API."""
+
+
+class HttpEventSource(EventSource):
+    """Event source following the events endpoint of the fake API.
+
+    The endpoint keeps the counters, version() reads them and wait()
+    long-polls it. If it cannot be reached, wait() sleeps for its whole
+    timeout, so the waiters fall back to polling.
+
+    :param url: URL of the events endpoint.
+    """
+
+    # Seconds an answer may take beyond the requested wait.
+    http_timeout = 10
+
+    def __init__(self, url):
+        super(HttpEventSource, self).__init__()
+        self.url = url
+
+    def _get(self, resource_ids, **params):
+        params['resource_ids'] = ','.join(resource_ids)
+        url = '%s?%s' % (self.url, urlparse.urlencode(sorted(
+            params.items())))
+        response = urlrequest.urlopen(
+            url, timeout=params.get('timeout', 0) + self.http_timeout)
+        try:
+            return json.loads(response.read().decode('utf-8'))['version']
+        finally:
+            response.close()
+
+    def version(self, resource_ids):
+        try:
+            return self._get(resource_ids)
+        except (IOError, ValueError, KeyError) as e:
+            LOG.warning("Cannot read the events of %(ids)s from %(url)s: "
+                        "%(error)s", {'ids': resource_ids, 'url': self.url,
+                                      'error': e})
+            return None
+
+    def wait(self, resource_ids, version, timeout):
+        if version is not None:
+            try:
+                return self._get(resource_ids, version=version,
+                                 timeout=timeout) != version
+            except (IOError, ValueError, KeyError) as e:
+                LOG.warning("Cannot wait for the events of %(ids)s from "
+                            "%(url)s: %(error)s",
+                            {'ids': resource_ids, 'url': self.url,
+                             'error': e})
+        if timeout > 0:
+            time.sleep(timeout)
+        return False
+
+
+class NotificationEventSource(EventSource):
+    """Event source consuming the oslo.messaging notifications of Manila.
+
+    Every worker listens in a pool of its own, to get a copy of every
+    notification instead of a share of them. The pools are numbered slots
+    taken with a file lock in 'lock_path', so that the following runs
+    reuse them instead of leaving new queues behind on the bus.
+
+    :param url: transport URL of the notification bus.
+    :param topic: notification topic Manila emits to.
+    :param lock_path: directory of the locks of the pool slots.
+    """
+
+    pool_prefix = 'manila-tempest'
+
+    def __init__(self, url, topic='notifications', lock_path=None):
+        super(NotificationEventSource, self).__init__()
+        self.url = url
+        self.topic = topic
+        self.lock_path = lock_path or tempfile.gettempdir()
+        self._listener = None
+        self._slot_lock = None
+
+    def _acquire_pool(self):
+        """Takes the first free pool slot and returns the pool name."""
+        for slot in itertools.count():
+            name = '%s-%d' % (self.pool_prefix, slot)
+            lock = lockutils.InterProcessLock(
+                os.path.join(self.lock_path, name + '.lock'))
+            if lock.acquire(blocking=False):
+                self._slot_lock = lock
+                return name
+
+    def start(self):
+        try:
+            import oslo_messaging
+        except ImportError:
+            raise exceptions.InvalidConfiguration(
+                "oslo.messaging must be installed to use the "
+                "'notifications' waiter event source.")
+        transport = oslo_messaging.get_notification_transport(
+            cfg.ConfigOpts(), url=self.url)
+        self._listener = oslo_messaging.get_notification_listener(
+            transport, [oslo_messaging.Target(topic=self.topic)], [self],
+            executor='threading', pool=self._acquire_pool())
+        self._listener.start()
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener.wait()
+            self._listener = None
+        if self._slot_lock is not None:
+            self._slot_lock.release()
+            self._slot_lock = None
+
+    def info(self, ctxt, publisher_id, event_type, payload, metadata):
+        if not event_type.startswith(NOTIFICATION_PREFIXES):
+            return
+        resource_type = event_type.split('.')[0]
+        for key in NOTIFICATION_ID_KEYS:
+            if payload.get(key):
+                self.publish(resource_type, payload[key],
+                             payload.get('status'))
+
+    error = info
+
+
+_source = None
+_source_lock = threading.Lock()
+
+
+def set_event_source(source):
+    """Makes the waiters of this process use 'source', None disables it."""
+    global _source
+    with _source_lock:
+        _source = source
+
+
+def get_event_source():
+    """Returns the event source of this process, or None if disabled."""
+    global _source
+    if _source is None and CONF.share.waiter_event_source != 'none':
+        with _source_lock:
+            if _source is None:
+                if CONF.share.waiter_event_source == 'fake_api':
+                    source = HttpEventSource(CONF.share.waiter_events_url)
+                else:
+                    source = NotificationEventSource(
+                        CONF.share.waiter_notifications_url,
+                        topic=CONF.share.waiter_notifications_topic,
+                        lock_path=lockutils.get_lock_path(CONF))
+                source.start()
+                _source = source
+    return _source
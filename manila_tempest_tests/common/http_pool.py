@@ -0,0 +1,165 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+import urllib3
+from urllib3 import connectionpool
+
+
+class PoolStatistics(object):
+    """Thread-safe counters of a pooled HTTP transport."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.new_connections = 0
+        self.waits = 0
+
+    def increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @property
+    def hits(self):
+        """Number of requests served by an already open connection."""
+        return max(self.checkouts - self.new_connections, 0)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.checkouts,
+                'hits': self.hits,
+                'new_connections': self.new_connections,
+                'waits': self.waits,
+            }
+
+
+class _StatisticsMixin(object):
+    stats = None
+
+    def _new_conn(self):
+        if self.stats is not None:
+            self.stats.increment('new_connections')
+        return super(_StatisticsMixin, self)._new_conn()
+
+    def _get_conn(self, timeout=None):
+        if self.stats is not None:
+            self.stats.increment('checkouts')
+            if self.block and self.pool is not None and self.pool.empty():
+                self.stats.increment('waits')
+        return super(_StatisticsMixin, self)._get_conn(timeout=timeout)
+
+
+class HTTPConnectionPool(_StatisticsMixin, connectionpool.HTTPConnectionPool):
+    pass
+
+
+class HTTPSConnectionPool(_StatisticsMixin,
+                          connectionpool.HTTPSConnectionPool):
+    pass
+
+
+class PooledHttp(urllib3.PoolManager):
+    """Keep-alive replacement for tempest's ClosingHttp.
+
+    Unlike ClosingHttp, it neither asks the server to close the connection
+    after every request nor drops its pools, so connections (and their TLS
+    sessions) are reused by subsequent requests to the same endpoint.
+    """
+
+    def __init__(self, disable_ssl_certificate_validation=False,
+                 ca_certs=None, timeout=None, follow_redirects=True,
+                 maxsize=10, block=False):
+        self.follow_redirects = follow_redirects
+        self.stats = PoolStatistics()
+        kwargs = {'maxsize': maxsize, 'block': block}
+
+        if disable_ssl_certificate_validation:
+            urllib3.disable_warnings()
+            kwargs['cert_reqs'] = 'CERT_NONE'
+        elif ca_certs:
+            kwargs['cert_reqs'] = 'CERT_REQUIRED'
+            kwargs['ca_certs'] = ca_certs
+
+        if timeout:
+            kwargs['timeout'] = timeout
+
+        super(PooledHttp, self).__init__(**kwargs)
+        self.pool_classes_by_scheme = {
+            'http': HTTPConnectionPool,
+            'https': HTTPSConnectionPool,
+        }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super(PooledHttp, self)._new_pool(
+            scheme, host, port, request_context=request_context)
+        pool.stats = self.stats
+        return pool
+
+    def request(self, url, method, *args, **kwargs):
+
+        class Response(dict):
+            def __init__(self, info):
+                for key, value in info.getheaders().items():
+                    self[str(key).lower()] = value
+                self.status = info.status
+                self['status'] = str(self.status)
+                self.reason = info.reason
+                self.version = info.version
+                self['content-location'] = url
+
+        if self.follow_redirects:
+            retry = urllib3.util.Retry(raise_on_redirect=False, redirect=5)
+        else:
+            retry = urllib3.util.Retry(redirect=False)
+        r = super(PooledHttp, self).request(method, url, retries=retry,
+                                            *args, **kwargs)
+        if not kwargs.get('preload_content', True):
+            return r, b''
+        return Response(r), r.data
+
+
+_shared_pools = {}
+_shared_pools_lock = threading.Lock()
+
+
+def get_shared_http(disable_ssl_certificate_validation=False, ca_certs=None,
+                    timeout=None, follow_redirects=True, maxsize=10,
+                    block=False):
+    """Returns the PooledHttp shared by clients with the same settings.
+
+    Clients of the same endpoint, e.g. the primary, alt and admin share
+    clients, thus reuse the same keep-alive connections.
+    """
+    key = (disable_ssl_certificate_validation, ca_certs, timeout,
+           follow_redirects, maxsize, block)
+    with _shared_pools_lock:
+        if key not in _shared_pools:
+            _shared_pools[key] = PooledHttp(
+                disable_ssl_certificate_validation=(
+                    disable_ssl_certificate_validation),
+                ca_certs=ca_certs, timeout=timeout,
+                follow_redirects=follow_redirects, maxsize=maxsize,
+                block=block)
+        return _shared_pools[key]
+
+
+def get_statistics():
+    """Returns the statistics of all shared pools, summed up."""
+    totals = {'requests': 0, 'hits': 0, 'new_connections': 0, 'waits': 0}
+    with _shared_pools_lock:
+        pools = list(_shared_pools.values())
+    for http in pools:
+        for key, value in http.stats.as_dict().items():
+            totals[key] += value
+    return totals
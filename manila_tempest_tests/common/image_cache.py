@@ -0,0 +1,139 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""On-disk cache of the guest images downloaded by the scenario tests.
+
+Images are stored under a name derived from their URL and expected
+checksum, so that they are downloaded once and reused by all the tests and
+runs on a host, until the configured checksum changes. Downloads are
+streamed in bounded chunks and hashed on the fly, and only land in the
+cache once verified. The MD5 checksum of every cached image, which is the
+one Glance reports, is recorded beside it, so that an image already
+uploaded to Glance can be found without hashing the file again.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from oslo_concurrency import lockutils
+from oslo_log import log
+from six.moves.urllib import parse
+from six.moves.urllib.request import urlopen
+from tempest import config
+from tempest.lib import exceptions
+
+CONF = config.CONF
+LOG = log.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def parse_checksum(checksum):
+    """Splits 'algorithm:hexdigest' into its parts, SHA-256 by default."""
+    if not checksum:
+        return None, None
+    algorithm, _, digest = checksum.rpartition(':')
+    algorithm = (algorithm or 'sha256').lower()
+    if algorithm not in hashlib.algorithms_available:
+        raise exceptions.InvalidConfiguration(
+            "Unsupported image checksum algorithm %s." % algorithm)
+    return algorithm, digest.lower()
+
+
+class ImageCache(object):
+    """Directory of downloaded images, keyed by URL and checksum.
+
+    :param directory: directory holding the cached images, shared by all
+        the workers and runs on a host.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, url, digest):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+        name = os.path.basename(parse.urlparse(url).path)
+        return os.path.join(self.directory, 'manila-image-%s-%s-%s' % (
+            key, (digest or 'unverified')[:16], name))
+
+    def fetch(self, url, checksum=None):
+        """Returns a local copy of the image at 'url', downloading it once.
+
+        :param url: URL of the image.
+        :param checksum: optional 'algorithm:hexdigest' the image must
+            match, e.g. 'sha256:...'. Without it, a cached copy is trusted
+            as long as the URL does not change.
+        :returns: a (path, md5 hexdigest) tuple.
+        """
+        algorithm, digest = parse_checksum(checksum)
+        path = self._path(url, digest)
+        with lockutils.lock(os.path.basename(path) + '.lock', external=True,
+                            lock_path=self.directory):
+            try:
+                with open(path + '.md5') as f:
+                    md5 = f.read().strip()
+                if md5 and os.path.exists(path):
+                    LOG.info('Using cached image %s.', path)
+                    return path, md5
+            except IOError:
+                pass
+            md5 = self._download(url, path, algorithm, digest)
+            with open(path + '.md5', 'w') as f:
+                f.write(md5)
+            return path, md5
+
+    def _download(self, url, path, algorithm, digest):
+        LOG.info('Downloading image %(url)s to %(path)s.',
+                 {'url': url, 'path': path})
+        md5 = hashlib.md5()
+        verifier = hashlib.new(algorithm) if algorithm else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                response = urlopen(url)
+                try:
+                    while True:
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        md5.update(chunk)
+                        if verifier is not None:
+                            verifier.update(chunk)
+                        f.write(chunk)
+                finally:
+                    response.close()
+            if verifier is not None and verifier.hexdigest() != digest:
+                raise exceptions.TempestException(
+                    "Image %(url)s does not match its %(algorithm)s "
+                    "checksum: expected %(expected)s, got %(actual)s." % {
+                        'url': url, 'algorithm': algorithm,
+                        'expected': digest, 'actual': verifier.hexdigest()})
+            os.rename(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return md5.hexdigest()
+
+
+def get_cache():
+    """Returns the image cache of this host."""
+    directory = (CONF.share.image_cache_dir or
+                 os.path.join(tempfile.gettempdir(), 'manila-tempest-images'))
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+    return ImageCache(directory)
@@ -0,0 +1,149 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Timing of the requests and waits made by the share clients.
+
+When CONF.share.instrumentation_enabled is set, every request of the share
+clients and every waiter invocation is recorded by the collector of the
+process. If CONF.share.instrumentation_dir is set too, each worker dumps its
+records there as JSON and CSV files when it exits.
+"""
+
+import atexit
+import csv
+import json
+import os
+import re
+import threading
+import time
+
+from six.moves.urllib import parse as urlparse
+from tempest import config
+
+CONF = config.CONF
+
+REQUEST_FIELDS = ('time', 'method', 'url', 'microversion', 'status',
+                  'latency', 'request_size', 'response_size')
+WAIT_FIELDS = ('time', 'resource_type', 'target_status', 'polls', 'duration',
+               'final_state')
+
+_ID_REGEX = re.compile(
+    r'^([0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}|'
+    r'[0-9a-f]{32}|\d+)$', re.IGNORECASE)
+
+
+def url_template(url):
+    """Returns the path of 'url' with ids replaced by '{id}'.
+
+    Query parameters are kept by name only, so requests of the same kind
+    share the same template.
+    """
+    parsed = urlparse.urlparse(url)
+    path = '/'.join(
+        '{id}' if _ID_REGEX.match(segment) else segment
+        for segment in parsed.path.split('/'))
+    if parsed.query:
+        names = sorted(set(name for name, _ in urlparse.parse_qsl(
+            parsed.query, keep_blank_values=True)))
+        path += '?' + '&'.join(names)
+    return path
+
+
+class Collector(object):
+    """In-memory, thread-safe store of request and wait records."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = []
+        self.waits = []
+
+    def record_request(self, method, url, microversion, status, latency,
+                       request_size, response_size):
+        record = dict(zip(REQUEST_FIELDS, (
+            time.time(), method, url_template(url), microversion, status,
+            latency, request_size, response_size)))
+        with self._lock:
+            self.requests.append(record)
+
+    def record_wait(self, resource_type, target_status, polls, duration,
+                    final_state):
+        record = dict(zip(WAIT_FIELDS, (
+            time.time(), resource_type, target_status, polls, duration,
+            final_state)))
+        with self._lock:
+            self.waits.append(record)
+
+    def dump_json(self, path):
+        with self._lock:
+            data = {'requests': list(self.requests),
+                    'waits': list(self.waits)}
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    def dump_csv(self, requests_path, waits_path):
+        with self._lock:
+            dumps = ((requests_path, REQUEST_FIELDS, list(self.requests)),
+                     (waits_path, WAIT_FIELDS, list(self.waits)))
+        for path, fields, records in dumps:
+            with open(path, 'w') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(records)
+
+    def dump(self, directory):
+        """Dumps the records of this process as JSON and CSV files."""
+        prefix = os.path.join(directory, 'manila-timings-%d' % os.getpid())
+        self.dump_json(prefix + '.json')
+        self.dump_csv(prefix + '-requests.csv', prefix + '-waits.csv')
+
+
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def get_collector():
+    """Returns the collector of this process, or None if disabled."""
+    global _collector
+    if _collector is None and CONF.share.instrumentation_enabled:
+        with _collector_lock:
+            if _collector is None:
+                _collector = Collector()
+                if CONF.share.instrumentation_dir:
+                    atexit.register(
+                        _collector.dump, CONF.share.instrumentation_dir)
+    return _collector
+
+
+class WaitRecorder(object):
+    """Counts the polls of a waiter and records it once it is over."""
+
+    def __init__(self, resource_type, target_status):
+        self.resource_type = resource_type
+        self.target_status = target_status
+        self.polls = 0
+        self.final_state = None
+        self._start = time.time()
+
+    def poll(self):
+        self.polls += 1
+
+    def finish(self, outcome=None):
+        collector = get_collector()
+        if collector is None:
+            return
+        final_state = self.final_state
+        if outcome is not None:
+            final_state = ('%s (%s)' % (outcome, final_state)
+                           if final_state is not None else outcome)
+        collector.record_wait(
+            self.resource_type, self.target_status, self.polls,
+            time.time() - self._start, final_state)
@@ -12,6 +12,8 @@
 
 import six
 import sys
+import threading
+import uuid
 
 from oslo_log import log
 
@@ -56,6 +58,73 @@ def debug_ssh(function):
     return wrapper
 
 
+def exec_commands(ssh_client, commands):
+    """Runs several commands in a single SSH round trip.
+
+    The commands are chained, so that the first failing one stops the
+    others and raises SSHExecCommandFailed like exec_command does.
+
+    :param ssh_client: client with an exec_command method.
+    :param commands: list of command strings.
+    :returns: list of the outputs of the commands.
+    """
+    marker = 'manila-tempest-%s' % uuid.uuid4().hex
+    script = ' && '.join('{ %s; } && echo %s' % (cmd, marker)
+                         for cmd in commands)
+    output = ssh_client.exec_command(script)
+    return output.split(marker + '\n')[:len(commands)]
+
+
+class _SharedConnection(object):
+    """Paramiko client which outlives the calls closing it."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def get_transport(self):
+        return self.connection.get_transport()
+
+    def close(self):
+        pass
+
+
+class PersistentSSHClient(ssh.Client):
+    """SSH client keeping its connection open between commands.
+
+    tempest's client opens a new connection, i.e. a full SSH handshake,
+    for every command. This one opens a single authenticated connection
+    and runs every command on its own channel of it. It is reopened if it
+    drops, and must be closed with close().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(PersistentSSHClient, self).__init__(*args, **kwargs)
+        self._connection = None
+        self._connection_lock = threading.Lock()
+
+    def _get_ssh_connection(self, *args, **kwargs):
+        with self._connection_lock:
+            transport = (self._connection.get_transport()
+                         if self._connection is not None else None)
+            if transport is None or not transport.is_active():
+                if self._connection is not None:
+                    self._connection.close()
+                self._connection = super(
+                    PersistentSSHClient, self)._get_ssh_connection(
+                        *args, **kwargs)
+            return _SharedConnection(self._connection)
+
+    def exec_commands(self, commands):
+        return exec_commands(self, commands)
+
+    def close(self):
+        """Closes the connection, if open."""
+        with self._connection_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
 class RemoteClient(object):
 
     def __init__(self, ip_address, username, password=None, pkey=None,
@@ -73,7 +142,8 @@ class RemoteClient(object):
         self.servers_client = servers_client
         self.log_console = CONF.compute_feature_enabled.console_output
 
-        self.ssh_client = ssh.Client(ip_address, username, password, pkey=pkey)
+        self.ssh_client = PersistentSSHClient(ip_address, username, password,
+                                              pkey=pkey)
 
     @debug_ssh
     def exec_command(self, cmd):
@@ -90,3 +160,12 @@ class RemoteClient(object):
            This method raises an Exception when the validation fails.
         """
         self.ssh_client.test_connection_auth()
+
+    @debug_ssh
+    def exec_commands(self, commands):
+        """Runs several commands in a single round trip, see exec_command."""
+        return exec_commands(self, commands)
+
+    def close(self):
+        """Closes the SSH connection to the VM."""
+        self.ssh_client.close()
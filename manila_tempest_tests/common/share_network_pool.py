@@ -0,0 +1,145 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Registry of the reusable share networks shared by the test workers.
+
+Every reusable share network is recorded in a file named after its key,
+e.g. the tenant and kind of network it was made for. Checking one out is a
+single file read. Only when a record is missing does a worker provision
+the share network, after taking a lease on the key: an exclusively
+created file, which the other workers wait on instead of taking a global
+lock. Leases of crashed workers expire after CONF.share.build_timeout.
+"""
+
+import errno
+import os
+import re
+import tempfile
+import time
+
+from oslo_concurrency import lockutils
+from oslo_log import log
+from tempest import config
+
+from manila_tempest_tests.common import waiters
+
+CONF = config.CONF
+LOG = log.getLogger(__name__)
+
+
+class ShareNetworkPool(object):
+    """File-based registry of reusable share networks.
+
+    :param directory: directory shared by all the workers of a run.
+    :param lease_timeout: number of seconds after which a lease is deemed
+        abandoned and may be taken over by another worker.
+    :param backoff: BackoffPolicy used while waiting on another worker.
+    """
+
+    def __init__(self, directory, lease_timeout, backoff):
+        self.directory = directory
+        self.lease_timeout = lease_timeout
+        self.backoff = backoff
+
+    def _path(self, key, suffix):
+        name = re.sub(r'[^\w.-]', '_', key)
+        return os.path.join(
+            self.directory, 'manila-share-network-%s.%s' % (name, suffix))
+
+    def _read(self, key):
+        try:
+            with open(self._path(key, 'id')) as f:
+                return f.read().strip() or None
+        except (IOError, OSError):
+            return None
+
+    def _write(self, key, share_network_id):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'w') as f:
+            f.write(share_network_id)
+        os.rename(tmp_path, self._path(key, 'id'))
+
+    def _discard(self, key):
+        try:
+            os.remove(self._path(key, 'id'))
+        except OSError:
+            pass
+
+    def _acquire_lease(self, key):
+        try:
+            os.close(os.open(self._path(key, 'lease'),
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            return False
+        return True
+
+    def _release_lease(self, key):
+        try:
+            os.remove(self._path(key, 'lease'))
+        except OSError:
+            pass
+
+    def _expire_abandoned_lease(self, key):
+        path = self._path(key, 'lease')
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            return
+        if age > self.lease_timeout:
+            LOG.warning("Taking over the lease on share network %s, "
+                        "abandoned %d seconds ago.", key, age)
+            self._release_lease(key)
+
+    def checkout(self, key, provision, is_valid=None):
+        """Returns the id of the share network registered under 'key'.
+
+        :param key: string identifying the kind of share network wanted.
+        :param provision: callable without arguments returning the id of a
+            suitable share network. It is called by a single worker at a
+            time, when no valid share network is registered yet.
+        :param is_valid: optional predicate on a registered id, telling
+            whether the share network can still be used.
+        """
+        def attempt():
+            share_network_id = self._read(key)
+            if share_network_id is not None:
+                if is_valid is None or is_valid(share_network_id):
+                    return share_network_id
+                self._discard(key)
+            if not self._acquire_lease(key):
+                self._expire_abandoned_lease(key)
+                return None
+            try:
+                # Another worker may have registered one meanwhile.
+                share_network_id = self._read(key)
+                if share_network_id is None:
+                    share_network_id = provision()
+                    self._write(key, share_network_id)
+                return share_network_id
+            finally:
+                self._release_lease(key)
+
+        return waiters.wait_until(
+            attempt, self.lease_timeout * 2, self.backoff,
+            timeout_message="Share network %s was not provisioned in "
+                            "time." % key)
+
+
+def get_pool():
+    """Returns the pool of share networks shared by the workers of a run."""
+    directory = (CONF.share.share_network_pool_dir or
+                 lockutils.get_lock_path(CONF) or tempfile.gettempdir())
+    return ShareNetworkPool(
+        directory, CONF.share.build_timeout,
+        waiters.get_backoff_policy(CONF.share.build_interval))
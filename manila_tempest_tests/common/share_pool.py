@@ -0,0 +1,130 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Pool of the shares reused by the test classes of a worker.
+
+Test classes which only read their shares lease them instead of creating
+their own. A share is leased by one class at a time, and is returned to
+the pool when the class is done with it. Shares are keyed by the spec
+they were created with, so that only classes asking for the same kind of
+share reuse them. Before every lease, the share is reset, e.g. its
+leftover access rules are removed, or dropped from the pool if it is no
+longer usable. The pooled shares are deleted when the worker exits.
+"""
+
+import collections
+import json
+import threading
+
+from oslo_log import log
+from tempest.lib import exceptions
+
+LOG = log.getLogger(__name__)
+
+
+def spec_key(project_id, **spec):
+    """Returns the pool key of shares created with 'spec' by a project."""
+    return json.dumps([project_id, spec], sort_keys=True)
+
+
+class SharePool(object):
+    """In-memory pool of the reusable shares of a test worker."""
+
+    def __init__(self):
+        self._idle = collections.defaultdict(list)
+        self._leased = {}
+        self._lock = threading.Lock()
+
+    def lease(self, key, client, create, reset=None):
+        """Leases a share matching 'key', creating it if none is idle.
+
+        :param key: pool key of the wanted share, see spec_key().
+        :param client: shares client of the leaser, used to delete the
+            share when the worker exits.
+        :param create: callable without arguments returning a new share,
+            available and matching 'key'.
+        :param reset: optional callable receiving an idle share and
+            returning it ready for a new lease, or None if it can no longer
+            be leased, in which case it is deleted.
+        :returns: the leased share dict.
+        """
+        while True:
+            with self._lock:
+                if not self._idle[key]:
+                    break
+                share, _ = self._idle[key].pop()
+            try:
+                ready = reset(share) if reset is not None else share
+            except exceptions.TempestException:
+                LOG.exception("Failed to reset pooled share %s.", share['id'])
+                ready = None
+            if ready is not None:
+                with self._lock:
+                    self._leased[share['id']] = (key, ready, client)
+                LOG.debug("Leased pooled share %s.", share['id'])
+                return ready
+            LOG.info("Dropping pooled share %s.", share['id'])
+            self._delete([(share, client)])
+
+        share = create()
+        with self._lock:
+            self._leased[share['id']] = (key, share, client)
+        return share
+
+    def release(self, share_id):
+        """Returns a leased share to the pool."""
+        with self._lock:
+            key, share, client = self._leased.pop(share_id)
+            self._idle[key].append((share, client))
+
+    def forget(self, share_id):
+        """Removes a leased share from the pool, without deleting it."""
+        with self._lock:
+            self._leased.pop(share_id, None)
+
+    def clear(self):
+        """Deletes all the shares of the pool."""
+        with self._lock:
+            shares = [(share, client) for _, share, client in
+                      self._leased.values()]
+            for idle in self._idle.values():
+                shares.extend(idle)
+            self._leased.clear()
+            self._idle.clear()
+        self._delete(shares)
+
+    @staticmethod
+    def _delete(shares):
+        deleted = []
+        for share, client in shares:
+            try:
+                client.delete_share(share['id'])
+                deleted.append((share, client))
+            except exceptions.NotFound:
+                pass
+            except Exception:
+                LOG.exception("Failed to delete pooled share %s.",
+                              share['id'])
+        for share, client in deleted:
+            try:
+                client.wait_for_resource_deletion(share_id=share['id'])
+            except Exception:
+                LOG.exception("Failed to wait for the deletion of pooled "
+                              "share %s.", share['id'])
+
+
+_pool = SharePool()
+
+
+def get_pool():
+    """Returns the share pool of the test worker."""
+    return _pool
@@ -0,0 +1,97 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache of the share types reused by the test classes of a worker.
+
+Share types are keyed by their content, i.e. their extra specs and
+visibility, so that test classes asking for the same kind of share type
+get the same one instead of creating, and later deleting, their own. The
+cached share types are deleted when the worker exits.
+"""
+
+import copy
+import json
+import threading
+
+from oslo_log import log
+import six
+from tempest.lib import exceptions
+
+LOG = log.getLogger(__name__)
+
+
+def _spec_value(value):
+    """Returns a spec value as Manila compares it.
+
+    Boolean-like values are case insensitive, the others are kept as they
+    are, e.g. backend names or vendor specs.
+    """
+    value = six.text_type(value)
+    if value.lower() in ('true', 'false'):
+        return value.lower()
+    return value
+
+
+def type_key(extra_specs, is_public=True):
+    """Returns the cache key of a share type, independent of spec order."""
+    specs = dict((six.text_type(k), _spec_value(v))
+                 for k, v in (extra_specs or {}).items())
+    return json.dumps([specs, bool(is_public)], sort_keys=True)
+
+
+class ShareTypeCache(object):
+    """In-memory cache of share types."""
+
+    def __init__(self):
+        self._types = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, client, create):
+        """Returns the share type cached under 'key', creating it if needed.
+
+        :param key: cache key of the share type, see type_key().
+        :param client: admin shares client, used to delete the share type
+            when the worker exits.
+        :param create: callable without arguments returning a new share type
+            dict matching 'key'.
+        :returns: a copy of the share type dict.
+        """
+        with self._lock:
+            entry = self._types.get(key)
+            if entry is None:
+                entry = self._types[key] = {
+                    'share_type': create(), 'client': client}
+            return copy.deepcopy(entry['share_type'])
+
+    def clear(self):
+        """Deletes all the cached share types."""
+        with self._lock:
+            entries = list(self._types.values())
+            self._types.clear()
+        for entry in entries:
+            share_type_id = entry['share_type']['id']
+            try:
+                entry['client'].delete_share_type(share_type_id)
+                entry['client'].wait_for_resource_deletion(st_id=share_type_id)
+            except exceptions.NotFound:
+                pass
+            except Exception:
+                LOG.exception("Failed to delete cached share type %s.",
+                              share_type_id)
+
+
+_cache = ShareTypeCache()
+
+
+def get_cache():
+    """Returns the share type cache of the test worker."""
+    return _cache
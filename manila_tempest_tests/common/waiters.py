@@ -0,0 +1,362 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import functools
+import threading
+import time
+
+import six
+from tempest import config
+from tempest.lib import exceptions
+
+from manila_tempest_tests.common import events
+from manila_tempest_tests.common import instrumentation
+
+CONF = config.CONF
+
+# NOTE: time.monotonic is not available on python 2.7, fall back to the
+# wall clock there.
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class _Clock(object):
+    """Clock of the waiters, which may run faster than the wall clock.
+
+    With a scale below 1, sleeps are shortened and the time skipped is
+    added to the clock of the sleeping thread, so that timeouts keep
+    counting the time the waiters would have slept, e.g. when replaying
+    recorded responses.
+    """
+
+    def __init__(self):
+        self.scale = 1.0
+        self._local = threading.local()
+
+    def _skipped(self):
+        return getattr(self._local, 'skipped', 0.0)
+
+    def now(self):
+        return monotonic() + self._skipped()
+
+    def sleep(self, seconds, wake=None):
+        """Sleeps for 'seconds' times the scale of the clock.
+
+        :param wake: optional callable receiving the scaled duration,
+            blocking at most that long, and returning True if it returned
+            early, in which case no time is skipped.
+        """
+        scaled = seconds * self.scale
+        if wake is not None:
+            if wake(scaled):
+                return
+        elif scaled > 0:
+            time.sleep(scaled)
+        self._local.skipped = self._skipped() + seconds - scaled
+
+
+clock = _Clock()
+
+
+def set_time_scale(scale):
+    """Sets the factor applied to the sleeps of all the waiters."""
+    clock.scale = scale
+
+
+class BackoffPolicy(object):
+    """Defines how long a waiter sleeps between two status checks."""
+
+    def intervals(self):
+        """Returns an endless iterator of sleep intervals in seconds."""
+        raise NotImplementedError()
+
+
+class FixedBackoff(BackoffPolicy):
+    """Sleeps the same amount of time between every two checks."""
+
+    def __init__(self, interval):
+        self.interval = interval
+
+    def intervals(self):
+        while True:
+            yield self.interval
+
+
+class ExponentialBackoff(BackoffPolicy):
+    """Starts with short sleeps and grows them geometrically up to a cap."""
+
+    def __init__(self, initial, factor=2.0, maximum=None):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+
+    def intervals(self):
+        interval = self.initial
+        while True:
+            if self.maximum is not None:
+                interval = min(interval, self.maximum)
+            yield interval
+            interval *= self.factor
+
+
+class ProgressBackoff(BackoffPolicy):
+    """Schedules the checks of an operation from its observed progress.
+
+    Progress samples, in percent, are fed with update(). Until the progress
+    moves, the checks follow the 'fallback' policy. Then the rate of the
+    operation is estimated from the samples, and the next check is made
+    after 'fraction' of the estimated remaining time, bounded by 'minimum'
+    and 'maximum' seconds, so that long operations are checked rarely and
+    again around their expected end.
+    """
+
+    def __init__(self, fallback, minimum, maximum, fraction=0.5):
+        self.fallback = fallback
+        self.minimum = minimum
+        self.maximum = maximum
+        self.fraction = fraction
+        self._first = None
+        self._last = None
+        self._last_change = None
+
+    def update(self, progress):
+        """Records the progress of the operation, in percent."""
+        now = clock.now()
+        progress = float(progress)
+        if self._last is not None and progress != self._last[1]:
+            self._last_change = now
+        if self._first is None:
+            self._first = (now, progress)
+        self._last = (now, progress)
+
+    @property
+    def progress(self):
+        """Returns the last recorded progress, or None."""
+        return self._last[1] if self._last is not None else None
+
+    def rate(self):
+        """Returns the observed progress rate in percent per second."""
+        if self._first is None:
+            return None
+        elapsed = self._last[0] - self._first[0]
+        done = self._last[1] - self._first[1]
+        if elapsed <= 0 or done <= 0:
+            return None
+        return done / elapsed
+
+    def eta(self):
+        """Returns the estimated number of seconds left, or None."""
+        rate = self.rate()
+        if rate is None:
+            return None
+        return max(100.0 - self._last[1], 0.0) / rate
+
+    def stalled_for(self):
+        """Returns the number of seconds since the progress last moved.
+
+        Operations whose progress never moved are not deemed stalled, as
+        some report a constant progress until they are done.
+        """
+        if self._last_change is None:
+            return 0.0
+        return clock.now() - self._last_change
+
+    def intervals(self):
+        fallback = self.fallback.intervals()
+        while True:
+            eta = self.eta()
+            if eta is None:
+                yield next(fallback)
+            else:
+                yield max(self.minimum,
+                          min(self.maximum, eta * self.fraction))
+
+
+def get_backoff_policy(build_interval):
+    """Returns the backoff policy configured in the 'share' group.
+
+    :param build_interval: interval used as a cap when the
+        'waiter_max_interval' option is not set.
+    """
+    maximum = CONF.share.waiter_max_interval or build_interval
+    initial = min(CONF.share.waiter_initial_interval, maximum)
+    return ExponentialBackoff(
+        initial, factor=CONF.share.waiter_backoff_factor, maximum=maximum)
+
+
+def is_error_status(status):
+    """Default error-state predicate for resource statuses."""
+    return status is not None and 'error' in six.text_type(status).lower()
+
+
+def _format(message, *args):
+    return message(*args) if callable(message) else message
+
+
+def wait_until(check, timeout, backoff, timeout_message=None,
+               check_first=True, recorder=None, wake_on=None):
+    """Calls 'check' until it returns something other than None.
+
+    :param check: callable without arguments. Returning None means that
+        the awaited condition is not met yet; any other value is returned
+        to the caller. Exceptions raised by it are propagated.
+    :param timeout: number of seconds after which to give up.
+    :param backoff: BackoffPolicy used to schedule the checks.
+    :param timeout_message: string, or callable without arguments
+        returning a string, for the raised TimeoutException.
+    :param check_first: whether to check before sleeping for the first time.
+    :param recorder: instrumentation.WaitRecorder describing the wait.
+    :param wake_on: ids of the resources 'check' is about. If an event
+        source is configured, an event about one of them ends the current
+        sleep early.
+    :raises exceptions.TimeoutException: if the deadline is reached.
+    """
+    recorder = recorder or instrumentation.WaitRecorder(None, None)
+    source = events.get_event_source() if wake_on else None
+    try:
+        result = _wait_until(check, timeout, backoff, timeout_message,
+                             check_first, recorder, source, wake_on)
+    except exceptions.TimeoutException:
+        recorder.finish('timeout')
+        raise
+    except Exception:
+        recorder.finish('error')
+        raise
+    recorder.finish()
+    return result
+
+
+def _wait_until(check, timeout, backoff, timeout_message, check_first,
+                recorder, source, wake_on):
+    deadline = clock.now() + timeout
+    intervals = backoff.intervals()
+    wake = version = None
+    if source is not None:
+        version = source.version(wake_on)
+    if check_first:
+        recorder.poll()
+        result = check()
+        if result is not None:
+            return result
+    while True:
+        remaining = deadline - clock.now()
+        if remaining <= 0:
+            raise exceptions.TimeoutException(_format(timeout_message))
+        if source is not None:
+            wake = functools.partial(source.wait, wake_on, version)
+        clock.sleep(min(next(intervals), remaining), wake=wake)
+        if source is not None:
+            version = source.version(wake_on)
+        recorder.poll()
+        result = check()
+        if result is not None:
+            return result
+
+
+def wait_for_resource_status(show, status, timeout, backoff,
+                             status_attr='status', is_error=is_error_status,
+                             error_exception=None, timeout_message=None,
+                             resource_type=None, resource_id=None):
+    """Waits for a resource attribute to reach one of the given statuses.
+
+    :param show: callable without arguments returning the resource dict.
+    :param status: expected status, or tuple/list/set of expected statuses.
+    :param timeout: number of seconds after which to give up.
+    :param backoff: BackoffPolicy used to schedule the checks.
+    :param status_attr: name of the resource attribute to check.
+    :param is_error: predicate on the current status telling whether the
+        resource can no longer reach the expected one. None disables it.
+    :param error_exception: callable receiving the last resource dict and
+        returning the exception to raise when 'is_error' matches.
+    :param timeout_message: string, or callable receiving the last resource
+        dict and returning a string, for the raised TimeoutException.
+    :param resource_type: name of the resource type, for instrumentation.
+    :param resource_id: id of the resource, to be woken up by its events.
+    :returns: the resource dict in the expected status.
+    """
+    statuses = (status if isinstance(status, (tuple, list, set))
+                else (status, ))
+    recorder = instrumentation.WaitRecorder(resource_type, status)
+    last = {}
+
+    def check():
+        body = show()
+        last['body'] = body
+        current_status = body[status_attr]
+        recorder.final_state = current_status
+        if current_status in statuses:
+            return body
+        if (is_error is not None and error_exception is not None and
+                is_error(current_status)):
+            raise error_exception(body)
+        return None
+
+    return wait_until(
+        check, timeout, backoff,
+        timeout_message=lambda: _format(timeout_message, last.get('body')),
+        recorder=recorder,
+        wake_on=(resource_id, ) if resource_id is not None else None)
+
+
+def wait_for_resources_status(list_resources, resource_ids, status, timeout,
+                              backoff, status_attr='status',
+                              is_error=is_error_status, error_exception=None,
+                              timeout_message=None, resource_type=None):
+    """Waits for several resources of the same type using a single listing.
+
+    Every check lists the resources once and resolves the state of all the
+    awaited ones from that response, instead of showing them one by one.
+
+    :param list_resources: callable without arguments returning a list of
+        resource dicts which contains the awaited ones.
+    :param resource_ids: ids of the resources to wait for.
+    :param status: expected status, or tuple/list/set of expected statuses.
+    :param timeout: number of seconds after which to give up.
+    :param backoff: BackoffPolicy used to schedule the checks.
+    :param status_attr: name of the resource attribute to check.
+    :param is_error: predicate on the current status telling whether a
+        resource can no longer reach the expected one. None disables it.
+    :param error_exception: callable receiving a resource dict in error
+        and returning the exception to raise. If None, resources in error
+        are returned like the others.
+    :param timeout_message: string, or callable receiving the set of ids
+        still pending and returning a string, for the TimeoutException.
+    :param resource_type: name of the resource type, for instrumentation.
+    :returns: dict mapping every awaited id to its last resource dict.
+    """
+    statuses = (status if isinstance(status, (tuple, list, set))
+                else (status, ))
+    pending = set(resource_ids)
+    results = {}
+    recorder = instrumentation.WaitRecorder(resource_type, status)
+
+    def check():
+        for body in list_resources():
+            if body['id'] not in pending:
+                continue
+            current_status = body[status_attr]
+            if current_status in statuses:
+                pass
+            elif is_error is not None and is_error(current_status):
+                if error_exception is not None:
+                    raise error_exception(body)
+            else:
+                continue
+            results[body['id']] = body
+            pending.discard(body['id'])
+        recorder.final_state = '%d/%d pending' % (
+            len(pending), len(results) + len(pending))
+        return None if pending else results
+
+    return wait_until(
+        check, timeout, backoff,
+        timeout_message=lambda: _format(timeout_message, pending),
+        recorder=recorder, wake_on=tuple(pending))
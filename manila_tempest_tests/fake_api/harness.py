@@ -0,0 +1,273 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Runs the API tests against the fake Manila API.
+
+Starts a FakeManilaServer, writes a tempest configuration pointing to it,
+with the features the fake API lacks disabled and the waiters woken up by
+the events of the fake API, and runs the selected API tests with stestr.
+The plugin must be installed, e.g. with 'pip install -e .', for tempest to
+load its options.
+
+Example:
+
+    python -m manila_tempest_tests.fake_api.harness \\
+        --latency share=0.5 --error-rate share=0.05 --seed 42 \\
+        'manila_tempest_tests.tests.api.test_shares'
+
+With --benchmark, the benchmarks of manila_tempest_tests/tests/benchmark are
+run instead of the API tests, and their reports written to the work
+directory.
+"""
+
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from manila_tempest_tests.common import events
+from manila_tempest_tests.fake_api import server
+from manila_tempest_tests.fake_api import state
+
+# Accounts provisioned for every stestr worker: a test class holds a
+# primary, an alt and an admin account at most while it runs.
+USERS = (
+    ('demo', ['member']),
+    ('alt_demo', ['member']),
+    ('admin', ['admin', 'member']),
+)
+PASSWORD = 'secret'
+
+TEMPEST_CONF = """[DEFAULT]
+log_dir = %(workdir)s
+
+[auth]
+use_dynamic_credentials = False
+test_accounts_file = %(accounts)s
+admin_username = admin-0
+admin_password = %(password)s
+admin_project_name = admin-0
+admin_domain_name = Default
+
+[identity]
+uri_v3 = %(identity_uri)s
+auth_version = v3
+region = RegionOne
+disable_ssl_certificate_validation = True
+
+[identity-feature-enabled]
+api_v2 = False
+api_v3 = True
+
+[service_available]
+manila = True
+nova = False
+neutron = False
+glance = False
+cinder = False
+swift = False
+
+[share]
+multitenancy_enabled = False
+enable_protocols = nfs,cifs
+enable_ip_rules_for_protocols = nfs
+enable_user_rules_for_protocols = cifs
+enable_cert_rules_for_protocols =
+enable_cephx_rules_for_protocols =
+enable_ro_access_level_for_protocols = nfs
+capability_storage_protocol = NFS_CIFS
+capability_snapshot_support = True
+capability_create_share_from_snapshot_support = True
+capability_revert_to_snapshot_support = True
+backend_names = %(backend_names)s
+multi_backend = True
+default_share_type_name = default
+share_type_cache_enabled = True
+build_interval = 1
+build_timeout = %(build_timeout)d
+waiter_event_source = fake_api
+waiter_events_url = %(events_url)s
+run_quota_tests = True
+run_extend_tests = True
+run_shrink_tests = True
+run_snapshot_tests = True
+run_revert_to_snapshot_tests = True
+run_share_group_tests = False
+run_replication_tests = False
+run_multiple_share_replicas_tests = False
+run_host_assisted_migration_tests = False
+run_driver_assisted_migration_tests = False
+run_migration_with_preserve_snapshots_tests = False
+run_manage_unmanage_tests = False
+run_manage_unmanage_snapshot_tests = False
+run_mount_snapshot_tests = False
+share_network_pool_dir = %(workdir)s
+http_cassette_mode = %(cassette_mode)s
+http_cassette_dir = %(cassette_dir)s
+run_latency_benchmark_tests = %(benchmark)s
+benchmark_report_dir = %(report_dir)s
+
+[oslo_concurrency]
+lock_path = %(workdir)s
+"""
+
+
+def _parse_mapping(values, cast=float):
+    """Parses 'type=value' arguments into a dict."""
+    mapping = {}
+    for value in values or []:
+        rtype, _, number = value.partition('=')
+        if rtype not in state.RESOURCE_TYPES:
+            raise argparse.ArgumentTypeError(
+                'Unknown resource type %s, must be one of: %s.' % (
+                    rtype, ', '.join(state.RESOURCE_TYPES)))
+        mapping[rtype] = cast(number)
+    return mapping
+
+
+def admin_users(workers):
+    """Returns the names of the admin accounts of 'workers' workers."""
+    return ['%s-%d' % (name, worker) for worker in range(workers)
+            for name, roles in USERS if 'admin' in roles]
+
+
+def write_config(workdir, fake_server, workers=1, build_timeout=60,
+                 cassette_mode='off', cassette_dir='', benchmark=False,
+                 report_dir=''):
+    """Writes tempest.conf and accounts.yaml for 'fake_server'.
+
+    Every one of the 'workers' stestr workers gets its own accounts.
+    """
+    if not os.path.isdir(workdir):
+        os.makedirs(workdir)
+    accounts = os.path.join(workdir, 'accounts.yaml')
+    with open(accounts, 'w') as f:
+        for worker in range(workers):
+            for name, roles in USERS:
+                name = '%s-%d' % (name, worker)
+                f.write("- username: '%s'\n" % name)
+                f.write("  project_name: '%s'\n" % name)
+                f.write("  password: '%s'\n" % PASSWORD)
+                f.write("  domain_name: 'Default'\n")
+                f.write("  roles: [%s]\n" % ', '.join(
+                    "'%s'" % r for r in roles))
+    conf = os.path.join(workdir, 'tempest.conf')
+    with open(conf, 'w') as f:
+        f.write(TEMPEST_CONF % {
+            'workdir': workdir,
+            'accounts': accounts,
+            'password': PASSWORD,
+            'identity_uri': fake_server.identity_uri,
+            'backend_names': ','.join(
+                host.split('@')[1] for host in fake_server.app.backends),
+            'build_timeout': build_timeout,
+            'events_url': '%s/events' % fake_server.url,
+            'cassette_mode': cassette_mode,
+            'cassette_dir': cassette_dir,
+            'benchmark': benchmark,
+            'report_dir': report_dir or workdir,
+        })
+    return conf
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--latency', action='append', metavar='TYPE=SECONDS',
+        help='Duration of the transient statuses of a resource type, e.g. '
+             'share=2. May be repeated.')
+    parser.add_argument(
+        '--error-rate', action='append', metavar='TYPE=PROBABILITY',
+        help='Probability of the transitions of a resource type ending in '
+             'an error status, e.g. share=0.1. May be repeated.')
+    parser.add_argument('--seed', type=int,
+                        help='Seed of the injected errors.')
+    parser.add_argument('--port', type=int, default=0,
+                        help='Port of the fake API, a free one by default.')
+    parser.add_argument('--backends', type=int, default=2,
+                        help='Number of fake share back ends.')
+    parser.add_argument('--workdir',
+                        help='Directory of the generated configuration, a '
+                             'temporary one by default.')
+    parser.add_argument('--concurrency', type=int, default=0,
+                        help='Number of stestr workers, one per CPU by '
+                             'default.')
+    parser.add_argument('--cassette-mode', default='off',
+                        choices=['off', 'record', 'replay'],
+                        help="Whether to record the traffic of the share "
+                             "clients, or to replay a recorded one. In "
+                             "'replay' mode, only the identity requests "
+                             "reach the fake API.")
+    parser.add_argument('--cassette-dir', default='',
+                        help='Directory of the cassettes.')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Run the benchmarks instead of the API tests.')
+    parser.add_argument('--report-dir', default='',
+                        help='Directory of the benchmark reports, the work '
+                             'directory by default.')
+    parser.add_argument('--serve-only', action='store_true',
+                        help='Only serve the fake API until interrupted.')
+    parser.add_argument('regex', nargs='?', default='',
+                        help='Regular expression selecting the tests.')
+    args = parser.parse_args(argv)
+
+    # The waiters of the tests are woken up by the transitions of the
+    # store, through the events endpoint of the fake API.
+    source = events.LocalEventSource()
+    store = state.ResourceStore(
+        latencies=_parse_mapping(args.latency),
+        error_rates=_parse_mapping(args.error_rate), seed=args.seed,
+        listener=source.publish)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='manila-fake-api-')
+    workers = args.concurrency or multiprocessing.cpu_count()
+    fake_server = server.FakeManilaServer(
+        port=args.port, store=store, backends=args.backends,
+        admin_users=admin_users(workers), events=source)
+    with fake_server:
+        conf = write_config(
+            workdir, fake_server, workers=workers,
+            build_timeout=max(60, int(
+                10 * max(store.latencies.values() or [0]))),
+            cassette_mode=args.cassette_mode,
+            cassette_dir=os.path.abspath(args.cassette_dir)
+            if args.cassette_dir else '',
+            benchmark=args.benchmark,
+            report_dir=os.path.abspath(args.report_dir)
+            if args.report_dir else '')
+        print('Fake Manila API listening on %s, tempest configuration '
+              'written to %s.' % (fake_server.url, conf))
+        if args.serve_only:
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                return 0
+        env = dict(os.environ, TEMPEST_CONFIG_DIR=workdir,
+                   TEMPEST_CONFIG='tempest.conf')
+        top_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        test_path = ('manila_tempest_tests/tests/benchmark' if args.benchmark
+                     else 'manila_tempest_tests/tests/api')
+        command = [sys.executable, '-m', 'stestr',
+                   '--test-path', test_path,
+                   '--top-dir', '.', 'run',
+                   '--concurrency', str(workers)]
+        if args.regex:
+            command.append(args.regex)
+        return subprocess.call(command, cwd=top_dir, env=env)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2366 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Fake Manila API, to exercise the plugin without a real deployment.
+
+It serves a Keystone v3 token endpoint and the parts of the Manila v1/v2
+API used by the share clients for shares, share and snapshot instances,
+snapshots, access rules, export locations, share networks, security
+services, share types, quotas, services, pools, availability zones and
+user messages, with microversion handling, the validation and the admin
+policies of the real API. Share group types and share groups can be
+created, shown and deleted. As no share server is handled, share servers
+and share replicas are always listed empty, and managing shares fails.
+Other endpoints, e.g. replica creation or migrations, answer 404 so that
+the tests using them should be disabled in the configuration, as the
+harness does.
+
+Resources are kept in memory by a state.ResourceStore, which simulates
+the latency and the error rate of the back end per resource type. Given an
+event source, the transitions of the resources can be followed through
+the unauthenticated /events endpoint, which events.HttpEventSource polls.
+"""
+
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from wsgiref import simple_server
+
+import netaddr
+from six.moves import socketserver
+from six.moves.urllib import parse as urlparse
+
+from manila_tempest_tests.fake_api import state
+from manila_tempest_tests import utils
+
+MIN_VERSION = '2.0'
+MAX_VERSION = '2.49'
+VERSION_HEADER = 'X-OpenStack-Manila-API-Version'
+VERSION_ENVIRON = 'HTTP_%s' % VERSION_HEADER.upper().replace('-', '_')
+DEFAULT_QUOTAS = {
+    'shares': 50, 'snapshots': 50, 'gigabytes': 1000,
+    'snapshot_gigabytes': 1000, 'share_networks': 10,
+}
+SHARE_GROUP_QUOTAS = {'share_groups': 50, 'share_group_snapshots': 50}
+SHARE_PROTOCOLS = ('NFS', 'CIFS', 'GLUSTERFS', 'HDFS', 'CEPHFS', 'MAPRFS')
+AVAILABILITY_ZONE = 'nova'
+# Longest wait of a request of the events endpoint, in seconds.
+EVENTS_MAX_TIMEOUT = 60
+# Maximum lengths of metadata keys and values.
+METADATA_KEY_LENGTH = 255
+METADATA_VALUE_LENGTH = 1023
+USERNAME_REGEX = re.compile(r"^[\w\$\.\-_`;'\{\}\[\]\\]{4,255}$")
+# Printable ASCII characters but dots.
+CEPHX_ID_REGEX = re.compile(r'^[!-\-/-~]+$')
+
+# Fields of share views that only exist in some microversions.
+SHARE_FIELD_VERSIONS = {
+    'export_location': (None, '2.8'),
+    'export_locations': (None, '2.8'),
+    'snapshot_support': ('2.2', None),
+    'task_state': ('2.5', None),
+    'share_type_name': ('2.6', None),
+    'access_rules_status': ('2.10', None),
+    'replication_type': ('2.11', None),
+    'has_replicas': ('2.11', None),
+    'user_id': ('2.16', None),
+    'create_share_from_snapshot_support': ('2.24', None),
+    'revert_to_snapshot_support': ('2.27', None),
+    'share_group_id': ('2.31', None),
+    'source_share_group_snapshot_member_id': ('2.31', None),
+    'mount_snapshot_support': ('2.32', None),
+}
+INSTANCE_FIELD_VERSIONS = {
+    'export_location': (None, '2.8'),
+    'export_locations': (None, '2.8'),
+    'access_rules_status': ('2.10', None),
+    'replica_state': ('2.11', None),
+    'share_type_id': ('2.22', None),
+    'cast_rules_to_readonly': ('2.30', None),
+}
+SNAPSHOT_FIELD_VERSIONS = {
+    'user_id': ('2.17', None),
+    'project_id': ('2.17', None),
+}
+ACCESS_RULE_FIELD_VERSIONS = {
+    'access_key': ('2.21', None),
+    'created_at': ('2.33', None),
+    'updated_at': ('2.33', None),
+    'metadata': ('2.45', None),
+}
+EXPORT_LOCATION_FIELD_VERSIONS = {
+    'preferred': ('2.14', None),
+}
+SHARE_NETWORK_FIELD_VERSIONS = {
+    'gateway': ('2.18', None),
+    'mtu': ('2.20', None),
+}
+SECURITY_SERVICE_FIELD_VERSIONS = {
+    'ou': ('2.44', None),
+}
+SECURITY_SERVICE_TYPES = ('ldap', 'kerberos', 'active_directory')
+# Fields of share networks which can be set on creation.
+SHARE_NETWORK_FIELDS = (
+    'name', 'description', 'neutron_net_id', 'neutron_subnet_id',
+    'network_type', 'segmentation_id', 'cidr', 'ip_version', 'gateway',
+    'mtu', 'created_at',
+)
+
+# Maximum length of extra spec keys and values.
+EXTRA_SPEC_LENGTH = 255
+# Extra specs shown to the users which are not administrators, with the
+# microversions they were added in. Those a share type does not have are
+# shown as unsupported.
+USER_EXTRA_SPECS = {
+    'driver_handles_share_servers': None,
+    'snapshot_support': None,
+    'create_share_from_snapshot_support': '2.24',
+    'revert_to_snapshot_support': '2.27',
+    'mount_snapshot_support': '2.32',
+}
+AZ_SPEC = 'availability_zones'
+
+# Statuses administrators can reset shares, share instances and snapshots
+# to, and task states they can reset shares to.
+RESET_STATUSES = (
+    'available', 'error', 'creating', 'deleting', 'error_deleting',
+    'extending', 'extending_error', 'shrinking', 'shrinking_error',
+    'manage_starting', 'manage_error', 'unmanage_starting',
+    'unmanage_error', 'migrating', 'migrating_to', 'reverting',
+    'reverting_error',
+)
+TASK_STATES = (
+    None, 'migration_starting', 'migration_in_progress',
+    'migration_completing', 'migration_success', 'migration_error',
+    'migration_cancelled', 'migration_driver_starting',
+    'migration_driver_in_progress', 'migration_driver_phase1_done',
+    'data_copying_starting', 'data_copying_in_progress',
+    'data_copying_completing', 'data_copying_completed',
+    'data_copying_cancelled', 'data_copying_error',
+)
+# Share actions only administrators may request. As with the policies of
+# the real API, they are checked before the share is looked up.
+ADMIN_SHARE_ACTIONS = ('reset_status', 'force_delete', 'reset_task_state',
+                       'unmanage')
+# Microversions share actions were added in.
+SHARE_ACTION_VERSIONS = {
+    'reset_task_state': '2.22',
+    'revert': '2.27',
+}
+
+
+class ApiError(Exception):
+
+    KINDS = {400: 'badRequest', 401: 'unauthorized', 403: 'forbidden',
+             404: 'itemNotFound', 406: 'notAcceptable', 409: 'conflict',
+             413: 'overLimit'}
+
+    def __init__(self, code, message):
+        super(ApiError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+    def body(self):
+        return {self.KINDS.get(self.code, 'computeFault'): {
+            'code': self.code, 'message': self.message}}
+
+
+def _not_found(what, rid):
+    return ApiError(404, '%s %s could not be found.' % (what, rid))
+
+
+def _in_version_range(version, bounds):
+    low, high = bounds
+    return ((low is None or version >= utils.MicroVersion.parse(low)) and
+            (high is None or version <= utils.MicroVersion.parse(high)))
+
+
+def _view(resource, version=None, field_versions=None):
+    """Returns the public fields of a stored resource."""
+    view = dict((k, v) for k, v in resource.items() if not k.startswith('_'))
+    for key, bounds in (field_versions or {}).items():
+        if version is not None and not _in_version_range(version, bounds):
+            view.pop(key, None)
+    return view
+
+
+def _strict_bool(value, name):
+    value = _to_bool(value)
+    if not isinstance(value, bool):
+        raise ApiError(400, 'Invalid value %s for %s, it must be a '
+                            'boolean.' % (value, name))
+    return value
+
+
+def _reset_status(params):
+    if params.get('status') not in RESET_STATUSES:
+        raise ApiError(400, 'Invalid status %s.' % params.get('status'))
+    return params['status']
+
+
+def _check_extra_specs(extra_specs):
+    """Validates extra specs, returns them with string values."""
+    if not extra_specs or not isinstance(extra_specs, dict):
+        raise ApiError(400, 'Extra specs must be a non-empty dict.')
+    checked = {}
+    for key, value in extra_specs.items():
+        value = str(value)
+        if not 0 < len(key) <= EXTRA_SPEC_LENGTH or (
+                len(value) > EXTRA_SPEC_LENGTH):
+            raise ApiError(400, 'Extra spec keys and values must be 1 to '
+                                '%d characters long.' % EXTRA_SPEC_LENGTH)
+        if key == AZ_SPEC:
+            zones = [zone.strip() for zone in value.split(',')]
+            if not all(zones):
+                raise ApiError(400, 'Invalid availability zones %s.' % value)
+            value = ','.join(zones)
+        checked[key] = value
+    return checked
+
+
+def _date(value, name):
+    """Returns a YYYY-MM-DD date as a timestamp of the stored format."""
+    try:
+        return time.strftime('%Y-%m-%dT%H:%M:%S.000000',
+                             time.strptime(value, '%Y-%m-%d'))
+    except (TypeError, ValueError):
+        raise ApiError(400, 'Invalid date %s for %s, it must be in the '
+                            'YYYY-MM-DD format.' % (value, name))
+
+
+def _az_spec(extra_specs):
+    """Returns the availability zones of a share type, None for all."""
+    if AZ_SPEC not in extra_specs:
+        return None
+    return extra_specs[AZ_SPEC].split(',')
+
+
+def _check_metadata(metadata):
+    for key, value in metadata.items():
+        if not 0 < len(key) <= METADATA_KEY_LENGTH:
+            raise ApiError(400, 'Metadata keys must be 1 to %d characters '
+                                'long.' % METADATA_KEY_LENGTH)
+        if len(value) > METADATA_VALUE_LENGTH:
+            raise ApiError(400, 'Metadata values must be up to %d '
+                                'characters long.' % METADATA_VALUE_LENGTH)
+    return metadata
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return {'true': True, 'false': False}.get(
+        str(value).lower(), value)
+
+
+class Request(object):
+
+    def __init__(self, method, path, query, body, context, version):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.body = body
+        self.context = context
+        self.version = version
+
+    @property
+    def is_admin(self):
+        return self.context['is_admin']
+
+    @property
+    def project_id(self):
+        return self.context['project_id']
+
+    def require_admin(self):
+        if not self.is_admin:
+            raise ApiError(403, 'Policy does not allow this action.')
+
+    def at_least(self, version):
+        return self.version >= utils.MicroVersion.parse(version)
+
+
+class Route(object):
+
+    def __init__(self, method, pattern, handler, min_version=None,
+                 max_version=None):
+        self.method = method
+        self.regex = re.compile('^%s$' % pattern)
+        self.handler = handler
+        self.bounds = (min_version, max_version)
+
+
+class FakeManilaApp(object):
+    """WSGI application of the fake Keystone and Manila APIs.
+
+    :param store: state.ResourceStore holding the fake resources.
+    :param backends: number of fake share back ends, each with one pool.
+    :param admin_users: names of the users which get the admin role.
+    :param events: optional events.EventSource the store publishes the
+        transitions of the resources to. The waiters of the test workers
+        follow it through the /events endpoint.
+    """
+
+    def __init__(self, store=None, backends=2, admin_users=('admin', ),
+                 events=None):
+        self.store = store or state.ResourceStore()
+        self.admin_users = set(admin_users)
+        self.events = events
+        self.backends = ['fakehost%d@backend%d' % (i, i)
+                         for i in range(1, backends + 1)]
+        self.base_url = None
+        self._tokens = {}
+        # Identity resources created through the Keystone API, by id, and
+        # the (user id, project id, role id) assignments.
+        self._projects = {}
+        self._users = {}
+        self._roles = dict((name, {'id': name, 'name': name})
+                           for name in ('admin', 'member', 'reader'))
+        self._assignments = set()
+        self._quotas = {}
+        # (host, binary) of the services disabled through the API.
+        self._disabled_services = set()
+        # Orders the snapshots, created_at only has a one second resolution.
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.default_share_type = self.store.add('share_type', {
+            'name': 'default',
+            'description': None,
+            'extra_specs': {'driver_handles_share_servers': 'False',
+                            'snapshot_support': 'True'},
+            'is_public': True,
+            '_projects': [],
+        }, transient=None, final=None, attr='_state')
+        self.routes = self._routes()
+        self.identity_routes = self._identity_routes()
+
+    def _routes(self):
+        r = Route
+        return [
+            r('GET', 'limits', self.get_limits),
+            r('GET', 'extensions', self.list_extensions),
+            r('POST', 'shares', self.create_share),
+            r('GET', 'shares(?P<detail>/detail)?', self.list_shares),
+            r('GET', 'shares/(?P<rid>[^/]+)', self.get_share),
+            r('PUT', 'shares/(?P<rid>[^/]+)', self.update_share),
+            r('DELETE', 'shares/(?P<rid>[^/]+)', self.delete_share),
+            r('POST', 'shares/(?P<rid>[^/]+)/action', self.share_action),
+            r('POST', 'os-share-manage', self.manage_share, None, '2.6'),
+            r('POST', 'shares/manage', self.manage_share, '2.7'),
+            r('POST', 'os-share-unmanage/(?P<rid>[^/]+)/unmanage',
+              self.unmanage_share, None, '2.6'),
+            r('GET', 'shares/(?P<rid>[^/]+)/metadata', self.get_metadata),
+            r('POST', 'shares/(?P<rid>[^/]+)/metadata',
+              self.update_metadata),
+            r('PUT', 'shares/(?P<rid>[^/]+)/metadata', self.set_metadata),
+            r('DELETE', 'shares/(?P<rid>[^/]+)/metadata/(?P<key>[^/]+)',
+              self.delete_metadata),
+            r('GET', 'shares/(?P<rid>[^/]+)/export_locations',
+              self.list_export_locations, '2.9'),
+            r('GET', 'shares/(?P<rid>[^/]+)/export_locations/(?P<el>[^/]+)',
+              self.get_export_location, '2.9'),
+            r('GET', 'shares/(?P<rid>[^/]+)/instances',
+              self.list_instances_of_share, '2.3'),
+            r('GET', 'share_instances', self.list_share_instances, '2.3'),
+            r('GET', 'share_instances/(?P<rid>[^/]+)',
+              self.get_share_instance, '2.3'),
+            r('POST', 'share_instances/(?P<rid>[^/]+)/action',
+              self.share_instance_action, '2.3'),
+            r('GET', 'share_instances/(?P<rid>[^/]+)/export_locations',
+              self.list_instance_export_locations, '2.9'),
+            r('GET', 'share_instances/(?P<rid>[^/]+)/export_locations/'
+                     '(?P<el>[^/]+)',
+              self.get_instance_export_location, '2.9'),
+            r('GET', 'snapshot-instances(?P<detail>/detail)?',
+              self.list_snapshot_instances, '2.19'),
+            r('GET', 'snapshot-instances/(?P<rid>[^/]+)',
+              self.get_snapshot_instance, '2.19'),
+            r('POST', 'snapshot-instances/(?P<rid>[^/]+)/action',
+              self.snapshot_instance_action, '2.19'),
+            r('GET', 'share-access-rules', self.list_access_rules_new,
+              '2.45'),
+            r('GET', 'share-access-rules/(?P<rid>[^/]+)', self.get_access,
+              '2.45'),
+            r('PUT', 'share-access-rules/(?P<rid>[^/]+)/metadata',
+              self.update_access_metadata, '2.45'),
+            r('DELETE',
+              'share-access-rules/(?P<rid>[^/]+)/metadata/(?P<key>[^/]+)',
+              self.delete_access_metadata, '2.45'),
+            r('POST', 'snapshots', self.create_snapshot),
+            r('GET', 'snapshots(?P<detail>/detail)?', self.list_snapshots),
+            r('GET', 'snapshots/(?P<rid>[^/]+)', self.get_snapshot),
+            r('PUT', 'snapshots/(?P<rid>[^/]+)', self.update_snapshot),
+            r('DELETE', 'snapshots/(?P<rid>[^/]+)', self.delete_snapshot),
+            r('POST', 'snapshots/(?P<rid>[^/]+)/action',
+              self.snapshot_action),
+            r('GET', 'snapshots/(?P<rid>[^/]+)/access-list',
+              self.list_snapshot_access_rules, '2.32'),
+            r('POST', 'share-networks', self.create_share_network),
+            r('GET', 'share-networks(?P<detail>/detail)?',
+              self.list_share_networks),
+            r('GET', 'share-networks/(?P<rid>[^/]+)',
+              self.get_share_network),
+            r('PUT', 'share-networks/(?P<rid>[^/]+)',
+              self.update_share_network),
+            r('DELETE', 'share-networks/(?P<rid>[^/]+)',
+              self.delete_share_network),
+            r('POST', 'share-networks/(?P<rid>[^/]+)/action',
+              self.share_network_action),
+            r('POST', 'security-services', self.create_security_service),
+            r('GET', 'security-services(?P<detail>/detail)?',
+              self.list_security_services),
+            r('GET', 'security-services/(?P<rid>[^/]+)',
+              self.get_security_service),
+            r('PUT', 'security-services/(?P<rid>[^/]+)',
+              self.update_security_service),
+            r('DELETE', 'security-services/(?P<rid>[^/]+)',
+              self.delete_security_service),
+            r('POST', 'types', self.create_share_type),
+            r('GET', 'types', self.list_share_types),
+            r('GET', 'types/default', self.get_default_share_type),
+            r('GET', 'types/(?P<rid>[^/]+)', self.get_share_type),
+            r('DELETE', 'types/(?P<rid>[^/]+)', self.delete_share_type),
+            r('POST', 'types/(?P<rid>[^/]+)/action',
+              self.share_type_action),
+            r('GET', 'types/(?P<rid>[^/]+)/(os-)?share_type_access',
+              self.list_share_type_access),
+            r('GET', 'types/(?P<rid>[^/]+)/extra_specs',
+              self.get_extra_specs),
+            r('POST', 'types/(?P<rid>[^/]+)/extra_specs',
+              self.update_extra_specs),
+            r('GET', 'types/(?P<rid>[^/]+)/extra_specs/(?P<key>[^/]+)',
+              self.get_extra_spec),
+            r('PUT', 'types/(?P<rid>[^/]+)/extra_specs/(?P<key>[^/]+)',
+              self.update_extra_spec),
+            r('DELETE', 'types/(?P<rid>[^/]+)/extra_specs/(?P<key>[^/]+)',
+              self.delete_extra_spec),
+            r('POST', 'share-group-types', self.create_share_group_type,
+              '2.31'),
+            r('GET', 'share-group-types(/detail)?',
+              self.list_share_group_types, '2.31'),
+            r('GET', 'share-group-types/(?P<rid>[^/]+)',
+              self.get_share_group_type, '2.31'),
+            r('DELETE', 'share-group-types/(?P<rid>[^/]+)',
+              self.delete_share_group_type, '2.31'),
+            r('POST', 'share-groups', self.create_share_group, '2.31'),
+            r('GET', 'share-groups/(?P<rid>[^/]+)', self.get_share_group,
+              '2.31'),
+            r('DELETE', 'share-groups/(?P<rid>[^/]+)',
+              self.delete_share_group, '2.31'),
+            r('GET', 'os-services', self.list_services, None, '2.6'),
+            r('GET', 'services', self.list_services, '2.7'),
+            r('PUT', 'os-services/(?P<action>enable|disable)',
+              self.update_service, None, '2.6'),
+            r('PUT', 'services/(?P<action>enable|disable)',
+              self.update_service, '2.7'),
+            r('GET', 'os-availability-zone', self.list_availability_zones,
+              None, '2.6'),
+            r('GET', 'availability-zones', self.list_availability_zones,
+              '2.7'),
+            r('GET', 'scheduler-stats/pools(?P<detail>/detail)?',
+              self.list_pools),
+            r('GET', 'os-quota-sets/(?P<project>[^/]+)/defaults',
+              self.default_quotas, None, '2.6'),
+            r('GET', 'os-quota-sets/(?P<project>[^/]+)', self.show_quotas,
+              None, '2.6'),
+            r('PUT', 'os-quota-sets/(?P<project>[^/]+)',
+              self.update_quotas, None, '2.6'),
+            r('DELETE', 'os-quota-sets/(?P<project>[^/]+)',
+              self.reset_quotas, None, '2.6'),
+            r('GET', 'quota-sets/(?P<project>[^/]+)/defaults',
+              self.default_quotas, '2.7'),
+            r('GET', 'quota-sets/(?P<project>[^/]+)', self.show_quotas,
+              '2.7'),
+            r('GET', 'quota-sets/(?P<project>[^/]+)(?P<detail>/detail)',
+              self.show_quotas, '2.25'),
+            r('PUT', 'quota-sets/(?P<project>[^/]+)', self.update_quotas,
+              '2.7'),
+            r('DELETE', 'quota-sets/(?P<project>[^/]+)', self.reset_quotas,
+              '2.7'),
+            r('GET', 'share-servers', self.list_share_servers),
+            r('GET', 'share-servers/(?P<rid>[^/]+)(/details)?',
+              self.get_share_server),
+            r('DELETE', 'share-servers/(?P<rid>[^/]+)',
+              self.delete_share_server),
+            r('GET', 'share-replicas(?P<detail>/detail)?',
+              self.list_share_replicas, '2.11'),
+            r('GET', 'messages', self.list_messages, '2.37'),
+            r('GET', 'messages/(?P<rid>[^/]+)', self.get_message, '2.37'),
+            r('DELETE', 'messages/(?P<rid>[^/]+)', self.delete_message,
+              '2.37'),
+        ]
+
+    def _identity_routes(self):
+        r = Route
+        return [
+            r('GET', 'domains', self.list_domains),
+            r('POST', 'projects', self.create_project),
+            r('GET', 'projects/(?P<rid>[^/]+)', self.get_project),
+            r('DELETE', 'projects/(?P<rid>[^/]+)', self.delete_project),
+            r('POST', 'users', self.create_user),
+            r('DELETE', 'users/(?P<rid>[^/]+)', self.delete_user),
+            r('GET', 'roles', self.list_roles),
+            r('POST', 'roles', self.create_role),
+            r('PUT', 'projects/(?P<project>[^/]+)/users/(?P<user>[^/]+)/'
+                     'roles/(?P<role>[^/]+)', self.assign_role),
+        ]
+
+    # WSGI plumbing
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        path = environ.get('PATH_INFO', '/')
+        query = dict(urlparse.parse_qsl(environ.get('QUERY_STRING', ''),
+                                        keep_blank_values=True))
+        headers = [('Content-Type', 'application/json'),
+                   ('x-compute-request-id', 'req-%s' % uuid.uuid4())]
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            raw_body = environ['wsgi.input'].read(length) if length else b''
+            body = json.loads(raw_body.decode('utf-8')) if raw_body else None
+            if path.startswith('/identity'):
+                status, result, extra = self._identity(
+                    environ, method, path, query, body)
+                headers.extend(extra)
+            elif path.rstrip('/') == '/events' and method == 'GET':
+                status, result = self._events(query)
+            else:
+                status, result, version = self._manila(
+                    environ, method, path, query, body)
+                if version is not None:
+                    headers.extend([(VERSION_HEADER, str(version)),
+                                    ('Vary', VERSION_HEADER)])
+        except ApiError as e:
+            status, result = e.code, e.body()
+        except ValueError as e:
+            status, result = 400, ApiError(400, str(e)).body()
+        payload = json.dumps(result).encode('utf-8') if result else b''
+        headers.append(('Content-Length', str(len(payload))))
+        start_response('%d %s' % (status, _REASONS.get(status, 'Unknown')),
+                       headers)
+        return [payload]
+
+    def _events(self, query):
+        """Returns the number of events about resources, long-polling.
+
+        With a 'version' parameter, the request waits until the number of
+        events about the 'resource_ids' differs from it, or for 'timeout'
+        seconds at most.
+        """
+        if self.events is None:
+            raise ApiError(404, 'No event source is configured.')
+        resource_ids = [rid for rid in query.get(
+            'resource_ids', '').split(',') if rid]
+        if 'version' in query:
+            self.events.wait(resource_ids, int(query['version']), min(
+                float(query.get('timeout', 0)), EVENTS_MAX_TIMEOUT))
+        return 200, {'version': self.events.version(resource_ids)}
+
+    def _identity(self, environ, method, path, query, body):
+        path = path.rstrip('/')
+        if path.endswith('/v3') and method == 'GET':
+            return 200, {'version': {'id': 'v3.10', 'status': 'stable'}}, []
+        if path.endswith('/v3/auth/tokens') and method == 'POST':
+            return self._issue_token(body)
+        match = re.match(r'^/identity/v3/(?P<rest>.+)$', path)
+        context = self._tokens.get(environ.get('HTTP_X_AUTH_TOKEN'))
+        if context is None:
+            raise ApiError(401, 'The request you have made requires '
+                                'authentication.')
+        request = Request(method, match.group('rest') if match else path,
+                          query, body, context, None)
+        request.require_admin()
+        for route in self.identity_routes:
+            m = route.regex.match(request.path)
+            if m and route.method == method:
+                status, result = route.handler(request, **m.groupdict())
+                return status, result, []
+        raise ApiError(404, 'Unknown identity path %s.' % path)
+
+    @staticmethod
+    def _identity_id(name):
+        return str(uuid.uuid5(uuid.NAMESPACE_DNS, name).hex)
+
+    def _resolve(self, registry, ref):
+        """Returns the id and name of a user or project reference.
+
+        Resources not created through the API, e.g. the accounts of
+        accounts.yaml, are known by name, and get ids derived from it.
+        """
+        if ref.get('name'):
+            return self._identity_id(ref['name']), ref['name']
+        if ref.get('id') in registry:
+            return ref['id'], registry[ref['id']]['name']
+        raise ApiError(401, 'Could not find %s.' % ref.get('id'))
+
+    def _issue_token(self, body):
+        auth = body['auth']
+        user = auth['identity']['password']['user']
+        project = auth.get('scope', {}).get('project', {})
+        with self._lock:
+            user_id, user_name = self._resolve(self._users, user)
+            if project:
+                project_id, project_name = self._resolve(
+                    self._projects, project)
+            else:
+                project_name = user_name
+                project_id = self._identity_id(project_name)
+            is_admin = (user_name in self.admin_users or
+                        (user_id, project_id, 'admin') in self._assignments)
+            token = uuid.uuid4().hex
+            self._tokens[token] = {
+                'project_id': project_id, 'user_id': user_id,
+                'is_admin': is_admin}
+        endpoint = '%s/v1/%s' % (self.base_url, project_id)
+        catalog = [
+            {'type': 'identity', 'name': 'keystone', 'id': 'identity',
+             'endpoints': self._endpoints('%s/identity' % self.base_url)},
+            {'type': 'share', 'name': 'manila', 'id': 'share',
+             'endpoints': self._endpoints(endpoint)},
+            {'type': 'sharev2', 'name': 'manilav2', 'id': 'sharev2',
+             'endpoints': self._endpoints(
+                 endpoint.replace('/v1/', '/v2/'))},
+        ]
+        roles = [self._roles['member']]
+        if is_admin:
+            roles.append(self._roles['admin'])
+        domain = {'id': 'default', 'name': 'Default'}
+        token_body = {'token': {
+            'methods': ['password'],
+            'expires_at': '2099-01-01T00:00:00.000000Z',
+            'issued_at': state.timestamp() + 'Z',
+            'user': {'id': user_id, 'name': user_name, 'domain': domain},
+            'project': {'id': project_id, 'name': project_name,
+                        'domain': domain},
+            'roles': roles,
+            'catalog': catalog,
+        }}
+        return 201, token_body, [('X-Subject-Token', token)]
+
+    @staticmethod
+    def _endpoints(url):
+        return [{'id': '%s-%s' % (url, interface), 'interface': interface,
+                 'region': 'RegionOne', 'region_id': 'RegionOne', 'url': url}
+                for interface in ('public', 'admin', 'internal')]
+
+    def _manila(self, environ, method, path, query, body):
+        match = re.match(r'^/(?P<api>v[12])/?(?P<rest>.*)$', path)
+        if not match:
+            return 300, self._versions(), None
+        api, rest = match.group('api', 'rest')
+        if not rest:
+            if api == 'v1':
+                version = utils.MicroVersion(1, 0)
+            else:
+                version = self._parse_version(environ.get(VERSION_ENVIRON))
+            return 200, {'versions': [self._version_view(api)]}, version
+
+        token = environ.get('HTTP_X_AUTH_TOKEN')
+        context = self._tokens.get(token)
+        if context is None:
+            raise ApiError(401, 'The request you have made requires '
+                                'authentication.')
+        project_id, _, rest = rest.partition('/')
+        # NOTE: as with the real API, a format suffix is dropped from paths.
+        rest = re.sub(r'\.(json|xml)$', '', rest)
+        if project_id != context['project_id']:
+            raise ApiError(403, 'Token scoped to another project.')
+
+        if api == 'v1':
+            version = utils.MicroVersion.parse(MIN_VERSION)
+        else:
+            version = self._parse_version(environ.get(VERSION_ENVIRON))
+        request = Request(method, rest, query, body, context, version)
+        for route in self.routes:
+            m = route.regex.match(rest)
+            if (m and route.method == method and
+                    _in_version_range(version, route.bounds)):
+                kwargs = m.groupdict()
+                if 'detail' in kwargs:
+                    kwargs['detail'] = bool(kwargs['detail'])
+                status, result = route.handler(request, **kwargs)
+                return status, result, version if api == 'v2' else None
+        raise ApiError(404, 'The resource could not be found.')
+
+    @staticmethod
+    def _parse_version(value):
+        if not value:
+            return utils.MicroVersion.parse(MIN_VERSION)
+        if value == 'latest':
+            return utils.MicroVersion.parse(MAX_VERSION)
+        try:
+            version = utils.MicroVersion.parse(value)
+        except ValueError:
+            raise ApiError(400, 'API Version String %s is of invalid '
+                                'format.' % value)
+        if not _in_version_range(version, (MIN_VERSION, MAX_VERSION)):
+            raise ApiError(
+                406, 'Version %s is not supported by the API. Minimum is '
+                     '%s and maximum is %s.' % (
+                         value, MIN_VERSION, MAX_VERSION))
+        return version
+
+    def _version_view(self, api):
+        if api == 'v1':
+            return {'id': 'v1.0', 'status': 'DEPRECATED', 'version': '',
+                    'min_version': ''}
+        return {'id': 'v2.0', 'status': 'CURRENT', 'version': MAX_VERSION,
+                'min_version': MIN_VERSION}
+
+    def _versions(self):
+        return {'versions': [self._version_view('v1'),
+                             self._version_view('v2')]}
+
+    # Helpers
+
+    def _visible(self, request, resource, public_attr=None):
+        return (request.is_admin or
+                resource.get('project_id') == request.project_id or
+                (public_attr and resource.get(public_attr)))
+
+    def _get_visible(self, request, rtype, rid, what, public_attr=None):
+        resource = self.store.get(rtype, rid)
+        if resource is None or not self._visible(
+                request, resource, public_attr):
+            raise _not_found(what, rid)
+        return resource
+
+    @classmethod
+    def _filter(cls, request, resources, ignored=(), strict=False):
+        return cls._page(request, cls._match(request, resources, ignored,
+                                             strict))
+
+    @staticmethod
+    def _match(request, resources, ignored=(), strict=False):
+        """Returns the sorted resources matching the query filters.
+
+        Filters on fields the resources do not have are ignored, unless
+        'strict' is set, in which case they match no resource.
+        """
+        query = dict((k, v) for k, v in request.query.items()
+                     if k not in ('limit', 'offset', 'sort_key', 'sort_dir',
+                                  'all_tenants', 'project_id',
+                                  'with_count') + tuple(ignored))
+        result = []
+        for resource in resources:
+            matches = True
+            for key, value in query.items():
+                if key.endswith('~'):
+                    if (request.at_least('2.36') and
+                            value not in (resource.get(key[:-1]) or '')):
+                        matches = False
+                elif key in ('metadata', 'extra_specs'):
+                    expected = _parse_dict_param(value)
+                    actual = resource.get(key) or {}
+                    if any(actual.get(k) != v for k, v in expected.items()):
+                        matches = False
+                elif ((key in resource or strict) and
+                        str(resource.get(key)) != value):
+                    matches = False
+            if matches:
+                result.append(resource)
+        if 'sort_key' in request.query:
+            result.sort(key=lambda r: str(r.get(request.query['sort_key'])),
+                        reverse=request.query.get('sort_dir') == 'desc')
+        return result
+
+    @staticmethod
+    def _page(request, resources):
+        offset = int(request.query.get('offset', 0))
+        limit = request.query.get('limit')
+        end = offset + int(limit) if limit else None
+        return resources[offset:end]
+
+    def _collection(self, request, key, items):
+        """Returns a list body, linking to the next page if it is full."""
+        body = {key: items}
+        limit = int(request.query.get('limit') or 0)
+        if limit and len(items) == limit:
+            query = dict(request.query, offset=int(
+                request.query.get('offset', 0)) + limit)
+            body['%s_links' % key] = [{
+                'rel': 'next',
+                'href': '%s/%s?%s' % (self.base_url, request.path,
+                                      urlparse.urlencode(sorted(
+                                          query.items()))),
+            }]
+        return body
+
+    def _owned(self, request, resource):
+        if request.is_admin and _to_bool(
+                request.query.get('all_tenants', False)) in (True, '1'):
+            return True
+        if request.is_admin and 'project_id' in request.query:
+            return resource.get('project_id') == request.query['project_id']
+        return resource.get('project_id') == request.project_id
+
+    def _pools(self):
+        pools = []
+        for host in self.backends:
+            backend = host.split('@')[1]
+            pools.append({
+                'name': '%s#pool0' % host,
+                'host': host.split('@')[0],
+                'backend': backend,
+                'pool': 'pool0',
+                'capabilities': {
+                    'pool_name': 'pool0',
+                    'share_backend_name': backend,
+                    'vendor_name': 'Fake',
+                    'driver_version': '1.0',
+                    'driver_handles_share_servers': False,
+                    'snapshot_support': True,
+                    'create_share_from_snapshot_support': True,
+                    'revert_to_snapshot_support': True,
+                    'mount_snapshot_support': False,
+                    'storage_protocol': 'NFS_CIFS',
+                    'total_capacity_gb': 1000,
+                    'free_capacity_gb': 1000,
+                    'replication_domain': None,
+                    'qos': False,
+                    'timestamp': state.timestamp(),
+                },
+            })
+        return pools
+
+    def _pools_for_share_type(self, share_type):
+        """Returns the pools with the capabilities of a share type.
+
+        As with the capabilities filter of the scheduler, unscoped and
+        'capabilities:' extra specs must match a capability of the pool.
+        """
+        specs = {}
+        for key, value in share_type['extra_specs'].items():
+            scope, _, name = key.rpartition(':')
+            if scope in ('', 'capabilities') and name != 'availability_zones':
+                specs[name] = _to_bool(re.sub(r'^<is>\s*', '', value))
+        return [pool for pool in self._pools()
+                if all(k in pool['capabilities'] and
+                       pool['capabilities'][k] == v
+                       for k, v in specs.items())]
+
+    def _add_message(self, request, resource_id, action_id, detail_id,
+                     user_message):
+        self.store.add('message', {
+            'resource_type': 'SHARE',
+            'resource_id': resource_id,
+            'action_id': action_id,
+            'detail_id': detail_id,
+            'message_level': 'ERROR',
+            'user_message': user_message,
+            'request_id': 'req-%s' % uuid.uuid4(),
+            'expires_at': '2099-01-01T00:00:00.000000',
+            'project_id': request.project_id,
+        }, transient=None, final=None, attr='_state')
+
+    # Identity, for the dynamic credentials of the tests
+
+    def list_domains(self, request):
+        domain = {'id': 'default', 'name': 'Default', 'enabled': True,
+                  'description': None}
+        if request.query.get('name') not in (None, domain['name']):
+            return 200, {'domains': []}
+        return 200, {'domains': [domain]}
+
+    def _create_identity(self, registry, body):
+        resource = dict(body, id=self._identity_id(body['name']),
+                        enabled=body.get('enabled', True))
+        resource.pop('password', None)
+        with self._lock:
+            if resource['id'] in registry:
+                raise ApiError(409, 'Duplicate entry %s.' % body['name'])
+            registry[resource['id']] = resource
+        return resource
+
+    def _delete_identity(self, registry, rid, what):
+        with self._lock:
+            if registry.pop(rid, None) is None:
+                raise _not_found(what, rid)
+            self._assignments = set(
+                a for a in self._assignments if rid not in a)
+        return 204, None
+
+    def create_project(self, request):
+        return 201, {'project': self._create_identity(
+            self._projects, request.body['project'])}
+
+    def get_project(self, request, rid):
+        if rid not in self._projects:
+            raise _not_found('Project', rid)
+        return 200, {'project': self._projects[rid]}
+
+    def delete_project(self, request, rid):
+        return self._delete_identity(self._projects, rid, 'Project')
+
+    def create_user(self, request):
+        return 201, {'user': self._create_identity(
+            self._users, request.body['user'])}
+
+    def delete_user(self, request, rid):
+        return self._delete_identity(self._users, rid, 'User')
+
+    def list_roles(self, request):
+        return 200, {'roles': list(self._roles.values())}
+
+    def create_role(self, request):
+        role = request.body['role']
+        with self._lock:
+            self._roles.setdefault(role['name'], {
+                'id': role['name'], 'name': role['name']})
+        return 201, {'role': self._roles[role['name']]}
+
+    def assign_role(self, request, project, user, role):
+        if role not in self._roles:
+            raise _not_found('Role', role)
+        with self._lock:
+            self._assignments.add((user, project, role))
+        return 204, None
+
+    # Misc
+
+    def get_limits(self, request):
+        shares = [s for s in self.store.list('share')
+                  if s['project_id'] == request.project_id]
+        quotas = self._quota_set(request.project_id)
+        return 200, {'limits': {'rate': [], 'absolute': {
+            'maxTotalShares': quotas['shares'],
+            'maxTotalShareSnapshots': quotas['snapshots'],
+            'maxTotalShareGigabytes': quotas['gigabytes'],
+            'maxTotalSnapshotGigabytes': quotas['snapshot_gigabytes'],
+            'maxTotalShareNetworks': quotas['share_networks'],
+            'totalSharesUsed': len(shares),
+            'totalShareSnapshotsUsed': len(
+                [s for s in self.store.list('snapshot')
+                 if s['project_id'] == request.project_id]),
+            'totalShareGigabytesUsed': sum(s['size'] for s in shares),
+            'totalSnapshotGigabytesUsed': 0,
+            'totalShareNetworksUsed': len(
+                [s for s in self.store.list('share_network')
+                 if s['project_id'] == request.project_id]),
+        }}}
+
+    def list_extensions(self, request):
+        return 200, {'extensions': []}
+
+    # Shares
+
+    def _access_rules_status(self, share):
+        states = set(rule['state'] for rule in self.store.list(
+            'access_rule', lambda r: r['share_id'] == share['id']))
+        if 'error' in states:
+            return 'error'
+        if states - set(['active']):
+            return 'syncing'
+        return 'active'
+
+    def _share_view(self, request, share):
+        view = _view(share, request.version, SHARE_FIELD_VERSIONS)
+        if not request.at_least('2.6'):
+            view['share_type'] = share['share_type_name']
+        view['volume_type'] = view['share_type']
+        if 'access_rules_status' in view:
+            view['access_rules_status'] = self._access_rules_status(share)
+        if not request.at_least('2.9'):
+            paths = [el['path'] for el in share['_export_locations']]
+            view['export_locations'] = paths
+            view['export_location'] = paths[0] if paths else None
+        view['links'] = []
+        return view
+
+    def create_share(self, request):
+        body = request.body['share']
+        if (body.get('share_proto') or '').upper() not in SHARE_PROTOCOLS:
+            raise ApiError(400, 'Invalid share protocol %s.' % (
+                body.get('share_proto')))
+        is_public = _strict_bool(body.get('is_public', False), 'is_public')
+        if body.get('availability_zone') not in (None, AVAILABILITY_ZONE):
+            raise _not_found('Availability zone',
+                             body['availability_zone'])
+        share_type = self.default_share_type
+        if body.get('share_type'):
+            share_type = self._find_share_type(request, body['share_type'])
+        self._check_share_type_az(request, share_type,
+                                  body.get('availability_zone'))
+        snapshot = None
+        if body.get('snapshot_id'):
+            snapshot = self._get_visible(
+                request, 'snapshot', body['snapshot_id'], 'Snapshot')
+            if snapshot['status'] != 'available':
+                raise ApiError(400, 'Snapshot must be available.')
+        size = int(body.get('size') or (snapshot or {}).get('size') or 0)
+        if size < 1:
+            raise ApiError(400, 'Share size must be greater than 0.')
+        if snapshot and size < snapshot['size']:
+            raise ApiError(400, 'Share size must not be lower than the '
+                                'size of the snapshot.')
+        self._check_quota(request.project_id, request.context['user_id'],
+                          share_type['id'], shares=1, gigabytes=size)
+        pools = self._pools_for_share_type(share_type)
+        share_id = state.new_id()
+        instance_id = state.new_id()
+        host = pools[0]['name'] if pools else None
+        share = {
+            'id': share_id,
+            'name': body.get('name'),
+            'description': body.get('description'),
+            'size': size,
+            'share_proto': body['share_proto'].upper(),
+            'share_type': share_type['id'],
+            'share_type_name': share_type['name'],
+            'metadata': _check_metadata(body.get('metadata') or {}),
+            'is_public': is_public,
+            'project_id': request.project_id,
+            'user_id': request.context['user_id'],
+            'host': host,
+            'availability_zone': AVAILABILITY_ZONE,
+            'snapshot_id': body.get('snapshot_id'),
+            'share_network_id': body.get('share_network_id'),
+            'share_server_id': None,
+            'share_group_id': body.get('share_group_id'),
+            'source_share_group_snapshot_member_id': None,
+            'snapshot_support': _to_bool(share_type['extra_specs'].get(
+                'snapshot_support', True)),
+            'create_share_from_snapshot_support': True,
+            'revert_to_snapshot_support': True,
+            'mount_snapshot_support': False,
+            'replication_type': None,
+            'has_replicas': False,
+            'task_state': None,
+            'access_rules_status': 'active',
+            '_instance_id': instance_id,
+            '_export_locations': [{
+                'id': state.new_id(),
+                'path': '%s:/shares/share_%s' % (
+                    (host or 'nohost').split('@')[0], instance_id),
+                'preferred': True,
+                'is_admin_only': False,
+                'share_instance_id': instance_id,
+                'created_at': state.timestamp(),
+                'updated_at': state.timestamp(),
+            }],
+        }
+        if pools:
+            share = self.store.add('share', share)
+        else:
+            share = self.store.add('share', share, transient=None,
+                                   final='error')
+            self._add_message(
+                request, share_id, '001', '008',
+                'allocate host: No storage could be allocated for this '
+                'share request, Capabilities filter didn\'t succeed.')
+        return 200, {'share': self._share_view(request, share)}
+
+    @staticmethod
+    def _check_share_type_az(request, share_type, zone):
+        zones = _az_spec(share_type['extra_specs'])
+        if (zone and zones is not None and request.at_least('2.48') and
+                zone not in zones):
+            raise ApiError(400, 'Share type %s does not support availability '
+                                'zone %s.' % (share_type['id'], zone))
+
+    def _share_matches(self, request, share, filters=None):
+        """Applies the share list filters not matching share fields.
+
+        :param filters: names of the filters to apply, all by default.
+        """
+        query = dict((k, v) for k, v in request.query.items()
+                     if filters is None or k in filters)
+        if 'share_type_id' in query and (
+                share['share_type'] != query['share_type_id']):
+            return False
+        if 'extra_specs' in query:
+            share_type = self.store.get('share_type', share['share_type'])
+            specs = (share_type or {}).get('extra_specs', {})
+            if any(specs.get(k) != str(v) for k, v in _parse_dict_param(
+                    query['extra_specs']).items()):
+                return False
+        if request.at_least('2.35'):
+            for key, attr in (('export_location_id', 'id'),
+                              ('export_location_path', 'path')):
+                if key in query and query[key] not in [
+                        el[attr] for el in share['_export_locations']]:
+                    return False
+        return True
+
+    def list_shares(self, request, detail=False):
+        if not request.is_admin and (
+                'host' in request.query or
+                'share_server_id' in request.query):
+            raise ApiError(403, 'Only administrators can filter shares by '
+                                'host or share server.')
+        # Public shares of other projects are only listed on request.
+        with_public = _to_bool(request.query.get('is_public')) is True
+        shares = self.store.list(
+            'share', lambda s: (
+                (self._owned(request, s) or (with_public and s['is_public']))
+                and self._share_matches(request, s)))
+        shares = self._match(request, shares, ignored=(
+            'is_public', 'share_type_id', 'extra_specs',
+            'export_location_id', 'export_location_path'))
+        page = self._page(request, shares)
+        if detail:
+            body = self._collection(request, 'shares', [
+                self._share_view(request, s) for s in page])
+        else:
+            body = self._collection(request, 'shares', [
+                {'id': s['id'], 'name': s['name'], 'links': []}
+                for s in page])
+        if request.at_least('2.42') and _to_bool(
+                request.query.get('with_count')) is True:
+            body['count'] = len(shares)
+        return 200, body
+
+    def get_share(self, request, rid):
+        share = self._get_visible(request, 'share', rid, 'Share',
+                                  public_attr='is_public')
+        return 200, {'share': self._share_view(request, share)}
+
+    def _get_own_share(self, request, rid):
+        share = self._get_visible(request, 'share', rid, 'Share',
+                                  public_attr='is_public')
+        if not self._visible(request, share):
+            raise ApiError(403, 'Share %s belongs to another project.' % rid)
+        return share
+
+    def update_share(self, request, rid):
+        self._get_own_share(request, rid)
+        body = request.body['share']
+        attrs = dict((k, body[k]) for k in
+                     ('display_name', 'display_description', 'name',
+                      'description', 'is_public') if k in body)
+        for legacy, key in (('display_name', 'name'),
+                            ('display_description', 'description')):
+            if legacy in attrs:
+                attrs[key] = attrs.pop(legacy)
+        if 'is_public' in attrs:
+            attrs['is_public'] = _strict_bool(attrs['is_public'],
+                                              'is_public')
+        share = self.store.update('share', rid, **attrs)
+        return 200, {'share': self._share_view(request, share)}
+
+    def delete_share(self, request, rid):
+        share = self._get_own_share(request, rid)
+        if self.store.list('snapshot', lambda s: s['share_id'] == rid):
+            raise ApiError(403, 'Share %s has snapshots.' % rid)
+        if share['status'] not in ('available', 'error'):
+            raise ApiError(403, 'Share status must be available or error.')
+        self.store.remove('share', rid)
+        return 202, None
+
+    def share_action(self, request, rid):
+        action, params = list(request.body.items())[0]
+        action = action.replace('os-', '', 1)
+        handler = getattr(self, '_share_%s' % action, None)
+        if handler is None or not request.at_least(
+                SHARE_ACTION_VERSIONS.get(action, MIN_VERSION)):
+            raise ApiError(404, 'There is no such action: %s.' % action)
+        if action in ADMIN_SHARE_ACTIONS:
+            request.require_admin()
+        share = self._get_own_share(request, rid)
+        return handler(request, share, params)
+
+    def _share_extend(self, request, share, params):
+        new_size = int(params['new_size'])
+        if share['status'] != 'available':
+            raise ApiError(400, 'Share status must be available.')
+        if new_size <= share['size']:
+            raise ApiError(400, 'New size must be greater than the current '
+                                'one.')
+        self._check_quota(share['project_id'], share['user_id'],
+                          share['share_type'],
+                          gigabytes=new_size - share['size'], code=403)
+        self.store.update('share', share['id'], size=new_size)
+        self.store.transition('share', share['id'], 'extending',
+                              'available', error_status='extending_error')
+        return 202, None
+
+    def _share_shrink(self, request, share, params):
+        new_size = int(params['new_size'])
+        if share['status'] != 'available':
+            raise ApiError(400, 'Share status must be available.')
+        if new_size >= share['size'] or new_size < 1:
+            raise ApiError(400, 'New size must be lower than the current '
+                                'one.')
+        self.store.update('share', share['id'], size=new_size)
+        self.store.transition('share', share['id'], 'shrinking',
+                              'available', error_status='shrinking_error')
+        return 202, None
+
+    def _share_reset_status(self, request, share, params):
+        self.store.update('share', share['id'],
+                          status=_reset_status(params))
+        return 202, None
+
+    def _share_reset_task_state(self, request, share, params):
+        if params.get('task_state') not in TASK_STATES:
+            raise ApiError(400, 'Invalid task state %s.' % (
+                params.get('task_state')))
+        self.store.update('share', share['id'],
+                          task_state=params['task_state'])
+        return 202, None
+
+    def _share_force_delete(self, request, share, params):
+        for snapshot in self.store.list(
+                'snapshot', lambda s: s['share_id'] == share['id']):
+            self.store.remove('snapshot', snapshot['id'], transient=None)
+        self.store.remove('share', share['id'], transient=None)
+        return 202, None
+
+    def _share_revert(self, request, share, params):
+        snapshot = self.store.get('snapshot', params.get('snapshot_id'))
+        if snapshot is None or not self._visible(request, snapshot):
+            raise ApiError(400, 'Snapshot %s could not be found.' % (
+                params.get('snapshot_id')))
+        if snapshot['share_id'] != share['id']:
+            raise ApiError(400, 'Snapshot does not belong to the share.')
+        if share['status'] != 'available':
+            raise ApiError(409, 'Share status must be available.')
+        if snapshot['status'] != 'available':
+            raise ApiError(409, 'Snapshot status must be available.')
+        latest = max(self.store.list(
+            'snapshot', lambda s: s['share_id'] == share['id']),
+            key=lambda s: s['_sequence'])
+        if latest['id'] != snapshot['id']:
+            raise ApiError(409, 'Only the latest snapshot %s of the share '
+                                'can be reverted to.' % latest['id'])
+        self.store.transition('share', share['id'], 'reverting',
+                              'available', error_status='reverting_error')
+        return 202, None
+
+    @staticmethod
+    def _access_rule_view(request, rule):
+        return _view(rule, request.version, ACCESS_RULE_FIELD_VERSIONS)
+
+    @staticmethod
+    def _access_key(request, access_type, access_to):
+        """Validates an access rule, returns what identifies its target."""
+        if access_type == 'ip':
+            try:
+                network = netaddr.IPNetwork(access_to)
+            except (netaddr.AddrFormatError, ValueError):
+                raise ApiError(400, 'Invalid IP address %s.' % access_to)
+            if network.version == 6 and not request.at_least('2.38'):
+                raise ApiError(400, 'IPv6 rules require microversion 2.38.')
+            return network
+        if access_type == 'user':
+            if not USERNAME_REGEX.match(access_to):
+                raise ApiError(400, 'Invalid user name %s.' % access_to)
+        elif access_type == 'cert':
+            if not access_to.strip() or len(access_to) > 64:
+                raise ApiError(400, 'Invalid common name %s.' % access_to)
+        elif access_type == 'cephx':
+            if (not request.at_least('2.13') or not access_to or
+                    not CEPHX_ID_REGEX.match(access_to)):
+                raise ApiError(400, 'Invalid cephx id %s.' % access_to)
+        else:
+            raise ApiError(400, 'Invalid access type %s.' % access_type)
+        return access_to
+
+    def _share_allow_access(self, request, share, params):
+        if share['status'] != 'available':
+            raise ApiError(400, 'Share status must be available.')
+        if (params.get('access_level') or 'rw') not in ('rw', 'ro'):
+            raise ApiError(400, 'Invalid access level %s.' % (
+                params['access_level']))
+        key = self._access_key(request, params['access_type'],
+                               params['access_to'])
+        for rule in self.store.list(
+                'access_rule', lambda r: r['share_id'] == share['id']):
+            if (rule['access_type'] == params['access_type'] and
+                    self._access_key(request, rule['access_type'],
+                                     rule['access_to']) == key):
+                raise ApiError(400, 'Share access %s:%s exists.' % (
+                    params['access_type'], params['access_to']))
+        transient = 'queued_to_apply' if request.at_least('2.28') else 'new'
+        rule = self.store.add('access_rule', {
+            'share_id': share['id'],
+            'access_type': params['access_type'],
+            'access_to': params['access_to'],
+            'access_level': params.get('access_level') or 'rw',
+            'access_key': None,
+            'metadata': _check_metadata(params.get('metadata') or {}),
+            'project_id': share['project_id'],
+        }, transient=transient, final='active', attr='state')
+        return 200, {'access': self._access_rule_view(request, rule)}
+
+    def _share_deny_access(self, request, share, params):
+        rule = self.store.get('access_rule', params['access_id'])
+        if rule is None or rule['share_id'] != share['id']:
+            raise _not_found('Access rule', params['access_id'])
+        transient = 'queued_to_deny' if request.at_least('2.28') else None
+        self.store.remove('access_rule', rule['id'], transient=transient,
+                          attr='state', error_status='error')
+        return 202, None
+
+    def _share_access_list(self, request, share, params):
+        rules = self.store.list('access_rule',
+                                lambda r: r['share_id'] == share['id'])
+        return 200, {'access_list': [self._access_rule_view(request, r)
+                                     for r in rules]}
+
+    def _share_unmanage(self, request, share, params):
+        self.store.remove('share', share['id'], transient='unmanaging')
+        return 202, None
+
+    def manage_share(self, request):
+        request.require_admin()
+        raise ApiError(400, 'Managing shares is not supported by the fake '
+                            'API.')
+
+    def unmanage_share(self, request, rid):
+        request.require_admin()
+        share = self._get_visible(request, 'share', rid, 'Share')
+        return self._share_unmanage(request, share, None)
+
+    def get_metadata(self, request, rid):
+        share = self._get_visible(request, 'share', rid, 'Share',
+                                  public_attr='is_public')
+        return 200, {'metadata': share['metadata']}
+
+    def update_metadata(self, request, rid):
+        share = self._get_own_share(request, rid)
+        metadata = dict(share['metadata'],
+                        **_check_metadata(request.body['metadata']))
+        self.store.update('share', rid, metadata=metadata)
+        return 200, {'metadata': metadata}
+
+    def set_metadata(self, request, rid):
+        self._get_own_share(request, rid)
+        metadata = _check_metadata(request.body['metadata'])
+        self.store.update('share', rid, metadata=metadata)
+        return 200, {'metadata': metadata}
+
+    def delete_metadata(self, request, rid, key):
+        share = self._get_own_share(request, rid)
+        if key not in share['metadata']:
+            raise _not_found('Metadata key', key)
+        share['metadata'].pop(key)
+        self.store.update('share', rid, metadata=share['metadata'])
+        return 200, None
+
+    @staticmethod
+    def _export_location_view(request, export_location, detail=False):
+        view = _view(export_location, request.version,
+                     EXPORT_LOCATION_FIELD_VERSIONS)
+        if not request.is_admin:
+            view.pop('share_instance_id')
+            view.pop('is_admin_only')
+        if not detail:
+            view.pop('created_at')
+            view.pop('updated_at')
+        return view
+
+    def _export_locations(self, request, share):
+        """Returns the export locations of a share the user may see."""
+        return [el for el in share['_export_locations']
+                if request.is_admin or not el['is_admin_only']]
+
+    def _get_export_location(self, request, share, el):
+        for export_location in self._export_locations(request, share):
+            if export_location['id'] == el:
+                return 200, {'export_location': self._export_location_view(
+                    request, export_location, detail=True)}
+        raise _not_found('Export location', el)
+
+    def _get_share(self, request, rid):
+        # NOTE: as with the real API, export locations are not restricted
+        # to the shares of the project.
+        share = self.store.get('share', rid)
+        if share is None:
+            raise _not_found('Share', rid)
+        return share
+
+    def list_export_locations(self, request, rid):
+        share = self._get_share(request, rid)
+        return 200, {'export_locations': [
+            self._export_location_view(request, el)
+            for el in self._export_locations(request, share)]}
+
+    def get_export_location(self, request, rid, el):
+        return self._get_export_location(
+            request, self._get_share(request, rid), el)
+
+    def _instance_view(self, request, share):
+        return _view({
+            'id': share['_instance_id'],
+            'share_id': share['id'],
+            'status': share['status'],
+            'host': share['host'],
+            'availability_zone': share['availability_zone'],
+            'share_network_id': share['share_network_id'],
+            'share_server_id': share['share_server_id'],
+            'created_at': share['created_at'],
+            'replica_state': None,
+            'access_rules_status': self._access_rules_status(share),
+            'cast_rules_to_readonly': False,
+            'share_type_id': share['share_type'],
+            'export_location': share['_export_locations'][0]['path'],
+            'export_locations': [
+                el['path'] for el in share['_export_locations']],
+        }, request.version, INSTANCE_FIELD_VERSIONS)
+
+    def list_instances_of_share(self, request, rid):
+        request.require_admin()
+        share = self._get_visible(request, 'share', rid, 'Share')
+        return 200, {'share_instances': [
+            self._instance_view(request, share)]}
+
+    def list_share_instances(self, request):
+        request.require_admin()
+        shares = self.store.list('share', lambda s: self._share_matches(
+            request, s, ('export_location_id', 'export_location_path')))
+        return 200, {'share_instances': [
+            self._instance_view(request, s) for s in shares]}
+
+    def _find_instance(self, request, rid):
+        request.require_admin()
+        for share in self.store.list('share'):
+            if share['_instance_id'] == rid:
+                return share
+        raise _not_found('Share instance', rid)
+
+    def get_share_instance(self, request, rid):
+        share = self._find_instance(request, rid)
+        return 200, {'share_instance': self._instance_view(request, share)}
+
+    def list_instance_export_locations(self, request, rid):
+        share = self._find_instance(request, rid)
+        return 200, {'export_locations': [
+            self._export_location_view(request, el)
+            for el in share['_export_locations']]}
+
+    def get_instance_export_location(self, request, rid, el):
+        return self._get_export_location(
+            request, self._find_instance(request, rid), el)
+
+    def share_instance_action(self, request, rid):
+        request.require_admin()
+        action, params = list(request.body.items())[0]
+        action = action.replace('os-', '', 1)
+        share = self._find_instance(request, rid)
+        if action == 'reset_status':
+            self.store.update('share', share['id'],
+                              status=_reset_status(params))
+        elif action == 'force_delete':
+            self._share_force_delete(request, share, params)
+        else:
+            raise ApiError(404, 'There is no such action: %s.' % action)
+        return 202, None
+
+    # Snapshot instances (2.19+), one per snapshot
+
+    def _snapshot_instance_view(self, snapshot, detail=True):
+        view = {
+            'id': snapshot['_instance_id'],
+            'snapshot_id': snapshot['id'],
+            'status': snapshot['status'],
+        }
+        if detail:
+            share = self.store.get('share', snapshot['share_id']) or {}
+            view.update({
+                'share_id': snapshot['share_id'],
+                'share_instance_id': share.get('_instance_id'),
+                'provider_location': snapshot['provider_location'],
+                'progress': '100%' if snapshot['status'] == 'available'
+                else '0%',
+                'created_at': snapshot['created_at'],
+                'updated_at': snapshot['updated_at'],
+            })
+        return view
+
+    def _find_snapshot_instance(self, request, rid):
+        request.require_admin()
+        for snapshot in self.store.list('snapshot'):
+            if snapshot['_instance_id'] == rid:
+                return snapshot
+        raise _not_found('Snapshot instance', rid)
+
+    def list_snapshot_instances(self, request, detail=False):
+        request.require_admin()
+        snapshot_id = request.query.get('snapshot_id')
+        snapshots = self.store.list(
+            'snapshot', lambda s: snapshot_id in (None, s['id']))
+        return 200, {'snapshot_instances': [
+            self._snapshot_instance_view(s, detail) for s in snapshots]}
+
+    def get_snapshot_instance(self, request, rid):
+        return 200, {'snapshot_instance': self._snapshot_instance_view(
+            self._find_snapshot_instance(request, rid))}
+
+    def snapshot_instance_action(self, request, rid):
+        snapshot = self._find_snapshot_instance(request, rid)
+        action, params = list(request.body.items())[0]
+        if action != 'reset_status':
+            raise ApiError(404, 'There is no such action: %s.' % action)
+        self.store.update('snapshot', snapshot['id'],
+                          status=_reset_status(params))
+        return 202, None
+
+    # Access rules (2.45+)
+
+    def list_access_rules_new(self, request):
+        share_id = request.query.get('share_id')
+        if not share_id:
+            raise ApiError(400, 'share_id must be specified.')
+        try:
+            self._get_visible(request, 'share', share_id, 'Share')
+        except ApiError:
+            raise ApiError(400, 'Share %s does not exist.' % share_id)
+        rules = self.store.list('access_rule',
+                                lambda r: r['share_id'] == share_id)
+        rules = self._filter(request, rules, ignored=('share_id', ))
+        return 200, {'access_list': [self._access_rule_view(request, r)
+                                     for r in rules]}
+
+    def get_access(self, request, rid):
+        rule = self._get_visible(request, 'access_rule', rid, 'Access rule')
+        return 200, {'access': self._access_rule_view(request, rule)}
+
+    def update_access_metadata(self, request, rid):
+        rule = self._get_visible(request, 'access_rule', rid, 'Access rule')
+        metadata = dict(rule['metadata'],
+                        **_check_metadata(request.body['metadata']))
+        self.store.update('access_rule', rid, metadata=metadata)
+        return 200, {'metadata': metadata}
+
+    def delete_access_metadata(self, request, rid, key):
+        rule = self._get_visible(request, 'access_rule', rid, 'Access rule')
+        if key not in rule['metadata']:
+            raise _not_found('Metadata key', key)
+        rule['metadata'].pop(key)
+        self.store.update('access_rule', rid, metadata=rule['metadata'])
+        return 200, None
+
+    # Snapshots
+
+    def create_snapshot(self, request):
+        body = request.body['snapshot']
+        share = self._get_own_share(request, body['share_id'])
+        if share['status'] != 'available':
+            raise ApiError(400, 'Share status must be available.')
+        if not share['snapshot_support']:
+            raise ApiError(400, 'Share does not support snapshots.')
+        snapshot = self.store.add('snapshot', {
+            'share_id': share['id'],
+            'name': body.get('name') or body.get('display_name'),
+            'description': (body.get('description') or
+                            body.get('display_description')),
+            'size': share['size'],
+            'share_size': share['size'],
+            'share_proto': share['share_proto'],
+            'project_id': share['project_id'],
+            'user_id': request.context['user_id'],
+            'provider_location': 'snapshot_%s' % state.new_id(),
+            '_instance_id': state.new_id(),
+            '_sequence': next(self._sequence),
+        })
+        return 202, {'snapshot': self._snapshot_view(request, snapshot)}
+
+    def _snapshot_view(self, request, snapshot):
+        view = _view(snapshot, request.version, SNAPSHOT_FIELD_VERSIONS)
+        view.pop('updated_at')
+        if not (request.is_admin and request.at_least('2.12')):
+            view.pop('provider_location')
+        view['links'] = []
+        return view
+
+    def list_snapshots(self, request, detail=False):
+        snapshots = self._filter(request, self.store.list(
+            'snapshot', lambda s: self._owned(request, s)))
+        if detail:
+            return 200, self._collection(request, 'snapshots', [
+                self._snapshot_view(request, s) for s in snapshots])
+        return 200, self._collection(request, 'snapshots', [
+            {'id': s['id'], 'name': s['name'], 'links': []}
+            for s in snapshots])
+
+    def get_snapshot(self, request, rid):
+        snapshot = self._get_visible(request, 'snapshot', rid, 'Snapshot')
+        return 200, {'snapshot': self._snapshot_view(request, snapshot)}
+
+    def update_snapshot(self, request, rid):
+        self._get_visible(request, 'snapshot', rid, 'Snapshot')
+        body = request.body['snapshot']
+        attrs = {}
+        for key in ('name', 'description', 'display_name',
+                    'display_description'):
+            if key in body:
+                attrs[key.replace('display_', '')] = body[key]
+        snapshot = self.store.update('snapshot', rid, **attrs)
+        return 200, {'snapshot': self._snapshot_view(request, snapshot)}
+
+    def delete_snapshot(self, request, rid):
+        self._get_visible(request, 'snapshot', rid, 'Snapshot')
+        self.store.remove('snapshot', rid)
+        return 202, None
+
+    def snapshot_action(self, request, rid):
+        action, params = list(request.body.items())[0]
+        action = action.replace('os-', '', 1)
+        if action in ('reset_status', 'force_delete'):
+            request.require_admin()
+        snapshot = self._get_visible(request, 'snapshot', rid, 'Snapshot')
+        if action == 'reset_status':
+            self.store.update('snapshot', rid, status=_reset_status(params))
+        elif action == 'force_delete':
+            self.store.remove('snapshot', rid, transient=None)
+        elif action == 'allow_access':
+            rule = self.store.add('snapshot_access_rule', {
+                'snapshot_id': snapshot['id'],
+                'access_type': params['access_type'],
+                'access_to': params['access_to'],
+                'project_id': snapshot['project_id'],
+            }, transient='queued_to_apply', final='active', attr='state')
+            return 202, {'snapshot_access': _view(rule)}
+        elif action == 'deny_access':
+            rule = self.store.get('snapshot_access_rule',
+                                  params['access_id'])
+            if rule is None or rule['snapshot_id'] != rid:
+                raise _not_found('Snapshot access rule',
+                                 params['access_id'])
+            self.store.remove('snapshot_access_rule', rule['id'],
+                              transient='queued_to_deny', attr='state')
+        else:
+            raise ApiError(404, 'There is no such action: %s.' % action)
+        return 202, None
+
+    def list_snapshot_access_rules(self, request, rid):
+        self._get_visible(request, 'snapshot', rid, 'Snapshot')
+        rules = self.store.list('snapshot_access_rule',
+                                lambda r: r['snapshot_id'] == rid)
+        return 200, {'snapshot_access_list': [
+            dict((k, r[k]) for k in ('id', 'access_type', 'access_to',
+                                     'state')) for r in rules]}
+
+    # Share networks and security services
+
+    def create_share_network(self, request):
+        body = request.body['share_network']
+        share_network = dict((k, body.get(k)) for k in SHARE_NETWORK_FIELDS)
+        created_at = share_network.pop('created_at')
+        if created_at:
+            share_network['created_at'] = (
+                created_at if 'T' in created_at
+                else _date(created_at, 'created_at'))
+        share_network.update(project_id=request.project_id,
+                             _security_services=[])
+        share_network = self.store.add(
+            'share_network', share_network, transient=None, final=None,
+            attr='_state')
+        return 200, {'share_network': self._share_network_view(
+            request, share_network)}
+
+    @staticmethod
+    def _share_network_view(request, share_network):
+        return _view(share_network, request.version,
+                     SHARE_NETWORK_FIELD_VERSIONS)
+
+    def list_share_networks(self, request, detail=False):
+        share_networks = self.store.list(
+            'share_network', lambda s: self._owned(request, s))
+        security_service_id = request.query.get('security_service_id')
+        if security_service_id:
+            share_networks = [
+                s for s in share_networks
+                if security_service_id in s['_security_services']]
+        if 'created_since' in request.query:
+            since = _date(request.query['created_since'], 'created_since')
+            share_networks = [s for s in share_networks
+                              if s['created_at'] >= since]
+        if 'created_before' in request.query:
+            before = _date(request.query['created_before'],
+                           'created_before')
+            share_networks = [s for s in share_networks
+                              if s['created_at'] <= before]
+        share_networks = self._filter(
+            request, share_networks, ignored=(
+                'security_service_id', 'created_since', 'created_before'))
+        if not detail:
+            return 200, {'share_networks': [
+                {'id': s['id'], 'name': s['name']} for s in share_networks]}
+        return 200, {'share_networks': [
+            self._share_network_view(request, s) for s in share_networks]}
+
+    def get_share_network(self, request, rid):
+        share_network = self._get_visible(
+            request, 'share_network', rid, 'Share network')
+        return 200, {'share_network': self._share_network_view(
+            request, share_network)}
+
+    def update_share_network(self, request, rid):
+        self._get_visible(request, 'share_network', rid, 'Share network')
+        share_network = self.store.update(
+            'share_network', rid, **request.body['share_network'])
+        return 200, {'share_network': self._share_network_view(
+            request, share_network)}
+
+    def delete_share_network(self, request, rid):
+        self._get_visible(request, 'share_network', rid, 'Share network')
+        if self.store.list('share', lambda s: s['share_network_id'] == rid):
+            raise ApiError(409, 'Share network %s is in use.' % rid)
+        self.store.remove('share_network', rid, transient=None)
+        return 202, None
+
+    def share_network_action(self, request, rid):
+        share_network = self._get_visible(
+            request, 'share_network', rid, 'Share network')
+        action, params = list(request.body.items())[0]
+        ss_id = params['security_service_id']
+        security_service = self._get_visible(
+            request, 'security_service', ss_id, 'Security service')
+        services = share_network['_security_services']
+        if action == 'add_security_service':
+            if ss_id in services:
+                raise ApiError(409, 'Security service %s is already '
+                                    'associated with share network '
+                                    '%s.' % (ss_id, rid))
+            for other in services:
+                other = self.store.get('security_service', other)
+                if other and other['type'] == security_service['type']:
+                    raise ApiError(409, 'Share network %s already has a '
+                                        'security service of type '
+                                        '%s.' % (rid, other['type']))
+            services.append(ss_id)
+        elif action == 'remove_security_service' and ss_id in services:
+            services.remove(ss_id)
+        else:
+            raise ApiError(400, 'Invalid share network action %s.' % action)
+        # The associations are not fields of the share network, which is
+        # not updated.
+        share_network = self.store.update(
+            'share_network', rid, _security_services=services,
+            updated_at=share_network['updated_at'])
+        return 200, {'share_network': self._share_network_view(
+            request, share_network)}
+
+    def create_security_service(self, request):
+        body = request.body['security_service']
+        if body.get('type') not in SECURITY_SERVICE_TYPES:
+            raise ApiError(400, 'Invalid security service type %s, it must '
+                                'be one of %s.' % (
+                                    body.get('type'),
+                                    ', '.join(SECURITY_SERVICE_TYPES)))
+        security_service = self.store.add('security_service', dict(
+            dict((k, None) for k in ('name', 'description', 'dns_ip',
+                                     'server', 'domain', 'user', 'password',
+                                     'ou')),
+            project_id=request.project_id,
+            **body), transient=None, final='new')
+        return 200, {'security_service': self._security_service_view(
+            request, security_service)}
+
+    def _security_service_view(self, request, security_service):
+        view = _view(security_service, request.version,
+                     SECURITY_SERVICE_FIELD_VERSIONS)
+        view['share_networks'] = self._security_service_networks(
+            security_service['id'])
+        return view
+
+    def _security_service_networks(self, rid):
+        return [s['id'] for s in self.store.list('share_network')
+                if rid in s['_security_services']]
+
+    def list_security_services(self, request, detail=False):
+        security_services = self.store.list(
+            'security_service', lambda s: self._owned(request, s))
+        share_network_id = request.query.get('share_network_id')
+        if share_network_id:
+            share_network = self._get_visible(
+                request, 'share_network', share_network_id, 'Share network')
+            security_services = [
+                s for s in security_services
+                if s['id'] in share_network['_security_services']]
+        # NOTE: as with the real API, filters of administrators on fields
+        # security services do not have match none, those of the other
+        # users are ignored.
+        security_services = self._filter(
+            request, security_services, ignored=('share_network_id', ),
+            strict=request.is_admin)
+        if not detail:
+            return 200, {'security_services': [
+                dict((k, s[k]) for k in ('id', 'name', 'type', 'status'))
+                for s in security_services]}
+        return 200, {'security_services': [
+            self._security_service_view(request, s)
+            for s in security_services]}
+
+    def get_security_service(self, request, rid):
+        security_service = self._get_visible(
+            request, 'security_service', rid, 'Security service')
+        return 200, {'security_service': self._security_service_view(
+            request, security_service)}
+
+    def update_security_service(self, request, rid):
+        self._get_visible(request, 'security_service', rid,
+                          'Security service')
+        security_service = self.store.update(
+            'security_service', rid, **request.body['security_service'])
+        return 200, {'security_service': self._security_service_view(
+            request, security_service)}
+
+    def delete_security_service(self, request, rid):
+        self._get_visible(request, 'security_service', rid,
+                          'Security service')
+        if self._security_service_networks(rid):
+            raise ApiError(403, 'Security service %s is in use by share '
+                                'networks.' % rid)
+        self.store.remove('security_service', rid, transient=None)
+        return 202, None
+
+    # Share types
+
+    def _share_type_view(self, request, share_type):
+        public_key = ('share_type_access:is_public'
+                      if request.at_least('2.7')
+                      else 'os-share-type-access:is_public')
+        extra_specs = share_type['extra_specs']
+        if not request.is_admin:
+            extra_specs = dict(
+                (k, extra_specs.get(k, 'False'))
+                for k, added in USER_EXTRA_SPECS.items()
+                if k in extra_specs or request.at_least(added or MIN_VERSION))
+        view = {
+            'id': share_type['id'],
+            'name': share_type['name'],
+            'extra_specs': extra_specs,
+            'required_extra_specs': dict(
+                (k, v) for k, v in extra_specs.items()
+                if k == 'driver_handles_share_servers'),
+            public_key: share_type['is_public'],
+        }
+        if request.at_least('2.41'):
+            view['description'] = share_type['description']
+        if request.at_least('2.46'):
+            view['is_default'] = (
+                share_type['id'] == self.default_share_type['id'])
+        return view
+
+    def _find_share_type(self, request, name_or_id):
+        for share_type in self.store.list('share_type'):
+            if name_or_id in (share_type['id'], share_type['name']):
+                if (share_type['is_public'] or request.is_admin or
+                        request.project_id in share_type['_projects']):
+                    return share_type
+        raise _not_found('Share type', name_or_id)
+
+    def _share_type_body(self, request, share_type):
+        view = self._share_type_view(request, share_type)
+        return {'share_type': view, 'volume_type': view}
+
+    def create_share_type(self, request):
+        request.require_admin()
+        body = request.body['share_type']
+        if 'description' in body and not request.at_least('2.41'):
+            raise ApiError(400, 'Share type descriptions require '
+                                'microversion 2.41.')
+        extra_specs = _check_extra_specs(body.get('extra_specs'))
+        if 'driver_handles_share_servers' not in extra_specs:
+            raise ApiError(400, 'Required extra specification '
+                                'driver_handles_share_servers is missing.')
+        if any(s['name'] == body['name']
+               for s in self.store.list('share_type')):
+            raise ApiError(409, 'Share type %s exists.' % body['name'])
+        is_public = body.get('share_type_access:is_public',
+                             body.get('os-share-type-access:is_public', True))
+        share_type = self.store.add('share_type', {
+            'name': body['name'],
+            'description': body.get('description'),
+            'extra_specs': extra_specs,
+            'is_public': _to_bool(is_public),
+            '_projects': [],
+        }, transient=None, final=None, attr='_state')
+        return 200, self._share_type_body(request, share_type)
+
+    def list_share_types(self, request):
+        share_types = [
+            s for s in self.store.list('share_type')
+            if s['is_public'] or request.project_id in s['_projects']]
+        if request.is_admin and request.query.get('is_public') == 'all':
+            share_types = self.store.list('share_type')
+        extra_specs = _parse_dict_param(request.query.get('extra_specs'))
+        zones = extra_specs.pop(AZ_SPEC, None)
+        share_types = [
+            s for s in share_types
+            if all(s['extra_specs'].get(k) == str(v)
+                   for k, v in extra_specs.items())]
+        if zones:
+            # Share types without availability zones support them all.
+            zones = set(zone.strip() for zone in zones.split(','))
+            share_types = [
+                s for s in share_types
+                if zones.issubset(_az_spec(s['extra_specs']) or zones)]
+        return 200, {
+            'share_types': [self._share_type_view(request, s)
+                            for s in share_types],
+            'volume_types': [self._share_type_view(request, s)
+                             for s in share_types],
+        }
+
+    def get_default_share_type(self, request):
+        return 200, self._share_type_body(request, self.default_share_type)
+
+    def get_share_type(self, request, rid):
+        return 200, self._share_type_body(
+            request, self._find_share_type(request, rid))
+
+    def delete_share_type(self, request, rid):
+        request.require_admin()
+        share_type = self._find_share_type(request, rid)
+        if self.store.list('share', lambda s: s['share_type'] == rid):
+            raise ApiError(400, 'Share type %s is in use.' % rid)
+        self.store.remove('share_type', share_type['id'], transient=None)
+        return 202, None
+
+    def share_type_action(self, request, rid):
+        request.require_admin()
+        share_type = self._find_share_type(request, rid)
+        action, params = list(request.body.items())[0]
+        projects = share_type['_projects']
+        if share_type['is_public']:
+            raise ApiError(409, 'Share type %s is public.' % rid)
+        if action == 'addProjectAccess':
+            if params['project'] in projects:
+                raise ApiError(409, 'Project already has access.')
+            projects.append(params['project'])
+        elif action == 'removeProjectAccess':
+            if params['project'] not in projects:
+                raise ApiError(404, 'Project has no access.')
+            projects.remove(params['project'])
+        else:
+            raise ApiError(400, 'Invalid share type action %s.' % action)
+        self.store.update('share_type', rid, _projects=projects)
+        return 202, None
+
+    def list_share_type_access(self, request, rid):
+        request.require_admin()
+        share_type = self._find_share_type(request, rid)
+        if share_type['is_public']:
+            raise ApiError(404, 'Access list not available for public '
+                                'share types.')
+        return 200, {'share_type_access': [
+            {'share_type_id': rid, 'project_id': p}
+            for p in share_type['_projects']]}
+
+    def get_extra_specs(self, request, rid):
+        request.require_admin()
+        share_type = self._find_share_type(request, rid)
+        return 200, {'extra_specs': share_type['extra_specs']}
+
+    def get_extra_spec(self, request, rid, key):
+        request.require_admin()
+        share_type = self._find_share_type(request, rid)
+        if key not in share_type['extra_specs']:
+            raise _not_found('Extra spec', key)
+        return 200, {key: share_type['extra_specs'][key]}
+
+    def _set_extra_specs(self, request, rid, extra_specs):
+        request.require_admin()
+        share_type = self._find_share_type(request, rid)
+        extra_specs = _check_extra_specs(extra_specs)
+        specs = dict(share_type['extra_specs'], **extra_specs)
+        self.store.update('share_type', share_type['id'], extra_specs=specs)
+        return extra_specs
+
+    def update_extra_specs(self, request, rid):
+        specs = self._set_extra_specs(
+            request, rid, request.body.get('extra_specs'))
+        return 200, {'extra_specs': specs}
+
+    def update_extra_spec(self, request, rid, key):
+        return 200, self._set_extra_specs(request, rid, request.body)
+
+    def delete_extra_spec(self, request, rid, key):
+        request.require_admin()
+        share_type = self._find_share_type(request, rid)
+        if key == 'driver_handles_share_servers' or (
+                key == 'snapshot_support' and not request.at_least('2.24')):
+            raise ApiError(403, 'Required extra spec cannot be deleted.')
+        if key not in share_type['extra_specs']:
+            raise _not_found('Extra spec', key)
+        share_type['extra_specs'].pop(key)
+        self.store.update('share_type', rid,
+                          extra_specs=share_type['extra_specs'])
+        return 202, None
+
+    # Share group types and share groups
+
+    def _share_group_type_view(self, request, share_group_type):
+        view = _view(share_group_type)
+        if request.at_least('2.46'):
+            view['is_default'] = False
+        return view
+
+    def create_share_group_type(self, request):
+        request.require_admin()
+        body = request.body['share_group_type']
+        share_types = [self._find_share_type(request, s)['id']
+                       for s in body.get('share_types') or []]
+        if not share_types:
+            raise ApiError(400, 'Share group types need share types.')
+        share_group_type = self.store.add('share_group_type', {
+            'name': body.get('name'),
+            'share_types': share_types,
+            'group_specs': dict((k, str(v)) for k, v in (
+                body.get('group_specs') or {}).items()),
+            'is_public': _strict_bool(body.get('is_public', True),
+                                      'is_public'),
+        }, transient=None, final=None, attr='_state')
+        return 200, {'share_group_type': self._share_group_type_view(
+            request, share_group_type)}
+
+    def list_share_group_types(self, request):
+        return 200, {'share_group_types': [
+            self._share_group_type_view(request, s)
+            for s in self.store.list('share_group_type')]}
+
+    def _find_share_group_type(self, request, rid):
+        share_group_type = self.store.get('share_group_type', rid)
+        if share_group_type is None:
+            raise _not_found('Share group type', rid)
+        return share_group_type
+
+    def get_share_group_type(self, request, rid):
+        return 200, {'share_group_type': self._share_group_type_view(
+            request, self._find_share_group_type(request, rid))}
+
+    def delete_share_group_type(self, request, rid):
+        request.require_admin()
+        self._find_share_group_type(request, rid)
+        if self.store.list('share_group',
+                           lambda g: g['share_group_type_id'] == rid):
+            raise ApiError(400, 'Share group type %s is in use.' % rid)
+        self.store.remove('share_group_type', rid, transient=None)
+        return 204, None
+
+    def create_share_group(self, request):
+        body = request.body['share_group']
+        share_group_type = self._find_share_group_type(
+            request, body.get('share_group_type_id'))
+        share_types = body.get('share_types') or share_group_type[
+            'share_types']
+        share_types = [self._find_share_type(request, s) for s in share_types]
+        zone = body.get('availability_zone')
+        if zone not in (None, AVAILABILITY_ZONE):
+            raise _not_found('Availability zone', zone)
+        for share_type in share_types:
+            self._check_share_type_az(request, share_type, zone)
+        share_group = self.store.add('share_group', {
+            'name': body.get('name'),
+            'description': body.get('description'),
+            'share_group_type_id': share_group_type['id'],
+            'share_types': [s['id'] for s in share_types],
+            'share_network_id': body.get('share_network_id'),
+            'availability_zone': AVAILABILITY_ZONE,
+            'source_share_group_snapshot_id': None,
+            'share_server_id': None,
+            'host': self.backends[0],
+            'project_id': request.project_id,
+        })
+        return 202, {'share_group': _view(share_group)}
+
+    def get_share_group(self, request, rid):
+        return 200, {'share_group': _view(self._get_visible(
+            request, 'share_group', rid, 'Share group'))}
+
+    def delete_share_group(self, request, rid):
+        self._get_visible(request, 'share_group', rid, 'Share group')
+        if self.store.list('share', lambda s: s['share_group_id'] == rid):
+            raise ApiError(409, 'Share group %s has shares.' % rid)
+        self.store.remove('share_group', rid)
+        return 202, None
+
+    # Services, pools and availability zones
+
+    def list_services(self, request):
+        request.require_admin()
+        services = [{
+            'id': 1, 'binary': 'manila-scheduler', 'host': 'fakehost0',
+            'zone': 'nova', 'status': 'enabled', 'state': 'up',
+            'updated_at': state.timestamp(),
+        }]
+        for i, host in enumerate(self.backends, 2):
+            services.append({
+                'id': i, 'binary': 'manila-share', 'host': host,
+                'zone': 'nova', 'status': 'enabled', 'state': 'up',
+                'updated_at': state.timestamp(),
+            })
+        for service in services:
+            if (service['host'], service['binary']) in self._disabled_services:
+                service['status'] = 'disabled'
+        return 200, {'services': self._filter(request, services)}
+
+    def update_service(self, request, action):
+        request.require_admin()
+        host = request.body.get('host')
+        binary = request.body.get('binary')
+        hosts = ['fakehost0'] if binary == 'manila-scheduler' else (
+            self.backends if binary == 'manila-share' else [])
+        if host not in hosts:
+            raise ApiError(404, 'Service %s on host %s not found.' % (
+                binary, host))
+        if action == 'disable':
+            self._disabled_services.add((host, binary))
+        else:
+            self._disabled_services.discard((host, binary))
+        return 200, {'host': host, 'binary': binary,
+                     'disabled': action == 'disable'}
+
+    def list_availability_zones(self, request):
+        return 200, {'availability_zones': [{
+            'id': '00000000-0000-0000-0000-000000000001', 'name': 'nova',
+            'created_at': '2018-01-01T00:00:00.000000', 'updated_at': None,
+        }]}
+
+    def list_pools(self, request, detail=False):
+        request.require_admin()
+        pools = self._pools()
+        if request.query.get('share_type'):
+            pools = self._pools_for_share_type(self._find_share_type(
+                request, request.query['share_type']))
+        for key in ('host', 'backend', 'pool'):
+            if key in request.query:
+                pools = [p for p in pools
+                         if re.match(request.query[key], p[key])]
+        if not detail:
+            for pool in pools:
+                pool.pop('capabilities')
+        return 200, {'pools': pools}
+
+    # Quotas
+
+    def _quota_set(self, project_id, user_id=None, share_type=None):
+        quotas = dict(DEFAULT_QUOTAS, **SHARE_GROUP_QUOTAS)
+        quotas.update(self._quotas.get((project_id, None, None), {}))
+        if user_id or share_type:
+            quotas.update(self._quotas.get(
+                (project_id, user_id, share_type), {}))
+        return quotas
+
+    def _quota_usages(self, project_id, user_id=None, share_type=None):
+        """Returns the usages of the quotas of a project, user or type."""
+        shares = self.store.list('share', lambda s: (
+            s['project_id'] == project_id and
+            user_id in (None, s['user_id']) and
+            share_type in (None, s['share_type'])))
+        return {'shares': len(shares),
+                'gigabytes': sum(s['size'] for s in shares)}
+
+    def _check_quota(self, project_id, user_id, share_type, code=413,
+                     **deltas):
+        """Raises if adding 'deltas' exceeds any quota of the resource.
+
+        The quotas of the project, of the user and of the share type of
+        the resource are all checked.
+        """
+        for scope in ((None, None), (user_id, None), (None, share_type)):
+            usages = self._quota_usages(project_id, *scope)
+            quotas = self._quota_set(project_id, *scope)
+            for key, delta in deltas.items():
+                if 0 <= quotas[key] < usages[key] + delta:
+                    raise ApiError(code, 'Quota exceeded for %s, %d of %d '
+                                         'used.' % (key, usages[key],
+                                                    quotas[key]))
+
+    def _quota_key(self, request, project):
+        """Returns the key of the quotas a request is about.
+
+        Share types are given by name or id, their quotas are kept by id.
+        """
+        user_id = request.query.get('user_id')
+        share_type = request.query.get('share_type')
+        if share_type:
+            if not request.at_least('2.39'):
+                raise ApiError(400, 'Share type quotas require microversion '
+                                    '2.39.')
+            if user_id:
+                raise ApiError(400, 'Quotas are either of a user or of a '
+                                    'share type.')
+            share_type = self._find_share_type(request, share_type)['id']
+        return project, user_id, share_type
+
+    @staticmethod
+    def _quota_keys(request):
+        keys = dict(DEFAULT_QUOTAS)
+        if request.query.get('share_type'):
+            # Share networks and share groups have no share type quotas.
+            keys.pop('share_networks')
+        elif request.at_least('2.40'):
+            keys.update(SHARE_GROUP_QUOTAS)
+        return keys
+
+    def default_quotas(self, request, project):
+        quotas = self._quota_keys(request)
+        quotas['id'] = project
+        return 200, {'quota_set': quotas}
+
+    def show_quotas(self, request, project, detail=False):
+        key = self._quota_key(request, project)
+        quotas = self._quota_set(*key)
+        keys = self._quota_keys(request)
+        quota_set = dict((k, quotas[k]) for k in keys)
+        if detail:
+            usages = self._quota_usages(*key)
+            quota_set = dict(
+                (k, {'limit': v, 'in_use': usages.get(k, 0), 'reserved': 0})
+                for k, v in quota_set.items())
+        quota_set['id'] = project
+        return 200, {'quota_set': quota_set}
+
+    def update_quotas(self, request, project):
+        request.require_admin()
+        key = self._quota_key(request, project)
+        body = dict(request.body['quota_set'])
+        force = _to_bool(body.pop('force', False)) is True
+        body.pop('tenant_id', None)
+        keys = self._quota_keys(request)
+        project_quotas = self._quota_set(project)
+        values = {}
+        for name, value in body.items():
+            if name not in keys:
+                raise ApiError(400, 'Bad key %s in quota set.' % name)
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                value = None
+            if value is None or value < -1:
+                raise ApiError(400, 'Quota %s must be an integer greater '
+                                    'than or equal to -1.' % name)
+            limit = project_quotas[name]
+            if key[1:] != (None, None) and not force and limit != -1 and (
+                    value == -1 or value > limit):
+                raise ApiError(400, 'Quota %s of %d is bigger than the one '
+                                    'of the project, %d.' % (
+                                        name, value, limit))
+            values[name] = value
+        with self._lock:
+            self._quotas.setdefault(key, {}).update(values)
+        return self.show_quotas(request, project)
+
+    def reset_quotas(self, request, project):
+        request.require_admin()
+        key = self._quota_key(request, project)
+        with self._lock:
+            self._quotas.pop(key, None)
+        return 202, None
+
+    # Share replicas
+
+    def list_share_replicas(self, request, detail=False):
+        return 200, {'share_replicas': []}
+
+    # Share servers, there are none as share servers are not handled
+
+    def list_share_servers(self, request):
+        request.require_admin()
+        return 200, {'share_servers': []}
+
+    def get_share_server(self, request, rid):
+        request.require_admin()
+        raise _not_found('Share server', rid)
+
+    def delete_share_server(self, request, rid):
+        request.require_admin()
+        raise _not_found('Share server', rid)
+
+    # User messages
+
+    @staticmethod
+    def _message_view(message):
+        view = _view(message)
+        view.pop('updated_at')
+        view['links'] = []
+        return view
+
+    def list_messages(self, request):
+        messages = self._filter(request, self.store.list(
+            'message', lambda m: self._owned(request, m)))
+        return 200, self._collection(request, 'messages', [
+            self._message_view(m) for m in messages])
+
+    def get_message(self, request, rid):
+        return 200, {'message': self._message_view(
+            self._get_visible(request, 'message', rid, 'Message'))}
+
+    def delete_message(self, request, rid):
+        self._get_visible(request, 'message', rid, 'Message')
+        self.store.remove('message', rid, transient=None)
+        return 204, None
+
+
+def _parse_dict_param(value):
+    """Parses dict query parameters, sent as str(dict) by the clients."""
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return value
+    try:
+        return json.loads(value.replace("'", '"'))
+    except ValueError:
+        return {}
+
+
+_REASONS = {200: 'OK', 201: 'Created', 202: 'Accepted', 204: 'No Content',
+            300: 'Multiple Choices', 400: 'Bad Request',
+            401: 'Unauthorized', 403: 'Forbidden', 404: 'Not Found',
+            406: 'Not Acceptable', 409: 'Conflict',
+            413: 'Request Entity Too Large'}
+
+
+class _ThreadingWSGIServer(socketserver.ThreadingMixIn,
+                           simple_server.WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(simple_server.WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeManilaServer(object):
+    """Serves a FakeManilaApp on localhost from a background thread.
+
+    :param port: port to listen on, 0 picks a free one.
+    :param kwargs: arguments of FakeManilaApp.
+    """
+
+    def __init__(self, port=0, **kwargs):
+        self.app = FakeManilaApp(**kwargs)
+        self._server = simple_server.make_server(
+            '127.0.0.1', port, self.app, server_class=_ThreadingWSGIServer,
+            handler_class=_QuietHandler)
+        self.url = 'http://127.0.0.1:%d' % self._server.server_port
+        self.app.base_url = self.url
+        self._thread = None
+
+    @property
+    def identity_uri(self):
+        return '%s/identity/v3' % self.url
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
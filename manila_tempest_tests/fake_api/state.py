@@ -0,0 +1,165 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-memory resources of the fake Manila API and their state machines.
+
+Asynchronous operations put a resource in a transient status, e.g.
+'creating', and schedule its final one, e.g. 'available', after the
+latency configured for its resource type. Transitions are applied lazily,
+whenever the store is read, so no background thread is needed. With the
+configured error rate, a transition ends in an error status instead.
+"""
+
+import collections
+import copy
+import random
+import threading
+import time
+import uuid
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+# Resource types a latency or an error rate can be configured for.
+RESOURCE_TYPES = (
+    'share', 'snapshot', 'access_rule', 'snapshot_access_rule',
+    'share_network', 'security_service', 'share_type', 'message',
+)
+
+
+def new_id():
+    return str(uuid.uuid4())
+
+
+def timestamp():
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000000', time.gmtime())
+
+
+class ResourceStore(object):
+    """Thread-safe store of the fake resources.
+
+    :param latencies: dict mapping resource types to the number of seconds
+        their transient statuses last. Missing types complete immediately.
+    :param error_rates: dict mapping resource types to the probability, from
+        0 to 1, of a transition ending in an error status.
+    :param seed: seed of the random generator deciding the errors, for
+        reproducible runs.
+    :param listener: optional callable receiving the resource type, id and
+        new status of every completed transition, e.g. the publish method
+        of an events.LocalEventSource. A deletion has a status of None.
+    """
+
+    def __init__(self, latencies=None, error_rates=None, seed=None,
+                 listener=None):
+        self.latencies = dict(latencies or {})
+        self.error_rates = dict(error_rates or {})
+        self.listener = listener
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._resources = collections.defaultdict(collections.OrderedDict)
+        # (resource type, id) -> (due time, status attribute, next status).
+        # A next status of None means that the resource is removed.
+        self._transitions = {}
+
+    def _advance(self):
+        now = monotonic()
+        for key, (due, attr, status) in list(self._transitions.items()):
+            if due > now:
+                continue
+            del self._transitions[key]
+            rtype, rid = key
+            if status is None:
+                self._resources[rtype].pop(rid, None)
+            elif rid in self._resources[rtype]:
+                resource = self._resources[rtype][rid]
+                resource[attr] = status
+                resource['updated_at'] = timestamp()
+            else:
+                continue
+            if self.listener is not None:
+                self.listener(rtype, rid, status)
+
+    def _advance_later(self):
+        with self._lock:
+            self._advance()
+
+    def _schedule(self, rtype, rid, attr, status, error_status):
+        if self._random.random() < self.error_rates.get(rtype, 0):
+            status = error_status
+        latency = self.latencies.get(rtype, 0)
+        self._transitions[(rtype, rid)] = (monotonic() + latency, attr, status)
+        if self.listener is not None and latency > 0:
+            # Transitions are otherwise only applied when the store is read.
+            timer = threading.Timer(latency, self._advance_later)
+            timer.daemon = True
+            timer.start()
+        self._advance()
+
+    def add(self, rtype, resource, transient='creating', final='available',
+            attr='status', error_status='error'):
+        """Stores a new resource, which then transitions to 'final'.
+
+        The returned copy is in the transient status, as the response of
+        the creation request is, even if the transition has no latency.
+        """
+        with self._lock:
+            resource.setdefault('id', new_id())
+            resource.setdefault('created_at', timestamp())
+            resource.setdefault('updated_at', None)
+            self._resources[rtype][resource['id']] = resource
+            if final is None or transient is None:
+                resource[attr] = final or transient
+                return copy.deepcopy(resource)
+            resource[attr] = transient
+            created = copy.deepcopy(resource)
+            self._schedule(rtype, resource['id'], attr, final, error_status)
+            return created
+
+    def transition(self, rtype, rid, transient, final, attr='status',
+                   error_status='error'):
+        """Moves a resource to 'transient', then to 'final'."""
+        with self._lock:
+            self._resources[rtype][rid][attr] = transient
+            self._schedule(rtype, rid, attr, final, error_status)
+
+    def remove(self, rtype, rid, transient='deleting', attr='status',
+               error_status='error_deleting'):
+        """Removes a resource, through a transient status if any."""
+        with self._lock:
+            if transient is None:
+                self._resources[rtype].pop(rid, None)
+                self._transitions.pop((rtype, rid), None)
+            else:
+                self._resources[rtype][rid][attr] = transient
+                self._schedule(rtype, rid, attr, None, error_status)
+
+    def update(self, rtype, rid, **attrs):
+        """Updates a resource, by default setting its update time."""
+        with self._lock:
+            resource = self._resources[rtype][rid]
+            attrs.setdefault('updated_at', timestamp())
+            resource.update(attrs)
+            self._transitions.pop((rtype, rid), None)
+            return copy.deepcopy(resource)
+
+    def get(self, rtype, rid):
+        """Returns a copy of a resource, or None if there is no such one."""
+        with self._lock:
+            self._advance()
+            resource = self._resources[rtype].get(rid)
+            return copy.deepcopy(resource) if resource is not None else None
+
+    def list(self, rtype, predicate=None):
+        """Returns copies of the resources matching 'predicate'."""
+        with self._lock:
+            self._advance()
+            return [copy.deepcopy(r) for r in self._resources[rtype].values()
+                    if predicate is None or predicate(r)]
@@ -24,10 +24,34 @@ from tempest.lib.common import rest_client
 from tempest.lib.common.utils import data_utils
 from tempest.lib import exceptions
 
+from manila_tempest_tests.common import cassette
+from manila_tempest_tests.common import discovery_cache
+from manila_tempest_tests.common import http_pool
+from manila_tempest_tests.common import instrumentation
+from manila_tempest_tests.common import waiters
 from manila_tempest_tests import share_exceptions
 
 CONF = config.CONF
 
+# Keyword arguments identifying a resource in is_resource_deleted, with the
+# type of the resource, in the order in which they are looked up.
+DELETED_RESOURCE_KEYS = (
+    ('rule_id', 'access_rule'),
+    ('share_instance_id', 'share_instance'),
+    ('share_group_id', 'share_group'),
+    ('share_group_snapshot_id', 'share_group_snapshot'),
+    ('share_group_type_id', 'share_group_type'),
+    ('replica_id', 'share_replica'),
+    ('message_id', 'message'),
+    ('share_id', 'share'),
+    ('snapshot_id', 'snapshot'),
+    ('sn_id', 'share_network'),
+    ('ss_id', 'security_service'),
+    ('vt_id', 'volume_type'),
+    ('st_id', 'share_type'),
+    ('server_id', 'share_server'),
+)
+
 
 class SharesClient(rest_client.RestClient):
     """Tempest REST client for Manila.
@@ -37,11 +61,22 @@ class SharesClient(rest_client.RestClient):
 
     def __init__(self, auth_provider, **kwargs):
         super(SharesClient, self).__init__(auth_provider, **kwargs)
+        if CONF.share.http_connection_pooling and not kwargs.get('proxy_url'):
+            self.http_obj = http_pool.get_shared_http(
+                disable_ssl_certificate_validation=self.dscv,
+                ca_certs=kwargs.get('ca_certs'),
+                timeout=kwargs.get('http_timeout'),
+                follow_redirects=kwargs.get('follow_redirects', True),
+                maxsize=CONF.share.http_pool_maxsize,
+                block=CONF.share.http_pool_block)
+        self.http_obj = cassette.get_http(
+            self.http_obj, endpoint=lambda: self.base_url)
         self.share_protocol = None
         if CONF.share.enable_protocols:
             self.share_protocol = CONF.share.enable_protocols[0]
         self.share_network_id = CONF.share.share_network_id
         self.share_size = CONF.share.share_size
+        self.waiter_backoff = waiters.get_backoff_policy(self.build_interval)
 
     def create_share(self, share_protocol=None, size=None,
                      name=None, snapshot_id=None, description=None,
@@ -218,70 +253,134 @@ class SharesClient(rest_client.RestClient):
         self.expected_success(202, resp.status)
         return body
 
-    def wait_for_share_status(self, share_id, status):
-        """Waits for a share to reach a given status."""
-        body = self.get_share(share_id)
-        share_name = body['name']
-        share_status = body['status']
-        start = int(time.time())
-
-        while share_status != status:
-            time.sleep(self.build_interval)
-            body = self.get_share(share_id)
-            share_status = body['status']
-            if share_status == status:
+    def _request(self, method, url, headers=None, body=None, chunked=False):
+        collector = instrumentation.get_collector()
+        if collector is None:
+            return super(SharesClient, self)._request(
+                method, url, headers=headers, body=body, chunked=chunked)
+        resp = resp_body = None
+        start = time.time()
+        try:
+            resp, resp_body = super(SharesClient, self)._request(
+                method, url, headers=headers, body=body, chunked=chunked)
+            return resp, resp_body
+        finally:
+            microversion = (headers or {}).get(
+                getattr(self, 'API_MICROVERSIONS_HEADER', None))
+            collector.record_request(
+                method, url, microversion,
+                resp.status if resp is not None else None,
+                time.time() - start,
+                len(body) if body and not chunked else 0,
+                len(resp_body) if resp_body else 0)
+
+    def get_connection_pool_stats(self):
+        """Returns the statistics of the HTTP pool used by this client.
+
+        :returns: dict with keys 'requests', 'hits', 'new_connections' and
+            'waits', or None if connection pooling is disabled.
+        """
+        stats = getattr(self.http_obj, 'stats', None)
+        return stats.as_dict() if stats is not None else None
+
+    def _iter_pages(self, list_page, params=None, predicate=None,
+                    page_size=None):
+        """Yields the resources of a collection, one page at a time.
+
+        Pages are only requested as the resources are consumed, so callers
+        which stop iterating, e.g. once they found what they look for,
+        spare the requests for the remaining pages.
+
+        :param list_page: callable receiving the query parameters of a page
+            and returning the list of its resources.
+        :param params: filters of the listing. 'limit' caps the number of
+            resources yielded and 'offset' is where to start from.
+        :param predicate: optional predicate on the resources to yield.
+        :param page_size: number of resources per page. Defaults to
+            CONF.share.list_page_size.
+        """
+        page_size = page_size or CONF.share.list_page_size
+        params = dict(params or {})
+        limit = params.pop('limit', None)
+        offset = int(params.pop('offset', 0))
+        remaining = int(limit) if limit is not None else None
+        # NOTE: resources created or deleted meanwhile shift the pages, so
+        # the ones seen already are skipped if they show up again.
+        seen = set()
+        while remaining is None or remaining > 0:
+            page = list_page(dict(params, limit=page_size, offset=offset))
+            new_ids = False
+            for resource in page:
+                resource_id = resource.get('id')
+                if resource_id is not None:
+                    if resource_id in seen:
+                        continue
+                    seen.add(resource_id)
+                    new_ids = True
+                if predicate is None or predicate(resource):
+                    yield resource
+                    if remaining is not None:
+                        remaining -= 1
+                        if remaining <= 0:
+                            return
+            # NOTE: endpoints which do not paginate return everything at
+            # once, whatever the limit, i.e. the same full page again if
+            # there are exactly page_size resources.
+            if len(page) != page_size or (seen and not new_ids):
                 return
-            elif 'error' in share_status.lower():
-                raise share_exceptions.ShareBuildErrorException(
-                    share_id=share_id)
+            offset += page_size
 
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('Share %s failed to reach %s status within '
-                           'the required time (%s s).' %
-                           (share_name, status, self.build_timeout))
-                raise exceptions.TimeoutException(message)
+    def _wait_for_resource_status(self, show, status, **kwargs):
+        """Waits for a resource to reach a given status.
+
+        Thin wrapper around waiters.wait_for_resource_status using the
+        timeout and backoff policy of this client.
+        """
+        return waiters.wait_for_resource_status(
+            show, status, self.build_timeout, self.waiter_backoff, **kwargs)
+
+    def wait_for_share_status(self, share_id, status):
+        """Waits for a share to reach a given status."""
+        return self._wait_for_resource_status(
+            lambda: self.get_share(share_id), status,
+            error_exception=lambda body: (
+                share_exceptions.ShareBuildErrorException(share_id=share_id)),
+            timeout_message=lambda body: (
+                'Share %s failed to reach %s status within the required '
+                'time (%s s).' % (body['name'], status, self.build_timeout)),
+            resource_type='share', resource_id=share_id)
 
     def wait_for_snapshot_status(self, snapshot_id, status):
         """Waits for a snapshot to reach a given status."""
-        body = self.get_snapshot(snapshot_id)
-        snapshot_name = body['name']
-        snapshot_status = body['status']
-        start = int(time.time())
-
-        while snapshot_status != status:
-            time.sleep(self.build_interval)
-            body = self.get_snapshot(snapshot_id)
-            snapshot_status = body['status']
-            if 'error' in snapshot_status:
-                raise share_exceptions.SnapshotBuildErrorException(
-                    snapshot_id=snapshot_id)
-
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('Share Snapshot %s failed to reach %s status '
-                           'within the required time (%s s).' %
-                           (snapshot_name, status, self.build_timeout))
-                raise exceptions.TimeoutException(message)
+        return self._wait_for_resource_status(
+            lambda: self.get_snapshot(snapshot_id), status,
+            error_exception=lambda body: (
+                share_exceptions.SnapshotBuildErrorException(
+                    snapshot_id=snapshot_id)),
+            timeout_message=lambda body: (
+                'Share Snapshot %s failed to reach %s status within the '
+                'required time (%s s).' % (
+                    body['name'], status, self.build_timeout)),
+            resource_type='snapshot', resource_id=snapshot_id)
 
     def wait_for_access_rule_status(self, share_id, rule_id, status):
         """Waits for an access rule to reach a given status."""
-        rule_status = "new"
-        start = int(time.time())
-        while rule_status != status:
-            time.sleep(self.build_interval)
-            rules = self.list_access_rules(share_id)
-            for rule in rules:
+        def show():
+            for rule in self.list_access_rules(share_id):
                 if rule["id"] in rule_id:
-                    rule_status = rule['state']
-                    break
-            if 'error' in rule_status:
-                raise share_exceptions.AccessRuleBuildErrorException(
-                    rule_id=rule_id)
-
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('Share Access Rule %s failed to reach %s status '
-                           'within the required time (%s s).' %
-                           (rule_id, status, self.build_timeout))
-                raise exceptions.TimeoutException(message)
+                    return rule
+            return {"state": "new"}
+
+        return self._wait_for_resource_status(
+            show, status, status_attr='state',
+            error_exception=lambda body: (
+                share_exceptions.AccessRuleBuildErrorException(
+                    rule_id=rule_id)),
+            timeout_message=(
+                'Share Access Rule %s failed to reach %s status within the '
+                'required time (%s s).' % (
+                    rule_id, status, self.build_timeout)),
+            resource_type='access_rule', resource_id=rule_id)
 
     def default_quotas(self, tenant_id):
         resp, body = self.get("os-quota-sets/%s/defaults" % tenant_id)
@@ -390,13 +489,19 @@ class SharesClient(rest_client.RestClient):
 
     def wait_for_resource_deletion(self, *args, **kwargs):
         """Waits for a resource to be deleted."""
-        start_time = int(time.time())
-        while True:
-            if self.is_resource_deleted(*args, **kwargs):
-                return
-            if int(time.time()) - start_time >= self.build_timeout:
-                raise exceptions.TimeoutException
-            time.sleep(self.build_interval)
+        resource_type, resource_id = None, None
+        for key, key_type in DELETED_RESOURCE_KEYS:
+            if key in kwargs:
+                resource_type, resource_id = key_type, kwargs[key]
+                break
+        waiters.wait_until(
+            lambda: self.is_resource_deleted(*args, **kwargs) or None,
+            self.build_timeout, self.waiter_backoff,
+            timeout_message=(
+                'Resource %s failed to be deleted within the required time '
+                '(%s s).' % (six.text_type(kwargs), self.build_timeout)),
+            recorder=instrumentation.WaitRecorder(resource_type, 'deleted'),
+            wake_on=(resource_id, ) if resource_id else None)
 
     def list_extensions(self):
         resp, extensions = self.get("extensions")
@@ -629,6 +734,7 @@ class SharesClient(rest_client.RestClient):
     def delete_share_type(self, share_type_id):
         resp, body = self.delete("types/%s" % share_type_id)
         self.expected_success(202, resp.status)
+        discovery_cache.invalidate_share_type(share_type_id)
         return body
 
     def get_share_type(self, share_type_id):
@@ -666,6 +772,7 @@ class SharesClient(rest_client.RestClient):
         post_body = json.dumps({'extra_specs': extra_specs})
         resp, body = self.post(url, post_body)
         self.expected_success(200, resp.status)
+        discovery_cache.invalidate_share_type(share_type_id)
         return self._parse_resp(body)
 
     def get_share_type_extra_spec(self, share_type_id, extra_spec_name):
@@ -689,6 +796,7 @@ class SharesClient(rest_client.RestClient):
         post_body = json.dumps(extra_spec)
         resp, body = self.put(uri, post_body)
         self.expected_success(200, resp.status)
+        discovery_cache.invalidate_share_type(share_type_id)
         return self._parse_resp(body)
 
     def update_share_type_extra_specs(self, share_type_id, extra_specs):
@@ -697,12 +805,14 @@ class SharesClient(rest_client.RestClient):
         post_body = json.dumps(extra_specs)
         resp, body = self.post(uri, post_body)
         self.expected_success(200, resp.status)
+        discovery_cache.invalidate_share_type(share_type_id)
         return self._parse_resp(body)
 
     def delete_share_type_extra_spec(self, share_type_id, extra_spec_name):
         uri = "types/%s/extra_specs/%s" % (share_type_id, extra_spec_name)
         resp, body = self.delete(uri)
         self.expected_success(202, resp.status)
+        discovery_cache.invalidate_share_type(share_type_id)
         return body
 
 ###############
@@ -716,6 +826,14 @@ class SharesClient(rest_client.RestClient):
         self.expected_success(200, resp.status)
         return self._parse_resp(body)
 
+    def iter_share_servers(self, search_opts=None, predicate=None,
+                           page_size=None):
+        """Lazily iterates over share servers, one page at a time."""
+        return self._iter_pages(
+            lambda page_params: self.list_share_servers(
+                search_opts=page_params),
+            params=search_opts, predicate=predicate, page_size=page_size)
+
     def delete_share_server(self, share_server_id):
         """Delete share server by its ID."""
         uri = "share-servers/%s" % share_server_id
@@ -18,19 +18,43 @@ import re
 import six
 import time
 
+from oslo_log import log
+from oslo_utils import units
 from six.moves.urllib import parse
 from tempest import config
 from tempest.lib.common.utils import data_utils
 from tempest.lib import exceptions
 
 from manila_tempest_tests.common import constants
+from manila_tempest_tests.common import discovery_cache
+from manila_tempest_tests.common import instrumentation
+from manila_tempest_tests.common import waiters
 from manila_tempest_tests.services.share.json import shares_client
 from manila_tempest_tests import share_exceptions
 from manila_tempest_tests import utils
 
+try:
+    from tempest.lib.common import profiler
+except ImportError:
+    # NOTE: older tempest releases send no trace headers.
+    profiler = None
+
 CONF = config.CONF
+LOG = log.getLogger(__name__)
 LATEST_MICROVERSION = CONF.share.max_api_microversion
 EXPERIMENTAL = {'X-OpenStack-Manila-API-Experimental': 'True'}
+REQUEST_ID_HEADER = 'x-compute-request-id'
+# Task states in which migration_get_progress reports the data copy.
+_MIGRATION_COPY_STATES = (
+    constants.TASK_STATE_MIGRATION_DRIVER_IN_PROGRESS,
+    constants.TASK_STATE_DATA_COPYING_IN_PROGRESS,
+)
+
+
+def _trace_headers():
+    if profiler is None:
+        return {}
+    return profiler.serialize_as_http_headers()
 
 
 class SharesV2Client(shares_client.SharesClient):
@@ -43,23 +67,47 @@ class SharesV2Client(shares_client.SharesClient):
     def __init__(self, auth_provider, **kwargs):
         super(SharesV2Client, self).__init__(auth_provider, **kwargs)
         self.API_MICROVERSIONS_HEADER = 'x-openstack-manila-api-version'
+        self._microversion_headers = {}
+
+    def _get_microversion_headers(self, version):
+        """Returns the cached default headers for the given microversion.
+
+        The returned dict is shared between requests and must not be
+        modified; the auth provider copies it before adding the token.
+        """
+        # NOTE: older tempest releases have no service token.
+        key = (version, getattr(self, 'service_token', None))
+        headers = self._microversion_headers.get(key)
+        if headers is None:
+            headers = self.get_headers()
+            # NOTE: trace headers change with every test, they are added
+            # per request below instead.
+            for trace_header in _trace_headers():
+                headers.pop(trace_header, None)
+            headers[self.API_MICROVERSIONS_HEADER] = str(version)
+            self._microversion_headers[key] = headers
+        return headers
 
     def inject_microversion_header(self, headers, version,
                                    extra_headers=False):
         """Inject the required manila microversion header."""
-        new_headers = self.get_headers()
-        new_headers[self.API_MICROVERSIONS_HEADER] = version
-        if extra_headers and headers:
-            new_headers.update(headers)
-        elif headers:
-            new_headers = headers
+        if headers and not extra_headers:
+            return headers
+        new_headers = self._get_microversion_headers(version)
+        trace_headers = _trace_headers()
+        if headers or trace_headers:
+            new_headers = dict(new_headers, **trace_headers)
+            new_headers.update(headers or {})
         return new_headers
 
     def verify_request_id(self, response):
-        response_headers = [r.lower() for r in response.keys()]
-        assert_msg = ("Response is missing request ID. Response "
-                      "headers are: %s") % response
-        assert 'x-compute-request-id' in response_headers, assert_msg
+        if REQUEST_ID_HEADER in response:
+            return
+        for header in response:
+            if header.lower() == REQUEST_ID_HEADER:
+                return
+        raise AssertionError("Response is missing request ID. Response "
+                             "headers are: %s" % response)
 
     # Overwrite all http verb calls to inject the micro version header
     def post(self, url, body, headers=None, extra_headers=False,
@@ -207,7 +255,16 @@ class SharesV2Client(shares_client.SharesClient):
         :param kwargs: 'sn_id', 'ss_id', 'vt_id' and 'server_id'
         :raises share_exceptions.InvalidResource
         """
-        if "share_instance_id" in kwargs:
+        version = kwargs.get("version", LATEST_MICROVERSION)
+        if "rule_id" in kwargs and utils.is_microversion_ge(version, "2.45"):
+            # NOTE: a single rule is shown instead of listing all the rules
+            # of the share on every check.
+            def get_access(rule_id):
+                return self.get_access(rule_id, version=version)
+
+            return self._is_resource_deleted(
+                get_access, kwargs.get("rule_id"))
+        elif "share_instance_id" in kwargs:
             return self._is_resource_deleted(
                 self.get_share_instance, kwargs.get("share_instance_id"))
         elif "share_group_id" in kwargs:
@@ -293,6 +350,16 @@ class SharesV2Client(shares_client.SharesClient):
         return self.list_shares(detailed=True, params=params,
                                 version=version, experimental=experimental)
 
+    def iter_shares(self, detailed=True, params=None, predicate=None,
+                    page_size=None, version=LATEST_MICROVERSION,
+                    experimental=False):
+        """Lazily iterates over shares, one page at a time."""
+        return self._iter_pages(
+            lambda page_params: self.list_shares(
+                detailed=detailed, params=page_params, version=version,
+                experimental=experimental),
+            params=params, predicate=predicate, page_size=page_size)
+
     def get_share(self, share_id, version=LATEST_MICROVERSION,
                   experimental=False):
         headers = EXPERIMENTAL if experimental else None
@@ -342,6 +409,14 @@ class SharesV2Client(shares_client.SharesClient):
         self.expected_success(200, resp.status)
         return self._parse_resp(body)
 
+    def iter_share_instances(self, params=None, predicate=None,
+                             page_size=None, version=LATEST_MICROVERSION):
+        """Lazily iterates over share instances, one page at a time."""
+        return self._iter_pages(
+            lambda page_params: self.list_share_instances(
+                version=version, params=page_params),
+            params=params, predicate=predicate, page_size=page_size)
+
     def get_share_instance(self, instance_id, version=LATEST_MICROVERSION):
         resp, body = self.get("share_instances/%s" % instance_id,
                               version=version)
@@ -369,49 +444,62 @@ class SharesV2Client(shares_client.SharesClient):
     def wait_for_share_instance_status(self, instance_id, status,
                                        version=LATEST_MICROVERSION):
         """Waits for a share to reach a given status."""
-        body = self.get_share_instance(instance_id, version=version)
-        instance_status = body['status']
-        start = int(time.time())
-
-        while instance_status != status:
-            time.sleep(self.build_interval)
-            body = self.get_share(instance_id)
-            instance_status = body['status']
-            if instance_status == status:
-                return
-            elif 'error' in instance_status.lower():
-                raise share_exceptions.ShareInstanceBuildErrorException(
-                    id=instance_id)
-
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('Share instance %s failed to reach %s status within'
-                           ' the required time (%s s).' %
-                           (instance_id, status, self.build_timeout))
-                raise exceptions.TimeoutException(message)
+        return self._wait_for_resource_status(
+            lambda: self.get_share_instance(instance_id, version=version),
+            status,
+            error_exception=lambda body: (
+                share_exceptions.ShareInstanceBuildErrorException(
+                    id=instance_id)),
+            timeout_message=(
+                'Share instance %s failed to reach %s status within the '
+                'required time (%s s).' % (
+                    instance_id, status, self.build_timeout)),
+            resource_type='share_instance', resource_id=instance_id)
 
     def wait_for_share_status(self, share_id, status, status_attr='status',
                               version=LATEST_MICROVERSION):
         """Waits for a share to reach a given status."""
-        body = self.get_share(share_id, version=version)
-        share_status = body[status_attr]
-        start = int(time.time())
-
-        while share_status != status:
-            time.sleep(self.build_interval)
-            body = self.get_share(share_id, version=version)
-            share_status = body[status_attr]
-            if share_status == status:
-                return
-            elif 'error' in share_status.lower():
-                raise share_exceptions.ShareBuildErrorException(
-                    share_id=share_id)
+        return self._wait_for_resource_status(
+            lambda: self.get_share(share_id, version=version), status,
+            status_attr=status_attr,
+            error_exception=lambda body: (
+                share_exceptions.ShareBuildErrorException(share_id=share_id)),
+            timeout_message=(
+                "Share's %(status_attr)s failed to transition to %(status)s "
+                "within the required time %(seconds)s." % {
+                    "status_attr": status_attr, "status": status,
+                    "seconds": self.build_timeout}),
+            resource_type='share', resource_id=share_id)
+
+    def wait_for_shares_status(self, share_ids, status, status_attr='status',
+                               params=None, raise_on_error=True,
+                               version=LATEST_MICROVERSION):
+        """Waits for several shares to reach a given status.
 
-            if int(time.time()) - start >= self.build_timeout:
-                message = ("Share's %(status_attr)s failed to transition to "
-                           "%(status)s within the required time %(seconds)s." %
-                           {"status_attr": status_attr, "status": status,
-                            "seconds": self.build_timeout})
-                raise exceptions.TimeoutException(message)
+        Polls the detailed list of shares once per interval instead of
+        getting each share separately.
+
+        :param share_ids: ids of the shares to wait for.
+        :param params: filters for the share list, e.g. {'name~': 'foo'},
+            which must not exclude any of the awaited shares.
+        :param raise_on_error: raise ShareBuildErrorException as soon as one
+            share errors. Otherwise shares in error are returned as well.
+        :returns: dict mapping share ids to their last share dicts.
+        """
+        return waiters.wait_for_resources_status(
+            lambda: self.list_shares_with_detail(params=params,
+                                                 version=version),
+            share_ids, status, self.build_timeout, self.waiter_backoff,
+            status_attr=status_attr,
+            error_exception=(lambda body: (
+                share_exceptions.ShareBuildErrorException(
+                    share_id=body['id']))) if raise_on_error else None,
+            timeout_message=lambda pending: (
+                "Shares %(ids)s failed to transition their %(status_attr)s "
+                "to %(status)s within the required time %(seconds)s." % {
+                    "ids": sorted(pending), "status_attr": status_attr,
+                    "status": status, "seconds": self.build_timeout}),
+            resource_type='share')
 
 ###############
 
@@ -553,6 +641,14 @@ class SharesV2Client(shares_client.SharesClient):
         return self.list_snapshots(detailed=True, params=params,
                                    version=version)
 
+    def iter_snapshots(self, detailed=True, params=None, predicate=None,
+                       page_size=None, version=LATEST_MICROVERSION):
+        """Lazily iterates over share snapshots, one page at a time."""
+        return self._iter_pages(
+            lambda page_params: self.list_snapshots(
+                detailed=detailed, params=page_params, version=version),
+            params=params, predicate=predicate, page_size=page_size)
+
     def delete_snapshot(self, snap_id, version=LATEST_MICROVERSION):
         resp, body = self.delete("snapshots/%s" % snap_id, version=version)
         self.expected_success(202, resp.status)
@@ -561,26 +657,46 @@ class SharesV2Client(shares_client.SharesClient):
     def wait_for_snapshot_status(self, snapshot_id, status,
                                  version=LATEST_MICROVERSION):
         """Waits for a snapshot to reach a given status."""
-        body = self.get_snapshot(snapshot_id, version=version)
-        snapshot_name = body['name']
-        snapshot_status = body['status']
-        start = int(time.time())
-
-        while snapshot_status != status:
-            time.sleep(self.build_interval)
-            body = self.get_snapshot(snapshot_id, version=version)
-            snapshot_status = body['status']
-            if snapshot_status == status:
-                return
-            if 'error' in snapshot_status:
-                raise (share_exceptions.
-                       SnapshotBuildErrorException(snapshot_id=snapshot_id))
-
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('Share Snapshot %s failed to reach %s status '
-                           'within the required time (%s s).' %
-                           (snapshot_name, status, self.build_timeout))
-                raise exceptions.TimeoutException(message)
+        return self._wait_for_resource_status(
+            lambda: self.get_snapshot(snapshot_id, version=version), status,
+            error_exception=lambda body: (
+                share_exceptions.SnapshotBuildErrorException(
+                    snapshot_id=snapshot_id)),
+            timeout_message=lambda body: (
+                'Share Snapshot %s failed to reach %s status within the '
+                'required time (%s s).' % (
+                    body['name'], status, self.build_timeout)),
+            resource_type='snapshot', resource_id=snapshot_id)
+
+    def wait_for_snapshots_status(self, snapshot_ids, status, params=None,
+                                  raise_on_error=True,
+                                  version=LATEST_MICROVERSION):
+        """Waits for several snapshots to reach a given status.
+
+        Polls the detailed list of snapshots once per interval instead of
+        getting each snapshot separately.
+
+        :param snapshot_ids: ids of the snapshots to wait for.
+        :param params: filters for the snapshot list, e.g.
+            {'share_id': share_id}, which must not exclude any of the
+            awaited snapshots.
+        :param raise_on_error: raise SnapshotBuildErrorException as soon as
+            one snapshot errors. Otherwise snapshots in error are returned
+            as well.
+        :returns: dict mapping snapshot ids to their last snapshot dicts.
+        """
+        return waiters.wait_for_resources_status(
+            lambda: self.list_snapshots_with_detail(params=params,
+                                                    version=version),
+            snapshot_ids, status, self.build_timeout, self.waiter_backoff,
+            error_exception=(lambda body: (
+                share_exceptions.SnapshotBuildErrorException(
+                    snapshot_id=body['id']))) if raise_on_error else None,
+            timeout_message=lambda pending: (
+                'Share Snapshots %s failed to reach %s status within the '
+                'required time (%s s).' % (
+                    sorted(pending), status, self.build_timeout)),
+            resource_type='snapshot')
 
     def manage_snapshot(self, share_id, provider_location,
                         name=None, description=None,
@@ -644,6 +760,7 @@ class SharesV2Client(shares_client.SharesClient):
         post_body = json.dumps({'extra_specs': extra_specs})
         resp, body = self.post(url, post_body, version=version)
         self.expected_success(200, resp.status)
+        discovery_cache.invalidate_share_type(share_type_id)
         return self._parse_resp(body)
 
     def get_share_type_extra_spec(self, share_type_id, extra_spec_name,
@@ -669,6 +786,7 @@ class SharesV2Client(shares_client.SharesClient):
         post_body = json.dumps(extra_spec)
         resp, body = self.put(uri, post_body, version=version)
         self.expected_success(200, resp.status)
+        discovery_cache.invalidate_share_type(share_type_id)
         return self._parse_resp(body)
 
     def update_share_type_extra_specs(self, share_type_id, extra_specs,
@@ -678,6 +796,7 @@ class SharesV2Client(shares_client.SharesClient):
         post_body = json.dumps(extra_specs)
         resp, body = self.post(uri, post_body, version=version)
         self.expected_success(200, resp.status)
+        discovery_cache.invalidate_share_type(share_type_id)
         return self._parse_resp(body)
 
     def delete_share_type_extra_spec(self, share_type_id, extra_spec_name,
@@ -685,6 +804,7 @@ class SharesV2Client(shares_client.SharesClient):
         uri = "types/%s/extra_specs/%s" % (share_type_id, extra_spec_name)
         resp, body = self.delete(uri, version=version)
         self.expected_success(202, resp.status)
+        discovery_cache.invalidate_share_type(share_type_id)
         return body
 
 ###############
@@ -722,32 +842,21 @@ class SharesV2Client(shares_client.SharesClient):
 
     def wait_for_snapshot_instance_status(self, instance_id, expected_status):
         """Waits for a snapshot instance status to reach a given status."""
-        body = self.get_snapshot_instance(instance_id)
-        instance_status = body['status']
-        start = int(time.time())
-
-        while instance_status != expected_status:
-            time.sleep(self.build_interval)
-            body = self.get_snapshot_instance(instance_id)
-            instance_status = body['status']
-            if instance_status == expected_status:
-                return
-            if 'error' in instance_status:
-                raise share_exceptions.SnapshotInstanceBuildErrorException(
-                    id=instance_id)
-
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('The status of snapshot instance %(id)s failed to '
-                           'reach %(expected_status)s status within the '
-                           'required time (%(time)ss). Current '
-                           'status: %(current_status)s.' %
-                           {
-                               'expected_status': expected_status,
-                               'time': self.build_timeout,
-                               'id': instance_id,
-                               'current_status': instance_status,
-                           })
-                raise exceptions.TimeoutException(message)
+        return self._wait_for_resource_status(
+            lambda: self.get_snapshot_instance(instance_id), expected_status,
+            error_exception=lambda body: (
+                share_exceptions.SnapshotInstanceBuildErrorException(
+                    id=instance_id)),
+            timeout_message=lambda body: (
+                'The status of snapshot instance %(id)s failed to reach '
+                '%(expected_status)s status within the required time '
+                '(%(time)ss). Current status: %(current_status)s.' % {
+                    'expected_status': expected_status,
+                    'time': self.build_timeout,
+                    'id': instance_id,
+                    'current_status': body['status'],
+                }),
+            resource_type='snapshot_instance', resource_id=instance_id)
 
     def get_snapshot_instance_export_location(
             self, instance_id, export_location_uuid,
@@ -847,6 +956,85 @@ class SharesV2Client(shares_client.SharesClient):
         self.expected_success(200, resp.status)
         return self._parse_resp(body)
 
+    def create_access_rules(self, share_id, rules, raise_on_error=True,
+                            on_create=None, version=LATEST_MICROVERSION):
+        """Creates several access rules of a share and waits for them once.
+
+        All the rules are requested back to back, then a single wait
+        follows: on the access_rules_status of the share from 2.10 on, on
+        one listing of the rules per check before.
+
+        :param rules: list of dicts of create_access_rule keyword arguments,
+            e.g. {'access_type': 'ip', 'access_to': '10.0.0.1'}.
+        :param raise_on_error: raise AccessRuleBuildErrorException if one
+            rule errors. Otherwise rules in error are returned as well.
+        :param on_create: optional callable receiving the id of every rule
+            as soon as it is requested, e.g. to register it for cleanup
+            before a later request or the wait raises.
+        :returns: dict mapping the ids of the created rules to their final
+            rule dicts, read from one list_access_rules call.
+        """
+        rule_ids = []
+        for rule in rules:
+            rule_ids.append(self.create_access_rule(
+                share_id, version=version, **rule)['id'])
+            if on_create is not None:
+                on_create(rule_ids[-1])
+        if not rule_ids:
+            return {}
+        if utils.is_microversion_ge(version, "2.10"):
+            self._wait_for_resource_status(
+                lambda: self.get_share(share_id, version=version),
+                ('active', 'error'), status_attr='access_rules_status',
+                timeout_message=(
+                    "Access rules of share %s failed to be applied within "
+                    "the required time (%s s)." % (
+                        share_id, self.build_timeout)),
+                resource_type='share', resource_id=share_id)
+            final_rules = dict(
+                (rule['id'], rule) for rule in self.list_access_rules(
+                    share_id, version=version) if rule['id'] in rule_ids)
+        else:
+            final_rules = waiters.wait_for_resources_status(
+                lambda: self.list_access_rules(share_id, version=version),
+                rule_ids, 'active', self.build_timeout, self.waiter_backoff,
+                status_attr='state',
+                timeout_message=lambda pending: (
+                    "Access rules %s of share %s failed to be applied within "
+                    "the required time (%s s)." % (
+                        sorted(pending), share_id, self.build_timeout)),
+                resource_type='access_rule')
+        if raise_on_error:
+            for rule_id in rule_ids:
+                if final_rules.get(rule_id, {}).get('state') != 'active':
+                    raise share_exceptions.AccessRuleBuildErrorException(
+                        rule_id=rule_id)
+        return final_rules
+
+    def wait_for_access_rules_deletion(self, share_id, rule_ids,
+                                       version=LATEST_MICROVERSION):
+        """Waits for several access rules of a share to be deleted.
+
+        Every check lists the rules of the share once, instead of checking
+        the rules one by one.
+        """
+        pending = set(rule_ids)
+
+        def check():
+            pending.intersection_update(
+                rule['id'] for rule in self.list_access_rules(
+                    share_id, version=version))
+            return True if not pending else None
+
+        waiters.wait_until(
+            check, self.build_timeout, self.waiter_backoff,
+            timeout_message=lambda: (
+                'Access rules %s of share %s failed to be deleted within '
+                'the required time (%s s).' % (
+                    sorted(pending), share_id, self.build_timeout)),
+            recorder=instrumentation.WaitRecorder('access_rule', 'deleted'),
+            wake_on=tuple(pending))
+
     def update_access_metadata(self, access_id, metadata,
                                version=LATEST_MICROVERSION):
         url = 'share-access-rules/%s/metadata' % access_id
@@ -893,6 +1081,25 @@ class SharesV2Client(shares_client.SharesClient):
         self.expected_success(200, resp.status)
         return self._parse_resp(body)
 
+    def _update_service(self, action, host, binary, version):
+        if utils.is_microversion_gt(version, "2.6"):
+            url = 'services/%s' % action
+        else:
+            url = 'os-services/%s' % action
+        body = json.dumps({'host': host, 'binary': binary})
+        resp, body = self.put(url, body, version=version)
+        self.expected_success(200, resp.status)
+        discovery_cache.invalidate_services()
+        return self._parse_resp(body)
+
+    def enable_service(self, host, binary, version=LATEST_MICROVERSION):
+        """Enables a service."""
+        return self._update_service('enable', host, binary, version)
+
+    def disable_service(self, host, binary, version=LATEST_MICROVERSION):
+        """Disables a service."""
+        return self._update_service('disable', host, binary, version)
+
 ###############
 
     def list_share_types(self, params=None, default=False,
@@ -927,6 +1134,7 @@ class SharesV2Client(shares_client.SharesClient):
     def delete_share_type(self, share_type_id, version=LATEST_MICROVERSION):
         resp, body = self.delete("types/%s" % share_type_id, version=version)
         self.expected_success(202, resp.status)
+        discovery_cache.invalidate_share_type(share_type_id)
         return body
 
     def get_share_type(self, share_type_id, version=LATEST_MICROVERSION):
@@ -1092,6 +1300,14 @@ class SharesV2Client(shares_client.SharesClient):
         self.expected_success(200, resp.status)
         return self._parse_resp(body)
 
+    def iter_share_groups(self, detailed=True, params=None, predicate=None,
+                          page_size=None, version=LATEST_MICROVERSION):
+        """Lazily iterates over share groups, one page at a time."""
+        return self._iter_pages(
+            lambda page_params: self.list_share_groups(
+                detailed=detailed, params=page_params, version=version),
+            params=params, predicate=predicate, page_size=page_size)
+
     def get_share_group(self, share_group_id, version=LATEST_MICROVERSION):
         """Get share group info."""
         uri = 'share-groups/%s' % share_group_id
@@ -1131,26 +1347,19 @@ class SharesV2Client(shares_client.SharesClient):
 
     def wait_for_share_group_status(self, share_group_id, status):
         """Waits for a share group to reach a given status."""
-        body = self.get_share_group(share_group_id)
-        sg_name = body['name']
-        sg_status = body['status']
-        start = int(time.time())
-
-        while sg_status != status:
-            time.sleep(self.build_interval)
-            body = self.get_share_group(share_group_id)
-            sg_status = body['status']
-            if 'error' in sg_status and status != 'error':
-                raise share_exceptions.ShareGroupBuildErrorException(
-                    share_group_id=share_group_id)
-
-            if int(time.time()) - start >= self.build_timeout:
-                sg_name = sg_name or share_group_id
-                message = ('Share Group %s failed to reach %s status '
-                           'within the required time (%s s). '
-                           'Current status: %s' %
-                           (sg_name, status, self.build_timeout, sg_status))
-                raise exceptions.TimeoutException(message)
+        return self._wait_for_resource_status(
+            lambda: self.get_share_group(share_group_id), status,
+            is_error=lambda sg_status: (
+                'error' in sg_status and status != 'error'),
+            error_exception=lambda body: (
+                share_exceptions.ShareGroupBuildErrorException(
+                    share_group_id=share_group_id)),
+            timeout_message=lambda body: (
+                'Share Group %s failed to reach %s status within the '
+                'required time (%s s). Current status: %s' % (
+                    body['name'] or share_group_id, status,
+                    self.build_timeout, body['status'])),
+            resource_type='share_group', resource_id=share_group_id)
 
 ###############
 
@@ -1338,6 +1547,15 @@ class SharesV2Client(shares_client.SharesClient):
         self.expected_success(200, resp.status)
         return self._parse_resp(body)
 
+    def iter_share_group_snapshots(self, detailed=True, params=None,
+                                   predicate=None, page_size=None,
+                                   version=LATEST_MICROVERSION):
+        """Lazily iterates over share group snapshots, one page at a time."""
+        return self._iter_pages(
+            lambda page_params: self.list_share_group_snapshots(
+                detailed=detailed, params=page_params, version=version),
+            params=params, predicate=predicate, page_size=page_size)
+
     def get_share_group_snapshot(self, share_group_snapshot_id,
                                  version=LATEST_MICROVERSION):
         """Get share group snapshot info."""
@@ -1379,24 +1597,20 @@ class SharesV2Client(shares_client.SharesClient):
     def wait_for_share_group_snapshot_status(self, share_group_snapshot_id,
                                              status):
         """Waits for a share group snapshot to reach a given status."""
-        body = self.get_share_group_snapshot(share_group_snapshot_id)
-        sg_snapshot_name = body['name']
-        sg_snapshot_status = body['status']
-        start = int(time.time())
-
-        while sg_snapshot_status != status:
-            time.sleep(self.build_interval)
-            body = self.get_share_group_snapshot(share_group_snapshot_id)
-            sg_snapshot_status = body['status']
-            if 'error' in sg_snapshot_status and status != 'error':
-                raise share_exceptions.ShareGroupSnapshotBuildErrorException(
-                    share_group_snapshot_id=share_group_snapshot_id)
-
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('Share Group Snapshot %s failed to reach %s status '
-                           'within the required time (%s s).' %
-                           (sg_snapshot_name, status, self.build_timeout))
-                raise exceptions.TimeoutException(message)
+        return self._wait_for_resource_status(
+            lambda: self.get_share_group_snapshot(share_group_snapshot_id),
+            status,
+            is_error=lambda sg_snapshot_status: (
+                'error' in sg_snapshot_status and status != 'error'),
+            error_exception=lambda body: (
+                share_exceptions.ShareGroupSnapshotBuildErrorException(
+                    share_group_snapshot_id=share_group_snapshot_id)),
+            timeout_message=lambda body: (
+                'Share Group Snapshot %s failed to reach %s status within '
+                'the required time (%s s).' % (
+                    body['name'], status, self.build_timeout)),
+            resource_type='share_group_snapshot',
+            resource_id=share_group_snapshot_id)
 
 ###############
 
@@ -1428,27 +1642,18 @@ class SharesV2Client(shares_client.SharesClient):
     def wait_for_share_server_status(self, server_id, status,
                                      status_attr='status'):
         """Waits for a share to reach a given status."""
-        body = self.show_share_server(server_id)
-        server_status = body[status_attr]
-        start = int(time.time())
-
-        while server_status != status:
-            time.sleep(self.build_interval)
-            body = self.show_share_server(server_id)
-            server_status = body[status_attr]
-            if server_status == status:
-                return
-            elif constants.STATUS_ERROR in server_status.lower():
-                raise share_exceptions.ShareServerBuildErrorException(
-                    server_id=server_id)
-
-            if int(time.time()) - start >= self.build_timeout:
-                message = ("Share server's %(status_attr)s failed to "
-                           "transition to %(status)s within the required "
-                           "time %(seconds)s." %
-                           {"status_attr": status_attr, "status": status,
-                            "seconds": self.build_timeout})
-                raise exceptions.TimeoutException(message)
+        return self._wait_for_resource_status(
+            lambda: self.show_share_server(server_id), status,
+            status_attr=status_attr,
+            error_exception=lambda body: (
+                share_exceptions.ShareServerBuildErrorException(
+                    server_id=server_id)),
+            timeout_message=(
+                "Share server's %(status_attr)s failed to transition to "
+                "%(status)s within the required time %(seconds)s." % {
+                    "status_attr": status_attr, "status": status,
+                    "seconds": self.build_timeout}),
+            resource_type='share_server', resource_id=server_id)
 
     def share_server_reset_state(self, share_server_id,
                                  status=constants.SERVER_STATE_ACTIVE,
@@ -1529,33 +1734,69 @@ class SharesV2Client(shares_client.SharesClient):
 
     def wait_for_migration_status(self, share_id, dest_host, status_to_wait,
                                   version=LATEST_MICROVERSION):
-        """Waits for a share to migrate to a certain host."""
+        """Waits for a share to migrate to a certain host.
+
+        While the data of the share is being copied, its progress is read
+        with migration_get_progress to schedule the next check from the
+        estimated remaining time, and to fail early if it stops moving for
+        CONF.share.migration_stall_timeout seconds. The effective copy
+        throughput is logged once the wait is over.
+        """
         statuses = ((status_to_wait,)
                     if not isinstance(status_to_wait, (tuple, list, set))
                     else status_to_wait)
-        share = self.get_share(share_id, version=version)
         migration_timeout = CONF.share.migration_timeout
-        start = int(time.time())
-        while share['task_state'] not in statuses:
-            time.sleep(self.build_interval)
+        stall_timeout = CONF.share.migration_stall_timeout
+        progress = waiters.ProgressBackoff(
+            self.waiter_backoff, CONF.share.waiter_initial_interval,
+            CONF.share.migration_max_poll_interval)
+        get_progress = utils.is_microversion_ge(version, '2.22')
+        recorder = instrumentation.WaitRecorder('migration', statuses)
+        last = {}
+
+        def check():
             share = self.get_share(share_id, version=version)
-            if share['task_state'] in statuses:
-                break
-            elif share['task_state'] == 'migration_error':
+            last['share'] = share
+            task_state = share['task_state']
+            recorder.final_state = task_state
+            if task_state in statuses:
+                return share
+            if task_state == constants.TASK_STATE_MIGRATION_ERROR:
                 raise share_exceptions.ShareMigrationException(
                     share_id=share['id'], src=share['host'], dest=dest_host)
-            elif int(time.time()) - start >= migration_timeout:
-                message = ('Share %(share_id)s failed to reach a status in'
-                           '%(status)s when migrating from host %(src)s to '
-                           'host %(dest)s within the required time '
-                           '%(timeout)s.' % {
-                               'src': share['host'],
-                               'dest': dest_host,
-                               'share_id': share['id'],
-                               'timeout': self.build_timeout,
-                               'status': six.text_type(statuses),
-                           })
-                raise exceptions.TimeoutException(message)
+            if get_progress and task_state in _MIGRATION_COPY_STATES:
+                try:
+                    progress.update(self.migration_get_progress(
+                        share_id, version=version)['total_progress'])
+                except exceptions.BadRequest:
+                    # NOTE: the migration left the copy phase meanwhile.
+                    return None
+                if stall_timeout and progress.stalled_for() > stall_timeout:
+                    raise share_exceptions.ShareMigrationStalledException(
+                        share_id=share_id, dest=dest_host,
+                        seconds=progress.stalled_for(),
+                        progress=progress.progress)
+            return None
+
+        share = waiters.wait_until(
+            check, migration_timeout, progress,
+            timeout_message=lambda: (
+                'Share %(share_id)s failed to reach a status in '
+                '%(status)s when migrating from host %(src)s to host '
+                '%(dest)s within the required time %(timeout)s.' % {
+                    'src': last['share']['host'],
+                    'dest': dest_host,
+                    'share_id': share_id,
+                    'timeout': migration_timeout,
+                    'status': six.text_type(statuses),
+                }),
+            recorder=recorder, wake_on=(share_id, ))
+        rate = progress.rate()
+        if rate:
+            LOG.info("Share %(share_id)s was copied at %(rate).1f MiB/s "
+                     "while migrating to host %(dest)s.",
+                     {'share_id': share_id, 'dest': dest_host,
+                      'rate': rate / 100 * int(share['size']) * units.Ki})
         return share
 
 ################
@@ -1653,34 +1894,27 @@ class SharesV2Client(shares_client.SharesClient):
     def wait_for_share_replica_status(self, replica_id, expected_status,
                                       status_attr='status'):
         """Waits for a replica's status_attr to reach a given status."""
-        body = self.get_share_replica(replica_id)
-        replica_status = body[status_attr]
-        start = int(time.time())
-
-        while replica_status != expected_status:
-            time.sleep(self.build_interval)
-            body = self.get_share_replica(replica_id)
-            replica_status = body[status_attr]
-            if replica_status == expected_status:
-                return
-            if ('error' in replica_status
-                    and expected_status != constants.STATUS_ERROR):
-                raise share_exceptions.ShareInstanceBuildErrorException(
-                    id=replica_id)
-
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('The %(status_attr)s of Replica %(id)s failed to '
-                           'reach %(expected_status)s status within the '
-                           'required time (%(time)ss). Current '
-                           '%(status_attr)s: %(current_status)s.' %
-                           {
-                               'status_attr': status_attr,
-                               'expected_status': expected_status,
-                               'time': self.build_timeout,
-                               'id': replica_id,
-                               'current_status': replica_status,
-                           })
-                raise exceptions.TimeoutException(message)
+        return self._wait_for_resource_status(
+            lambda: self.get_share_replica(replica_id), expected_status,
+            status_attr=status_attr,
+            is_error=lambda replica_status: (
+                'error' in replica_status and
+                expected_status != constants.STATUS_ERROR),
+            error_exception=lambda body: (
+                share_exceptions.ShareInstanceBuildErrorException(
+                    id=replica_id)),
+            timeout_message=lambda body: (
+                'The %(status_attr)s of Replica %(id)s failed to reach '
+                '%(expected_status)s status within the required time '
+                '(%(time)ss). Current %(status_attr)s: '
+                '%(current_status)s.' % {
+                    'status_attr': status_attr,
+                    'expected_status': expected_status,
+                    'time': self.build_timeout,
+                    'id': replica_id,
+                    'current_status': body[status_attr],
+                }),
+            resource_type='share_replica', resource_id=replica_id)
 
     def reset_share_replica_status(self, replica_id,
                                    status=constants.STATUS_AVAILABLE,
@@ -1763,6 +1997,15 @@ class SharesV2Client(shares_client.SharesClient):
         return self.list_share_networks(
             detailed=True, params=params, version=version)
 
+    def iter_share_networks(self, detailed=True, params=None,
+                            predicate=None, page_size=None,
+                            version=LATEST_MICROVERSION):
+        """Lazily iterates over share networks, one page at a time."""
+        return self._iter_pages(
+            lambda page_params: self.list_share_networks(
+                detailed=detailed, params=page_params, version=version),
+            params=params, predicate=predicate, page_size=page_size)
+
     def get_share_network(self, share_network_id, version=LATEST_MICROVERSION):
         resp, body = self.get("share-networks/%s" % share_network_id,
                               version=version)
@@ -1794,32 +2037,22 @@ class SharesV2Client(shares_client.SharesClient):
 
     def wait_for_snapshot_access_rule_status(self, snapshot_id, rule_id,
                                              expected_state='active'):
-        rule = self.get_snapshot_access_rule(snapshot_id, rule_id)
-        state = rule['state']
-        start = int(time.time())
-
-        while state != expected_state:
-            time.sleep(self.build_interval)
-            rule = self.get_snapshot_access_rule(snapshot_id, rule_id)
-            state = rule['state']
-            if state == expected_state:
-                return
-            if 'error' in state:
-                raise share_exceptions.AccessRuleBuildErrorException(
-                    snapshot_id)
-
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('The status of snapshot access rule %(id)s failed '
-                           'to reach %(expected_state)s state within the '
-                           'required time (%(time)ss). Current '
-                           'state: %(current_state)s.' %
-                           {
-                               'expected_state': expected_state,
-                               'time': self.build_timeout,
-                               'id': rule_id,
-                               'current_state': state,
-                           })
-                raise exceptions.TimeoutException(message)
+        return self._wait_for_resource_status(
+            lambda: self.get_snapshot_access_rule(snapshot_id, rule_id),
+            expected_state, status_attr='state',
+            error_exception=lambda rule: (
+                share_exceptions.AccessRuleBuildErrorException(
+                    rule_id=rule_id)),
+            timeout_message=lambda rule: (
+                'The status of snapshot access rule %(id)s failed to reach '
+                '%(expected_state)s state within the required time '
+                '(%(time)ss). Current state: %(current_state)s.' % {
+                    'expected_state': expected_state,
+                    'time': self.build_timeout,
+                    'id': rule_id,
+                    'current_state': rule['state'],
+                }),
+            resource_type='snapshot_access_rule', resource_id=rule_id)
 
     def delete_snapshot_access_rule(self, snapshot_id, rule_id):
         body = {
@@ -1833,24 +2066,19 @@ class SharesV2Client(shares_client.SharesClient):
         return self._parse_resp(body)
 
     def wait_for_snapshot_access_rule_deletion(self, snapshot_id, rule_id):
-        rule = self.get_snapshot_access_rule(snapshot_id, rule_id)
-        start = int(time.time())
-
-        while rule is not None:
-            time.sleep(self.build_interval)
-
-            rule = self.get_snapshot_access_rule(snapshot_id, rule_id)
-
-            if rule is None:
-                return
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('The snapshot access rule %(id)s failed to delete '
-                           'within the required time (%(time)ss).' %
-                           {
-                               'time': self.build_timeout,
-                               'id': rule_id,
-                           })
-                raise exceptions.TimeoutException(message)
+        waiters.wait_until(
+            lambda: (self.get_snapshot_access_rule(snapshot_id, rule_id)
+                     is None) or None,
+            self.build_timeout, self.waiter_backoff,
+            timeout_message=(
+                'The snapshot access rule %(id)s failed to delete within '
+                'the required time (%(time)ss).' % {
+                    'time': self.build_timeout,
+                    'id': rule_id,
+                }),
+            recorder=instrumentation.WaitRecorder(
+                'snapshot_access_rule', 'deleted'),
+            wake_on=(rule_id, ))
 
     def get_snapshot_export_location(self, snapshot_id, export_location_uuid,
                                      version=LATEST_MICROVERSION):
@@ -1885,6 +2113,14 @@ class SharesV2Client(shares_client.SharesClient):
         self.expected_success(200, resp.status)
         return self._parse_resp(body)
 
+    def iter_messages(self, params=None, predicate=None, page_size=None,
+                      version=LATEST_MICROVERSION):
+        """Lazily iterates over user messages, one page at a time."""
+        return self._iter_pages(
+            lambda page_params: self.list_messages(
+                params=page_params, version=version),
+            params=params, predicate=predicate, page_size=page_size)
+
     def delete_message(self, message_id, version=LATEST_MICROVERSION):
         """Delete a single message."""
         url = 'messages/%s' % message_id
@@ -1894,20 +2130,18 @@ class SharesV2Client(shares_client.SharesClient):
 
     def wait_for_message(self, resource_id):
         """Waits until a message for a resource with given id exists"""
-        start = int(time.time())
-        message = None
-
-        while not message:
-            time.sleep(self.build_interval)
-            for msg in self.list_messages():
-                if msg['resource_id'] == resource_id:
-                    return msg
-
-            if int(time.time()) - start >= self.build_timeout:
-                message = ('No message for resource with id %s was created in'
-                           ' the required time (%s s).' %
-                           (resource_id, self.build_timeout))
-                raise exceptions.TimeoutException(message)
+        def check():
+            return next(self.iter_messages(
+                predicate=lambda msg: msg['resource_id'] == resource_id),
+                None)
+
+        return waiters.wait_until(
+            check, self.build_timeout, self.waiter_backoff,
+            timeout_message=(
+                'No message for resource with id %s was created in the '
+                'required time (%s s).' % (resource_id, self.build_timeout)),
+            check_first=False,
+            recorder=instrumentation.WaitRecorder('message', 'created'))
 
 ###############
 
@@ -1959,3 +2193,12 @@ class SharesV2Client(shares_client.SharesClient):
         resp, body = self.get(uri, version=version)
         self.expected_success(200, resp.status)
         return self._parse_resp(body)
+
+    def iter_security_services(self, detailed=True, params=None,
+                               predicate=None, page_size=None,
+                               version=LATEST_MICROVERSION):
+        """Lazily iterates over security services, one page at a time."""
+        return self._iter_pages(
+            lambda page_params: self.list_security_services(
+                detailed=detailed, params=page_params, version=version),
+            params=params, predicate=predicate, page_size=page_size)
@@ -68,6 +68,11 @@ class ShareMigrationException(exceptions.TempestException):
                "host %(src)s to host %(dest)s.")
 
 
+class ShareMigrationStalledException(exceptions.TempestException):
+    message = ("Migration of share %(share_id)s to host %(dest)s made no "
+               "progress for %(seconds)d seconds, stuck at %(progress)s%%.")
+
+
 class ResourceReleaseFailed(exceptions.TempestException):
     message = "Failed to release resource '%(res_type)s' with id '%(res_id)s'."
 
@@ -80,3 +85,8 @@ class ShareReplicationTypeException(exceptions.TempestException):
 class ShareServerBuildErrorException(exceptions.TempestException):
     message = ("Share server %(server_id)s failed to build and is in ERROR "
                "status")
+
+
+class ResponseNotRecorded(exceptions.TempestException):
+    message = ("No response recorded for request #%(index)d of "
+               "'%(signature)s' in the cassettes of %(directory)s.")
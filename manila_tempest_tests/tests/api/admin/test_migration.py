@@ -406,8 +406,8 @@ class MigrationCancelNFSTest(MigrationBase):
         share = self.shares_v2_client.get_share(share['id'])
 
         share, dest_pool = self._setup_migration(share)
-        snapshot1 = self.create_snapshot_wait_for_active(share['id'])
-        snapshot2 = self.create_snapshot_wait_for_active(share['id'])
+        snapshot1, snapshot2 = self.create_snapshots_wait_for_active(
+            [share['id'], share['id']])
 
         task_state, new_share_network_id, new_share_type_id = (
             self._get_migration_data(share))
@@ -588,10 +588,8 @@ class MigrationOfShareWithSnapshotNFSTest(MigrationBase):
         share = self.shares_v2_client.get_share(share['id'])
 
         share, dest_pool = self._setup_migration(share)
-        snapshot1 = self.create_snapshot_wait_for_active(
-            share['id'], cleanup_in_class=False)
-        snapshot2 = self.create_snapshot_wait_for_active(
-            share['id'], cleanup_in_class=False)
+        snapshot1, snapshot2 = self.create_snapshots_wait_for_active(
+            [share['id'], share['id']], cleanup_in_class=False)
 
         task_state, new_share_network_id, __ = self._get_migration_data(share)
 
@@ -31,6 +31,8 @@ SHARE_GROUPS_MICROVERSION = "2.40"
 @ddt.ddt
 class SharesAdminQuotasTest(base.BaseSharesAdminTest):
 
+    reuse_share_types = False
+
     @classmethod
     def resource_setup(cls):
         if not CONF.share.run_quota_tests:
@@ -138,6 +140,7 @@ class SharesAdminQuotasTest(base.BaseSharesAdminTest):
 class SharesAdminQuotasUpdateTest(base.BaseSharesAdminTest):
 
     force_tenant_isolation = True
+    reuse_share_types = False
 
     @classmethod
     def resource_setup(cls):
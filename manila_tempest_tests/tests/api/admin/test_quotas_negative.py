@@ -31,6 +31,7 @@ SHARE_GROUPS_MICROVERSION = "2.40"
 class SharesAdminQuotasNegativeTest(base.BaseSharesAdminTest):
 
     force_tenant_isolation = True
+    reuse_share_types = False
 
     @classmethod
     def resource_setup(cls):
@@ -16,6 +16,7 @@
 import ddt
 from testtools import testcase as tc
 
+from manila_tempest_tests.common import discovery_cache
 from manila_tempest_tests.tests.api import base
 
 
@@ -103,3 +104,33 @@ class ServicesAdminTest(base.BaseSharesAdminTest):
             self.assertEqual(params["zone"], service["zone"])
             self.assertEqual(params["status"], service["status"])
             self.assertEqual(params["state"], service["state"])
+
+    @tc.attr(base.TAG_POSITIVE, base.TAG_API)
+    def test_disable_enable_scheduler_service(self):
+        # NOTE: disabling a scheduler does not affect the scheduling of
+        # the shares of the other tests, unlike disabling a share service.
+        services = [s for s in self.services
+                    if s['binary'] == 'manila-scheduler' and
+                    s['status'] == 'enabled']
+        if not services:
+            raise self.skipException("No enabled scheduler service found.")
+        host = services[0]['host']
+        client = self.shares_v2_client
+        cache = discovery_cache.get_cache()
+
+        def cached_status():
+            return [s['status'] for s in
+                    cache.get(discovery_cache.SERVICES, client.list_services)
+                    if s['host'] == host and
+                    s['binary'] == 'manila-scheduler'][0]
+
+        self.assertEqual('enabled', cached_status())
+
+        service = client.disable_service(host, 'manila-scheduler')
+        self.addCleanup(client.enable_service, host, 'manila-scheduler')
+        self.assertTrue(service['disabled'])
+        self.assertEqual('disabled', cached_status())
+
+        service = client.enable_service(host, 'manila-scheduler')
+        self.assertFalse(service['disabled'])
+        self.assertEqual('enabled', cached_status())
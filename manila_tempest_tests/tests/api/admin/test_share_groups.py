@@ -29,6 +29,8 @@ CONF = config.CONF
 @base.skip_if_microversion_lt(constants.MIN_SHARE_GROUP_MICROVERSION)
 class ShareGroupsTest(base.BaseSharesAdminTest):
 
+    reuse_share_types = False
+
     @classmethod
     def resource_setup(cls):
         super(ShareGroupsTest, cls).resource_setup()
@@ -62,6 +62,24 @@ class ShareInstancesTest(base.BaseSharesAdminTest):
         msg = 'Share instance for share %s was not found.' % self.share['id']
         self.assertIn(self.share['id'], share_ids, msg)
 
+    @tc.attr(base.TAG_POSITIVE, base.TAG_API_WITH_BACKEND)
+    def test_iter_share_instances_with_full_unpaginated_page(self):
+        """Test that iterating ends when pages add no new instance.
+
+        Share instances are not paginated, so with a page size equal to
+        their number, every page is full and holds the same instances.
+        """
+        client = self.shares_v2_client
+        page_size = len(client.list_share_instances())
+
+        share_instances = list(client.iter_share_instances(
+            page_size=page_size))
+
+        ids = [si['id'] for si in share_instances]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertIn(self.share['id'],
+                      [si['share_id'] for si in share_instances])
+
     @tc.attr(base.TAG_POSITIVE, base.TAG_API_WITH_BACKEND)
     @ddt.data('2.3', '2.9', '2.10', '2.30')
     def test_get_share_instance(self, version):
@@ -13,12 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import atexit
 import copy
 import inspect
 import re
 import traceback
 
-from oslo_concurrency import lockutils
 from oslo_log import log
 import six
 from tempest.common import credentials_factory as common_creds
@@ -31,6 +31,11 @@ from tempest import test
 
 from manila_tempest_tests import clients
 from manila_tempest_tests.common import constants
+from manila_tempest_tests.common import discovery_cache
+from manila_tempest_tests.common import share_network_pool
+from manila_tempest_tests.common import share_pool
+from manila_tempest_tests.common import share_type_cache
+from manila_tempest_tests.common import waiters
 from manila_tempest_tests import share_exceptions
 from manila_tempest_tests import utils
 
@@ -92,24 +97,54 @@ class handle_cleanup_exceptions(object):
         return True  # Suppress error if any
 
 
-def network_synchronized(f):
-
-    def wrapped_func(self, *args, **kwargs):
-        with_isolated_creds = True if len(args) > 2 else False
-        no_lock_required = kwargs.get(
-            "isolated_creds_client", with_isolated_creds)
-        if no_lock_required:
-            # Usage of not reusable network. No need in lock.
-            return f(self, *args, **kwargs)
-
-        # Use lock assuming reusage of common network.
-        @lockutils.synchronized("manila_network_lock", external=True)
-        def source_func(self, *args, **kwargs):
-            return f(self, *args, **kwargs)
-
-        return source_func(self, *args, **kwargs)
-
-    return wrapped_func
+# Resource types in the order they are deleted in by clear_resources.
+# Resources of types of the same level do not depend on each other.
+# Shares and share groups created from a snapshot are deleted before the
+# snapshot, as some backends implement them as clones of it.
+CLEANUP_ORDER = (
+    ("share_replica", "access_rule"),
+    ("share_from_snapshot", ),
+    ("share_group_from_snapshot", ),
+    ("snapshot", "share_group_snapshot"),
+    ("share", ),
+    ("share_group", ),
+    ("share_network", ),
+    ("security_service", ),
+    ("share_group_type", ),
+    ("share_type", ),
+)
+
+
+def _clear_worker_resources():
+    """Deletes the resources shared by the test classes of the worker."""
+    # NOTE: pooled shares first, they may use cached share types.
+    share_pool.get_pool().clear()
+    share_type_cache.get_cache().clear()
+
+
+atexit.register(_clear_worker_resources)
+
+
+def _cleanup_type(res):
+    """Returns the type of a resource in CLEANUP_ORDER."""
+    if res.get("snapshot_id") or res.get("share_group_snapshot_id"):
+        if res["type"] == "share":
+            return "share_from_snapshot"
+        if res["type"] == "share_group":
+            return "share_group_from_snapshot"
+    return res["type"]
+
+
+def _snapshots_of(res, resources):
+    """Returns the resources left to delete which are snapshots of 'res'."""
+    snapshot_type, parent_key = {
+        "share": ("snapshot", "share_id"),
+        "share_group": ("share_group_snapshot", "share_group_id"),
+    }.get(res["type"], (None, None))
+    return [snapshot for snapshot in resources
+            if not snapshot["deleted"] and
+            snapshot["type"] == snapshot_type and
+            snapshot.get(parent_key) == res["id"]]
 
 
 skip_if_microversion_not_supported = utils.skip_if_microversion_not_supported
@@ -129,6 +164,13 @@ class BaseSharesTest(test.BaseTestCase):
     # Will be cleaned up in tearDown method
     method_resources = []
 
+    # Whether _create_share_type may return share types shared with other
+    # classes, which the tests must then not modify
+    reuse_share_types = True
+
+    # Will be returned to the share pool in resource_cleanup
+    class_leased_shares = []
+
     # Will be cleaned up in resource_cleanup
     class_isolated_creds = []
 
@@ -314,12 +356,12 @@ class BaseSharesTest(test.BaseTestCase):
 
     @classmethod
     def resource_cleanup(cls):
+        cls.release_leased_shares()
         cls.clear_resources(cls.class_resources)
         cls.clear_isolated_creds(cls.class_isolated_creds)
         super(BaseSharesTest, cls).resource_cleanup()
 
     @classmethod
-    @network_synchronized
     def provide_share_network(cls, shares_client, networks_client,
                               isolated_creds_client=None,
                               ignore_multitenancy_config=False):
@@ -328,6 +370,11 @@ class BaseSharesTest(test.BaseTestCase):
         This method creates/gets entity share-network for one tenant. This
         share-network will be used for creation of service vm.
 
+        Reusable share-networks, i.e. those provided when no
+        isolated_creds_client is given, are registered in the share network
+        pool, so that the other test workers check them out without
+        listing networks again.
+
         :param shares_client: shares client, which requires share-network
         :param networks_client: network client from same tenant as shares
         :param isolated_creds_client: DynamicCredentialProvider instance
@@ -340,84 +387,108 @@ class BaseSharesTest(test.BaseTestCase):
         """
 
         sc = shares_client
-        search_word = "reusable"
-        sn_name = "autogenerated_by_tempest_%s" % search_word
 
         if (not ignore_multitenancy_config and
                 not CONF.share.multitenancy_enabled):
             # Assumed usage of a single-tenant driver
+            return None
+        if sc.share_network_id:
+            # Share-network already exists, use it
+            return sc.share_network_id
+        if isolated_creds_client:
+            return cls._find_or_create_share_network(
+                sc, networks_client, isolated_creds_client)
+
+        if CONF.share.create_networks_when_multitenancy_enabled:
+            key = "%s-share-service" % sc.tenant_id
+        else:
+            key = "%s-no-network" % sc.tenant_id
+
+        def is_valid(share_network_id):
+            try:
+                sc.get_share_network(share_network_id)
+            except exceptions.NotFound:
+                return False
+            return True
+
+        return share_network_pool.get_pool().checkout(
+            key,
+            lambda: cls._find_or_create_share_network(sc, networks_client),
+            is_valid=is_valid)
+
+    @classmethod
+    def _find_or_create_share_network(cls, sc, networks_client,
+                                      isolated_creds_client=None):
+        search_word = "reusable"
+        sn_name = "autogenerated_by_tempest_%s" % search_word
+
+        if not CONF.share.create_networks_when_multitenancy_enabled:
             share_network_id = None
+
+            # Try get suitable share-network
+            share_networks = sc.list_share_networks_with_detail()
+            for sn in share_networks:
+                if (sn["neutron_net_id"] is None and
+                        sn["neutron_subnet_id"] is None and
+                        sn["name"] and search_word in sn["name"]):
+                    share_network_id = sn["id"]
+                    break
+
+            # Create new share-network if one was not found
+            if share_network_id is None:
+                sn_desc = "This share-network was created by tempest"
+                sn = sc.create_share_network(name=sn_name,
+                                             description=sn_desc)
+                share_network_id = sn["id"]
         else:
-            if sc.share_network_id:
-                # Share-network already exists, use it
-                share_network_id = sc.share_network_id
-            elif not CONF.share.create_networks_when_multitenancy_enabled:
-                share_network_id = None
+            net_id = subnet_id = share_network_id = None
+
+            if not isolated_creds_client:
+                # Search for networks, created in previous runs
+                service_net_name = "share-service"
+                networks = networks_client.list_networks()
+                if "networks" in networks.keys():
+                    networks = networks["networks"]
+                for network in networks:
+                    if (service_net_name in network["name"] and
+                            sc.tenant_id == network['tenant_id']):
+                        net_id = network["id"]
+                        if len(network["subnets"]) > 0:
+                            subnet_id = network["subnets"][0]
+                            break
+
+                # Create suitable network
+                if net_id is None or subnet_id is None:
+                    ic = cls._get_dynamic_creds(service_net_name)
+                    net_data = ic._create_network_resources(sc.tenant_id)
+                    network, subnet, router = net_data
+                    net_id = network["id"]
+                    subnet_id = subnet["id"]
 
                 # Try get suitable share-network
                 share_networks = sc.list_share_networks_with_detail()
                 for sn in share_networks:
-                    if (sn["neutron_net_id"] is None and
-                            sn["neutron_subnet_id"] is None and
+                    if (net_id == sn["neutron_net_id"] and
+                            subnet_id == sn["neutron_subnet_id"] and
                             sn["name"] and search_word in sn["name"]):
                         share_network_id = sn["id"]
                         break
-
-                # Create new share-network if one was not found
-                if share_network_id is None:
-                    sn_desc = "This share-network was created by tempest"
-                    sn = sc.create_share_network(name=sn_name,
-                                                 description=sn_desc)
-                    share_network_id = sn["id"]
             else:
-                net_id = subnet_id = share_network_id = None
-
-                if not isolated_creds_client:
-                    # Search for networks, created in previous runs
-                    service_net_name = "share-service"
-                    networks = networks_client.list_networks()
-                    if "networks" in networks.keys():
-                        networks = networks["networks"]
-                    for network in networks:
-                        if (service_net_name in network["name"] and
-                                sc.tenant_id == network['tenant_id']):
-                            net_id = network["id"]
-                            if len(network["subnets"]) > 0:
-                                subnet_id = network["subnets"][0]
-                                break
-
-                    # Create suitable network
-                    if net_id is None or subnet_id is None:
-                        ic = cls._get_dynamic_creds(service_net_name)
-                        net_data = ic._create_network_resources(sc.tenant_id)
-                        network, subnet, router = net_data
-                        net_id = network["id"]
-                        subnet_id = subnet["id"]
-
-                    # Try get suitable share-network
-                    share_networks = sc.list_share_networks_with_detail()
-                    for sn in share_networks:
-                        if (net_id == sn["neutron_net_id"] and
-                                subnet_id == sn["neutron_subnet_id"] and
-                                sn["name"] and search_word in sn["name"]):
-                            share_network_id = sn["id"]
-                            break
-                else:
-                    sn_name = "autogenerated_by_tempest_for_isolated_creds"
-                    # Use precreated network and subnet from isolated creds
-                    net_id = isolated_creds_client.get_credentials(
-                        isolated_creds_client.type_of_creds).network['id']
-                    subnet_id = isolated_creds_client.get_credentials(
-                        isolated_creds_client.type_of_creds).subnet['id']
-
-                # Create suitable share-network
-                if share_network_id is None:
-                    sn_desc = "This share-network was created by tempest"
-                    sn = sc.create_share_network(name=sn_name,
-                                                 description=sn_desc,
-                                                 neutron_net_id=net_id,
-                                                 neutron_subnet_id=subnet_id)
-                    share_network_id = sn["id"]
+                sn_name = "autogenerated_by_tempest_for_isolated_creds"
+                # Use precreated network and subnet from isolated creds
+                net_id = isolated_creds_client.get_credentials(
+                    isolated_creds_client.type_of_creds).network['id']
+                subnet_id = isolated_creds_client.get_credentials(
+                    isolated_creds_client.type_of_creds).subnet['id']
+
+            # Create suitable share-network
+            if share_network_id is None:
+                sn_desc = "This share-network was created by tempest"
+                sn = sc.create_share_network(name=sn_name,
+                                             description=sn_desc,
+                                             neutron_net_id=net_id,
+                                             neutron_subnet_id=subnet_id)
+                share_network_id = sn["id"]
 
         return share_network_id
 
@@ -450,12 +521,94 @@ class BaseSharesTest(test.BaseTestCase):
 
         share = client.create_share(**kwargs)
         resource = {"type": "share", "id": share["id"], "client": client,
-                    "share_group_id": share_group_id}
+                    "share_group_id": share_group_id,
+                    "snapshot_id": snapshot_id}
         cleanup_list = (cls.class_resources if cleanup_in_class else
                         cls.method_resources)
         cleanup_list.insert(0, resource)
         return share
 
+    @classmethod
+    def lease_share(cls, share_protocol=None, size=None, share_type_id=None,
+                    share_network_id=None, client=None, **kwargs):
+        """Provides a share which the tests of the class only read.
+
+        If 'share_pool_enabled' is set and credentials are pre-provisioned,
+        a share created with the same parameters for the same project is
+        leased from the share pool of the worker, or created and added to
+        it, and is returned to the pool in resource_cleanup. Tests may add
+        and delete access rules, the leftover ones are removed before the
+        next lease, but must not otherwise modify the share. Otherwise a
+        share is created with create_share.
+        """
+        client = client or cls.shares_v2_client
+        # NOTE: pooled shares are deleted when the worker exits, with the
+        # client of the class which created them. Dynamic credentials are
+        # deleted with the class, so they can't be used for it.
+        if not (CONF.share.share_pool_enabled and
+                not CONF.auth.use_dynamic_credentials):
+            return cls.create_share(
+                share_protocol, size=size, share_type_id=share_type_id,
+                share_network_id=share_network_id, client=client, **kwargs)
+
+        share_protocol = share_protocol or client.share_protocol
+        size = size or CONF.share.share_size
+        share_network_id = (share_network_id or
+                            CONF.share.share_network_id or
+                            client.share_network_id or None)
+        key = share_pool.spec_key(
+            client.tenant_id, share_protocol=share_protocol, size=size,
+            share_type_id=share_type_id, share_network_id=share_network_id,
+            **kwargs)
+
+        def create():
+            share = cls.create_share(
+                share_protocol, size=size, share_type_id=share_type_id,
+                share_network_id=share_network_id, client=client, **kwargs)
+            # NOTE: pooled shares are deleted by the pool, not the class.
+            cls.class_resources[:] = [
+                res for res in cls.class_resources
+                if not (res["type"] == "share" and res["id"] == share["id"])]
+            return share
+
+        def reset(share):
+            share = client.get_share(share["id"])
+            if share["status"] != "available" or share["size"] != size:
+                return None
+            rule_ids = [rule["id"] for rule in
+                        client.list_access_rules(share["id"])]
+            for rule_id in rule_ids:
+                client.delete_access_rule(share["id"], rule_id)
+            if rule_ids:
+                client.wait_for_access_rules_deletion(share["id"], rule_ids)
+            return share
+
+        share = share_pool.get_pool().lease(key, client, create, reset=reset)
+        cls.class_leased_shares.append((share, client))
+        return share
+
+    @classmethod
+    def release_leased_shares(cls):
+        """Returns the shares leased by the class to the share pool.
+
+        Shares depending on a share type or share network which the class
+        is about to delete are removed from the pool and deleted along with
+        the other resources of the class instead.
+        """
+        pool = share_pool.get_pool()
+        doomed = set(res["id"] for res in cls.class_resources
+                     if res["type"] in ("share_type", "share_network") and
+                     not res.get("deleted"))
+        for share, client in cls.class_leased_shares:
+            if (share.get("share_type") in doomed or
+                    share.get("share_network_id") in doomed):
+                pool.forget(share["id"])
+                cls.class_resources.insert(0, {
+                    "type": "share", "id": share["id"], "client": client})
+            else:
+                pool.release(share["id"])
+        del cls.class_leased_shares[:]
+
     @classmethod
     def migrate_share(
             cls, share_id, dest_host, wait_for_status, client=None,
@@ -539,45 +692,95 @@ class BaseSharesTest(test.BaseTestCase):
             local_d["share"] = cls._create_share(
                 *local_d["args"], **local_d["kwargs"])
             local_d["cnt"] = 0
-            local_d["available"] = False
             local_d["wait_for_status"] = wait_for_status
             data.append(local_d)
 
-        while not all(d["available"] for d in data):
-            for d in data:
-                if not d["wait_for_status"]:
-                    d["available"] = True
-                if d["available"]:
-                    continue
+        # NOTE: the shares of a client are awaited together, with one
+        # listing per check, and the ones which failed are created again
+        # and awaited together in turn.
+        pending = [d for d in data if d["wait_for_status"]]
+        while pending:
+            failed = []
+            for client, group in cls._group_by_client(pending):
+                share_ids = [d["share"]["id"] for d in group]
+                params = cls._shares_list_filters(
+                    [d["share"] for d in group])
+                try:
+                    shares = client.wait_for_shares_status(
+                        share_ids, constants.STATUS_AVAILABLE,
+                        params=params, raise_on_error=False)
+                    error = None
+                except exceptions.TimeoutException as e:
+                    shares = dict(
+                        (share["id"], share) for share in
+                        client.list_shares_with_detail(params=params))
+                    error = e
+                for d in group:
+                    share = shares.get(d["share"]["id"])
+                    if (share and
+                            share["status"] == constants.STATUS_AVAILABLE):
+                        continue
+                    failed.append((d, error or (
+                        share_exceptions.ShareBuildErrorException(
+                            share_id=d["share"]["id"]))))
+            pending = []
+            for d, e in failed:
+                if CONF.share.share_creation_retry_number <= d["cnt"]:
+                    raise e
                 client = d["kwargs"]["client"]
                 share_id = d["share"]["id"]
-                try:
-                    client.wait_for_share_status(share_id, "available")
-                    d["available"] = True
-                except (share_exceptions.ShareBuildErrorException,
-                        exceptions.TimeoutException) as e:
-                    if CONF.share.share_creation_retry_number > d["cnt"]:
-                        d["cnt"] += 1
-                        msg = ("Share '%s' failed to be built. "
-                               "Trying create another." % share_id)
-                        LOG.error(msg)
-                        LOG.error(e)
-                        cg_id = d["kwargs"].get("consistency_group_id")
-                        if cg_id:
-                            # NOTE(vponomaryov): delete errored share
-                            # immediately in case share is part of CG.
-                            client.delete_share(
-                                share_id,
-                                params={"consistency_group_id": cg_id})
-                            client.wait_for_resource_deletion(
-                                share_id=share_id)
-                        d["share"] = cls._create_share(
-                            *d["args"], **d["kwargs"])
-                    else:
-                        raise
+                d["cnt"] += 1
+                msg = ("Share '%s' failed to be built. "
+                       "Trying create another." % share_id)
+                LOG.error(msg)
+                LOG.error(e)
+                cg_id = d["kwargs"].get("consistency_group_id")
+                if cg_id:
+                    # NOTE(vponomaryov): delete errored share
+                    # immediately in case share is part of CG.
+                    client.delete_share(
+                        share_id,
+                        params={"consistency_group_id": cg_id})
+                    client.wait_for_resource_deletion(share_id=share_id)
+                d["share"] = cls._create_share(*d["args"], **d["kwargs"])
+                pending.append(d)
 
         return [d["share"] for d in data]
 
+    @staticmethod
+    def _group_by_client(items):
+        """Groups share creation data by client, keeping their order.
+
+        :param items: dicts of create_shares with the client in 'kwargs'.
+        :returns: list of (client, list of items) tuples.
+        """
+        groups = []
+        for item in items:
+            client = item["kwargs"]["client"]
+            for group_client, group in groups:
+                if group_client is client:
+                    group.append(item)
+                    break
+            else:
+                groups.append((client, [item]))
+        return groups
+
+    @staticmethod
+    def _shares_list_filters(shares):
+        """Returns share list filters matching all the given shares.
+
+        Only the attributes the shares have in common are filtered on, so
+        that the listing of the awaited shares is as short as possible.
+        """
+        params = {}
+        for key, attr in (("share_type_id", "share_type"),
+                          ("share_network_id", "share_network_id"),
+                          ("name", "name")):
+            values = set(share.get(attr) for share in shares)
+            if len(values) == 1 and None not in values:
+                params[key] = values.pop()
+        return params
+
     @classmethod
     def create_share_group(cls, client=None, cleanup_in_class=True,
                            share_network_id=None, **kwargs):
@@ -590,6 +793,8 @@ class BaseSharesTest(test.BaseTestCase):
             "type": "share_group",
             "id": share_group["id"],
             "client": client,
+            "share_group_snapshot_id": kwargs.get(
+                'source_share_group_snapshot_id'),
         }
         if cleanup_in_class:
             cls.class_resources.insert(0, resource)
@@ -606,7 +811,9 @@ class BaseSharesTest(test.BaseTestCase):
                 resource = {"type": "share",
                             "id": share["id"],
                             "client": client,
-                            "share_group_id": share.get("share_group_id")}
+                            "share_group_id": share.get("share_group_id"),
+                            "share_group_snapshot_id": kwargs[
+                                'source_share_group_snapshot_id']}
                 if cleanup_in_class:
                     cls.class_resources.insert(0, resource)
                 else:
@@ -656,6 +863,7 @@ class BaseSharesTest(test.BaseTestCase):
             "type": "snapshot",
             "id": snapshot["id"],
             "client": client,
+            "share_id": share_id,
         }
         if cleanup_in_class:
             cls.class_resources.insert(0, resource)
@@ -664,6 +872,36 @@ class BaseSharesTest(test.BaseTestCase):
         client.wait_for_snapshot_status(snapshot["id"], "available")
         return snapshot
 
+    @classmethod
+    def create_snapshots_wait_for_active(cls, share_ids, client=None,
+                                         cleanup_in_class=True):
+        """Creates a snapshot of each share and waits for all of them.
+
+        :param share_ids: ids of the shares to snapshot, a share is
+            snapshotted as many times as it is listed.
+        :returns: list of the snapshots, in the order of 'share_ids'.
+        """
+        client = client or cls.shares_v2_client
+        cleanup_list = (cls.class_resources if cleanup_in_class else
+                        cls.method_resources)
+        snapshots = []
+        for share_id in share_ids:
+            snapshot = client.create_snapshot(
+                share_id, None, "Tempest's snapshot", False)
+            cleanup_list.insert(0, {
+                "type": "snapshot",
+                "id": snapshot["id"],
+                "client": client,
+                "share_id": share_id,
+            })
+            snapshots.append(snapshot)
+        params = ({"share_id": share_ids[0]} if len(set(share_ids)) == 1
+                  else None)
+        client.wait_for_snapshots_status(
+            [snapshot["id"] for snapshot in snapshots], "available",
+            params=params)
+        return snapshots
+
     @classmethod
     def create_share_group_snapshot_wait_for_active(
             cls, share_group_id, name=None, description=None, client=None,
@@ -677,6 +915,7 @@ class BaseSharesTest(test.BaseTestCase):
             "type": "share_group_snapshot",
             "id": sg_snapshot["id"],
             "client": client,
+            "share_group_id": share_group_id,
         }
         if cleanup_in_class:
             cls.class_resources.insert(0, resource)
@@ -697,22 +936,36 @@ class BaseSharesTest(test.BaseTestCase):
             '|'.join(['^%s$' % backend for backend in backends])
             if backends else '.*'
         )
-        cls.services = client.list_services()
+        cls.services = discovery_cache.get_cache().get(
+            discovery_cache.SERVICES, client.list_services)
         zones = [service['zone'] for service in cls.services if
                  service['binary'] == 'manila-share' and
                  service['state'] == 'up' and
                  re.search(backends, service['host'])]
         return zones
 
+    @classmethod
+    def get_pools(cls, client=None):
+        """Lists the detailed pools, through the discovery cache."""
+        client = client or cls.admin_shares_v2_client
+        return discovery_cache.get_cache().get(
+            discovery_cache.POOLS_DETAIL,
+            lambda: client.list_pools(detail=True)['pools'])
+
     @classmethod
     def get_pools_matching_share_type(cls, share_type, client=None):
         client = client or cls.admin_shares_v2_client
+        cache = discovery_cache.get_cache()
         if utils.is_microversion_supported('2.23'):
-            return client.list_pools(
-                search_opts={'share_type': share_type['id']})['pools']
-
-        pools = client.list_pools(detail=True)['pools']
-        share_type = client.get_share_type(share_type['id'])['share_type']
+            return cache.get(
+                discovery_cache.pools_for_share_type_key(share_type['id']),
+                lambda: client.list_pools(
+                    search_opts={'share_type': share_type['id']})['pools'])
+
+        pools = cls.get_pools(client=client)
+        share_type = cache.get(
+            discovery_cache.share_type_key(share_type['id']),
+            lambda: client.get_share_type(share_type['id']))['share_type']
         extra_specs = {}
         for k, v in share_type['extra_specs'].items():
             extra_specs[k] = (
@@ -739,7 +992,7 @@ class BaseSharesTest(test.BaseTestCase):
 
     def get_pools_for_replication_domain(self):
         # Get the list of pools for the replication domain
-        pools = self.admin_client.list_pools(detail=True)['pools']
+        pools = self.get_pools(client=self.admin_client)
         instance_host = self.admin_client.get_share(
             self.shares[0]['id'])['host']
         host_pool = [p for p in pools if p['name'] == instance_host][0]
@@ -849,6 +1102,36 @@ class BaseSharesTest(test.BaseTestCase):
             cls.method_resources.insert(0, resource)
         return security_service
 
+    @classmethod
+    def create_access_rules(cls, share_id, rules, client=None,
+                            cleanup_in_class=False, **kwargs):
+        """Creates several access rules of a share with a single wait.
+
+        Every rule is registered for cleanup as soon as it is requested,
+        so that none is left behind if a later request or the wait raises.
+
+        :param rules: list of dicts of create_access_rule keyword arguments.
+        :returns: dict mapping the ids of the created rules to their final
+            rule dicts.
+        """
+        if client is None:
+            client = cls.shares_v2_client
+
+        def register(rule_id):
+            resource = {
+                "type": "access_rule",
+                "id": rule_id,
+                "share_id": share_id,
+                "client": client,
+            }
+            if cleanup_in_class:
+                cls.class_resources.insert(0, resource)
+            else:
+                cls.method_resources.insert(0, resource)
+
+        return client.create_access_rules(
+            share_id, rules, on_create=register, **kwargs)
+
     @classmethod
     def create_share_type(cls, name, is_public=True, client=None,
                           cleanup_in_class=True, **kwargs):
@@ -866,6 +1149,33 @@ class BaseSharesTest(test.BaseTestCase):
             cls.method_resources.insert(0, resource)
         return share_type
 
+    @classmethod
+    def acquire_share_type(cls, extra_specs, is_public=True, client=None):
+        """Provides a share type with the given extra specs to the class.
+
+        If 'share_type_cache_enabled' is set, credentials are
+        pre-provisioned and the class allows it, the share type with the
+        same extra specs and visibility cached by the worker is returned,
+        or created and cached. Otherwise a share type is created for the
+        class.
+        """
+        client = client or cls.shares_v2_client
+        name = data_utils.rand_name("unique_st_name")
+        # NOTE: cached share types are deleted when the worker exits, with
+        # the client of the class which created them. Dynamic credentials
+        # are deleted with the class, so they can't be used for it.
+        if not (cls.reuse_share_types and
+                CONF.share.share_type_cache_enabled and
+                not CONF.auth.use_dynamic_credentials):
+            return cls.create_share_type(
+                name, is_public=is_public, client=client,
+                extra_specs=extra_specs)['share_type']
+
+        return share_type_cache.get_cache().acquire(
+            share_type_cache.type_key(extra_specs, is_public), client,
+            lambda: client.create_share_type(
+                name, is_public, extra_specs=extra_specs)['share_type'])
+
     @staticmethod
     def add_extra_specs_to_dict(extra_specs=None):
         """Add any required extra-specs to share type dictionary"""
@@ -923,8 +1233,15 @@ class BaseSharesTest(test.BaseTestCase):
 
         This method tries to remove resources from resource list,
         if it is not found, assumed it was deleted in test itself.
-        It is expected, that all resources were added as LIFO
-        due to restriction of deletion resources, that is in the chain.
+        Resources are deleted level by level following CLEANUP_ORDER, so
+        that dependent resources go first; shares and share groups created
+        from a snapshot go before the snapshot. All resources of one level
+        are deleted at once and then awaited together; within a level they
+        are processed as LIFO, in which order they are expected to be added.
+        If resources of a level still have snapshots, e.g. shares created
+        from a snapshot of a share created from a snapshot, the level is
+        processed one resource at a time in LIFO order instead, each one
+        after its snapshots.
 
         :param resources: dict with keys 'type','id','client' and 'deleted'
         """
@@ -935,52 +1252,119 @@ class BaseSharesTest(test.BaseTestCase):
                 res["deleted"] = False
             if "client" not in res.keys():
                 res["client"] = cls.shares_client
-            if not(res["deleted"]):
-                res_id = res['id']
-                client = res["client"]
-                with handle_cleanup_exceptions():
-                    if res["type"] is "share":
-                        cls.clear_share_replicas(res_id)
-                        share_group_id = res.get('share_group_id')
-                        if share_group_id:
-                            params = {'share_group_id': share_group_id}
-                            client.delete_share(res_id, params=params)
-                        else:
-                            client.delete_share(res_id)
-                        client.wait_for_resource_deletion(share_id=res_id)
-                    elif res["type"] is "snapshot":
-                        client.delete_snapshot(res_id)
-                        client.wait_for_resource_deletion(snapshot_id=res_id)
-                    elif (res["type"] is "share_network" and
-                            res_id != CONF.share.share_network_id):
-                        client.delete_share_network(res_id)
-                        client.wait_for_resource_deletion(sn_id=res_id)
-                    elif res["type"] is "security_service":
-                        client.delete_security_service(res_id)
-                        client.wait_for_resource_deletion(ss_id=res_id)
-                    elif res["type"] is "share_type":
-                        client.delete_share_type(res_id)
-                        client.wait_for_resource_deletion(st_id=res_id)
-                    elif res["type"] is "share_group":
-                        client.delete_share_group(res_id)
-                        client.wait_for_resource_deletion(
-                            share_group_id=res_id)
-                    elif res["type"] is "share_group_type":
-                        client.delete_share_group_type(res_id)
-                        client.wait_for_resource_deletion(
-                            share_group_type_id=res_id)
-                    elif res["type"] is "share_group_snapshot":
-                        client.delete_share_group_snapshot(res_id)
-                        client.wait_for_resource_deletion(
-                            share_group_snapshot_id=res_id)
-                    elif res["type"] is "share_replica":
-                        client.delete_share_replica(res_id)
-                        client.wait_for_resource_deletion(replica_id=res_id)
-                    else:
-                        LOG.warning("Provided unsupported resource type for "
-                                    "cleanup '%s'. Skipping.", res["type"])
+
+        known_types = set()
+        for level in CLEANUP_ORDER:
+            known_types.update(level)
+            batch = [res for res in resources
+                     if not res["deleted"] and _cleanup_type(res) in level]
+            if any(_snapshots_of(res, resources) for res in batch):
+                for res in batch:
+                    cls._delete_resources(_snapshots_of(res, resources))
+                    cls._delete_resources([res])
+            else:
+                cls._delete_resources(batch)
+
+        for res in resources:
+            if not res["deleted"] and _cleanup_type(res) not in known_types:
+                LOG.warning("Provided unsupported resource type for "
+                            "cleanup '%s'. Skipping.", res["type"])
                 res["deleted"] = True
 
+    @classmethod
+    def _delete_resources(cls, resources):
+        """Deletes resources at once and waits for them together."""
+        to_wait = []
+        for res in resources:
+            with handle_cleanup_exceptions():
+                wait_kwargs = cls._delete_resource(res)
+                if wait_kwargs:
+                    to_wait.append((res, wait_kwargs))
+            res["deleted"] = True
+        cls._wait_for_resources_deletion(to_wait)
+
+    @classmethod
+    def _delete_resource(cls, res):
+        """Issues the deletion of a resource without waiting for it.
+
+        :param res: dict with keys 'type', 'id' and 'client'
+        :returns: kwargs for 'is_resource_deleted' of the resource client,
+            or None if there is nothing to wait for.
+        """
+        res_id = res["id"]
+        client = res["client"]
+        if res["type"] == "share":
+            cls.clear_share_replicas(res_id)
+            share_group_id = res.get('share_group_id')
+            if share_group_id:
+                params = {'share_group_id': share_group_id}
+                client.delete_share(res_id, params=params)
+            else:
+                client.delete_share(res_id)
+            return {"share_id": res_id}
+        elif res["type"] == "snapshot":
+            client.delete_snapshot(res_id)
+            return {"snapshot_id": res_id}
+        elif res["type"] == "share_network":
+            if res_id == CONF.share.share_network_id:
+                return None
+            client.delete_share_network(res_id)
+            return {"sn_id": res_id}
+        elif res["type"] == "security_service":
+            client.delete_security_service(res_id)
+            return {"ss_id": res_id}
+        elif res["type"] == "share_type":
+            client.delete_share_type(res_id)
+            return {"st_id": res_id}
+        elif res["type"] == "share_group":
+            client.delete_share_group(res_id)
+            return {"share_group_id": res_id}
+        elif res["type"] == "share_group_type":
+            client.delete_share_group_type(res_id)
+            return {"share_group_type_id": res_id}
+        elif res["type"] == "share_group_snapshot":
+            client.delete_share_group_snapshot(res_id)
+            return {"share_group_snapshot_id": res_id}
+        elif res["type"] == "share_replica":
+            client.delete_share_replica(res_id)
+            return {"replica_id": res_id}
+        elif res["type"] == "access_rule":
+            client.delete_access_rule(res["share_id"], res_id)
+            return {"rule_id": res_id, "share_id": res["share_id"]}
+
+    @staticmethod
+    def _wait_for_resources_deletion(to_wait):
+        """Waits for the deletion of several resources at once.
+
+        :param to_wait: list of (resource, is_resource_deleted kwargs)
+            tuples, as returned by '_delete_resource'.
+        """
+        if not to_wait:
+            return
+        pending = [(res, kwargs,
+                    waiters.clock.now() + res["client"].build_timeout)
+                   for res, kwargs in to_wait]
+        intervals = waiters.get_backoff_policy(
+            CONF.share.build_interval).intervals()
+        while True:
+            for item in list(pending):
+                res, kwargs, deadline = item
+                # NOTE: stop waiting for a resource whose error got
+                # suppressed as well.
+                deleted = True
+                with handle_cleanup_exceptions():
+                    deleted = res["client"].is_resource_deleted(**kwargs)
+                    if not deleted and waiters.clock.now() >= deadline:
+                        raise exceptions.TimeoutException(
+                            "Resource '%s' with id '%s' failed to be "
+                            "deleted within the required time." % (
+                                res["type"], res["id"]))
+                if deleted:
+                    pending.remove(item)
+            if not pending:
+                return
+            waiters.clock.sleep(next(intervals))
+
     @classmethod
     def generate_share_network_data(self):
         data = {
@@ -1102,11 +1486,9 @@ class BaseSharesAdminTest(BaseSharesTest):
 
     @classmethod
     def _create_share_type(cls, specs=None):
-        name = data_utils.rand_name("unique_st_name")
         extra_specs = cls.add_extra_specs_to_dict(specs)
-        return cls.create_share_type(
-            name, extra_specs=extra_specs,
-            client=cls.admin_shares_v2_client)['share_type']
+        return cls.acquire_share_type(
+            extra_specs, client=cls.admin_shares_v2_client)
 
     @classmethod
     def _create_share_group_type(cls):
@@ -1234,11 +1616,9 @@ class BaseSharesMixedTest(BaseSharesTest):
 
     @classmethod
     def _create_share_type(cls, specs=None):
-        name = data_utils.rand_name("unique_st_name")
         extra_specs = cls.add_extra_specs_to_dict(specs)
-        return cls.create_share_type(
-            name, extra_specs=extra_specs,
-            client=cls.admin_shares_v2_client)['share_type']
+        return cls.acquire_share_type(
+            extra_specs, client=cls.admin_shares_v2_client)
 
     @classmethod
     def _create_share_group_type(cls):
@@ -32,6 +32,8 @@ _MIN_SUPPORTED_MICROVERSION = '2.11'
 @base.skip_if_microversion_lt(_MIN_SUPPORTED_MICROVERSION)
 class ReplicationNegativeTest(base.BaseSharesMixedTest):
 
+    reuse_share_types = False
+
     @classmethod
     def resource_setup(cls):
         super(ReplicationNegativeTest, cls).resource_setup()
@@ -92,8 +92,8 @@ class ShareIpRulesForNFSTest(base.BaseSharesMixedTest):
         cls.share_type_id = cls.share_type['id']
 
         # create share
-        cls.share = cls.create_share(cls.protocol,
-                                     share_type_id=cls.share_type_id)
+        cls.share = cls.lease_share(cls.protocol,
+                                    share_type_id=cls.share_type_id)
         cls.access_type = "ip"
         cls.access_to = "2.2.2.2"
 
@@ -242,8 +242,8 @@ class ShareUserRulesForNFSTest(base.BaseSharesMixedTest):
         cls.share_type_id = cls.share_type['id']
 
         # create share
-        cls.share = cls.create_share(cls.protocol,
-                                     share_type_id=cls.share_type_id)
+        cls.share = cls.lease_share(cls.protocol,
+                                    share_type_id=cls.share_type_id)
 
         cls.access_type = "user"
         cls.access_to = CONF.share.username_for_user_rules
@@ -332,8 +332,8 @@ class ShareCertRulesForGLUSTERFSTest(base.BaseSharesMixedTest):
         cls.share_type_id = cls.share_type['id']
 
         # create share
-        cls.share = cls.create_share(cls.protocol,
-                                     share_type_id=cls.share_type_id)
+        cls.share = cls.lease_share(cls.protocol,
+                                    share_type_id=cls.share_type_id)
 
         cls.access_type = "cert"
         # Provide access to a client identified by a common name (CN) of the
@@ -449,8 +449,8 @@ class ShareCephxRulesForCephFSTest(base.BaseSharesMixedTest):
         cls.share_type_id = cls.share_type['id']
 
         # create share
-        cls.share = cls.create_share(cls.protocol,
-                                     share_type_id=cls.share_type_id)
+        cls.share = cls.lease_share(cls.protocol,
+                                    share_type_id=cls.share_type_id)
 
         cls.access_type = "cephx"
         # Provide access to a client identified by a cephx auth id.
@@ -514,7 +514,7 @@ class ShareRulesTest(base.BaseSharesMixedTest):
         cls.shares_v2_client.share_protocol = cls.protocol
         cls.share_type = cls._create_share_type()
         cls.share_type_id = cls.share_type['id']
-        cls.share = cls.create_share(share_type_id=cls.share_type_id)
+        cls.share = cls.lease_share(share_type_id=cls.share_type_id)
 
     @tc.attr(base.TAG_POSITIVE, base.TAG_API_WITH_BACKEND)
     @ddt.data(*set(
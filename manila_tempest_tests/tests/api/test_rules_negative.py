@@ -48,8 +48,8 @@ class ShareIpRulesForNFSNegativeTest(base.BaseSharesMixedTest):
         cls.share_type = cls._create_share_type()
         cls.share_type_id = cls.share_type['id']
         # create share
-        cls.share = cls.create_share(cls.protocol,
-                                     share_type_id=cls.share_type_id)
+        cls.share = cls.lease_share(cls.protocol,
+                                    share_type_id=cls.share_type_id)
         if CONF.share.run_snapshot_tests:
             # create snapshot
             cls.snap = cls.create_snapshot_wait_for_active(cls.share["id"])
@@ -205,8 +205,8 @@ class ShareUserRulesForNFSNegativeTest(base.BaseSharesMixedTest):
         cls.share_type = cls._create_share_type()
         cls.share_type_id = cls.share_type['id']
         # create share
-        cls.share = cls.create_share(cls.protocol,
-                                     share_type_id=cls.share_type_id)
+        cls.share = cls.lease_share(cls.protocol,
+                                    share_type_id=cls.share_type_id)
         if CONF.share.run_snapshot_tests:
             # create snapshot
             cls.snap = cls.create_snapshot_wait_for_active(cls.share["id"])
@@ -299,8 +299,8 @@ class ShareCertRulesForGLUSTERFSNegativeTest(base.BaseSharesMixedTest):
         cls.share_type = cls._create_share_type()
         cls.share_type_id = cls.share_type['id']
         # create share
-        cls.share = cls.create_share(cls.protocol,
-                                     share_type_id=cls.share_type_id)
+        cls.share = cls.lease_share(cls.protocol,
+                                    share_type_id=cls.share_type_id)
         if CONF.share.run_snapshot_tests:
             # create snapshot
             cls.snap = cls.create_snapshot_wait_for_active(cls.share["id"])
@@ -366,8 +366,8 @@ class ShareCephxRulesForCephFSNegativeTest(base.BaseSharesMixedTest):
         cls.share_type = cls._create_share_type()
         cls.share_type_id = cls.share_type['id']
         # create share
-        cls.share = cls.create_share(cls.protocol,
-                                     share_type_id=cls.share_type_id)
+        cls.share = cls.lease_share(cls.protocol,
+                                    share_type_id=cls.share_type_id)
         cls.access_type = "cephx"
         cls.access_to = "david"
 
@@ -419,7 +419,7 @@ class ShareRulesNegativeTest(base.BaseSharesMixedTest):
         cls.share_type = cls._create_share_type()
         cls.share_type_id = cls.share_type['id']
         # create share
-        cls.share = cls.create_share(share_type_id=cls.share_type_id)
+        cls.share = cls.lease_share(share_type_id=cls.share_type_id)
         if CONF.share.run_snapshot_tests:
             # create snapshot
             cls.snap = cls.create_snapshot_wait_for_active(cls.share["id"])
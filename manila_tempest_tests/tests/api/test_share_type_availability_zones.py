@@ -25,6 +25,8 @@ CONF = config.CONF
 @ddt.ddt
 class ShareTypeAvailabilityZonesTest(base.BaseSharesMixedTest):
 
+    reuse_share_types = False
+
     @classmethod
     def resource_setup(cls):
         super(ShareTypeAvailabilityZonesTest, cls).resource_setup()
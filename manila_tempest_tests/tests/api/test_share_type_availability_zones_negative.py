@@ -21,6 +21,8 @@ from manila_tempest_tests.tests.api import base
 @ddt.ddt
 class ShareTypeAvailabilityZonesNegativeTest(base.BaseSharesMixedTest):
 
+    reuse_share_types = False
+
     @classmethod
     def resource_setup(cls):
         super(ShareTypeAvailabilityZonesNegativeTest, cls).resource_setup()
@@ -176,6 +176,33 @@ class SharesNFSTest(base.BaseSharesMixedTest):
                "source of share %s" % (snap["id"], get["snapshot_id"]))
         self.assertEqual(get["snapshot_id"], snap["id"], msg)
 
+    @tc.attr(base.TAG_POSITIVE, base.TAG_BACKEND)
+    @testtools.skipUnless(CONF.share.run_snapshot_tests,
+                          "Snapshot tests are disabled.")
+    @testtools.skipUnless(
+        CONF.share.capability_create_share_from_snapshot_support,
+        "Create share from snapshot tests are disabled.")
+    def test_clear_chain_of_shares_from_snapshots(self):
+        # share -> snap1 -> child -> snap2, the child can only be deleted
+        # after snap2 and before snap1.
+        snap1 = self.create_snapshot_wait_for_active(
+            self.share["id"], cleanup_in_class=False)
+        child = self.create_share(self.protocol,
+                                  share_type_id=self.share_type_id,
+                                  snapshot_id=snap1["id"],
+                                  cleanup_in_class=False)
+        snap2 = self.create_snapshot_wait_for_active(
+            child["id"], cleanup_in_class=False)
+
+        self.clear_resources(self.method_resources)
+
+        self.assertRaises(lib_exc.NotFound,
+                          self.shares_client.get_snapshot, snap2["id"])
+        self.assertRaises(lib_exc.NotFound,
+                          self.shares_client.get_share, child["id"])
+        self.assertRaises(lib_exc.NotFound,
+                          self.shares_client.get_snapshot, snap1["id"])
+
     @tc.attr(base.TAG_POSITIVE, base.TAG_BACKEND)
     @testtools.skipIf(not CONF.share.multitenancy_enabled,
                       "Only for multitenancy.")
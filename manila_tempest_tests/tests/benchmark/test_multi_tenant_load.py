@@ -0,0 +1,232 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+import random
+import time
+
+from oslo_log import log
+from tempest import config
+from testtools import testcase as tc
+
+from manila_tempest_tests.common import benchmark
+from manila_tempest_tests.common import constants
+from manila_tempest_tests.tests.api import base
+from manila_tempest_tests import utils
+
+CONF = config.CONF
+LOG = log.getLogger(__name__)
+_MIN_REPLICATION_MICROVERSION = '2.11'
+
+
+class MultiTenantLoadTest(base.BaseSharesMixedTest):
+    """Drives a mix of share operations from several isolated tenants.
+
+    Every tenant gets its own credentials and share network, and a share
+    its snapshots, access rules and replicas are made of. Its workers then
+    repeatedly pick an operation of the configured mix and run it, i.e.
+    create a resource, wait for it to be ready, delete it and wait for it
+    to be gone, until the configured duration or number of operations is
+    reached. Failed operations are counted and the run goes on. The
+    throughput, error rate and latencies of every operation are reported
+    as JSON, for the whole run and interval by interval, showing where the
+    control plane saturates.
+    """
+
+    protocol = "nfs"
+
+    @classmethod
+    def skip_checks(cls):
+        super(MultiTenantLoadTest, cls).skip_checks()
+        if not CONF.share.run_load_benchmark_tests:
+            raise cls.skipException("Load benchmark tests are disabled.")
+        if not CONF.auth.use_dynamic_credentials:
+            raise cls.skipException(
+                "Load benchmark tests need dynamic credentials.")
+        if cls.protocol not in CONF.share.enable_protocols:
+            raise cls.skipException("%s tests are disabled." % cls.protocol)
+
+    @classmethod
+    def resource_setup(cls):
+        super(MultiTenantLoadTest, cls).resource_setup()
+        cls.mix = cls._get_operation_mix()
+        cls.share_type = cls._create_share_type()
+        if 'replica' in cls.mix:
+            cls.replication_share_type = cls._create_share_type(
+                {"replication_type": CONF.share.backend_replication_type})
+            zones = cls.get_availability_zones_matching_share_type(
+                cls.replication_share_type)
+            cls.share_zone, cls.replica_zone = zones[0], zones[-1]
+
+    @classmethod
+    def _get_operation_mix(cls):
+        """Returns the weights of the operations which can be run."""
+        supported = {
+            'share': True,
+            'snapshot': (CONF.share.run_snapshot_tests and
+                         CONF.share.capability_snapshot_support),
+            'access_rule': (
+                cls.protocol in CONF.share.enable_ip_rules_for_protocols),
+            'replica': (
+                CONF.share.run_replication_tests and
+                CONF.share.backend_replication_type != 'none' and
+                utils.is_microversion_supported(
+                    _MIN_REPLICATION_MICROVERSION)),
+        }
+        mix = {}
+        for operation, weight in CONF.share.load_benchmark_mix.items():
+            if operation not in supported:
+                raise cls.skipException(
+                    "Unknown load benchmark operation %s." % operation)
+            if not supported[operation]:
+                LOG.warning("Leaving %s operations out of the load "
+                            "benchmark, they are disabled.", operation)
+            elif float(weight) > 0:
+                mix[operation] = float(weight)
+        if not mix:
+            raise cls.skipException("No load benchmark operation enabled.")
+        return mix
+
+    def _register(self, resource_type, resource_id, client, **kwargs):
+        resource = {"type": resource_type, "id": resource_id,
+                    "client": client}
+        resource.update(kwargs)
+        self.method_resources.insert(0, resource)
+        return resource
+
+    def _create_tenants(self):
+        clients = utils.run_concurrently(
+            lambda index: self.get_client_with_isolated_creds(
+                name='load-tenant-%d' % index, type_of_creds='primary',
+                client_version='2'),
+            [(i, ) for i in range(CONF.share.load_benchmark_tenants)])
+        # NOTE: the shares are deleted with the test, before the tenants
+        # they belong to.
+        share_data = [{'kwargs': {'client': client,
+                                  'share_type_id': self.share_type['id'],
+                                  'cleanup_in_class': False}}
+                      for client in clients]
+        if 'replica' in self.mix:
+            share_data.extend(
+                {'kwargs': {'client': client,
+                            'share_type_id': self.replication_share_type['id'],
+                            'availability_zone': self.share_zone,
+                            'cleanup_in_class': False}}
+                for client in clients)
+        shares = self.create_shares(share_data)
+        tenants = []
+        for index, client in enumerate(clients):
+            tenant = {'client': client, 'share': shares[index]}
+            if 'replica' in self.mix:
+                tenant['replicated_share'] = shares[len(clients) + index]
+            tenants.append(tenant)
+        return tenants
+
+    def _share(self, tenant, recorder):
+        client = tenant['client']
+        with recorder.measure('create_share'):
+            share = client.create_share(
+                share_protocol=self.protocol, size=CONF.share.share_size,
+                share_type_id=self.share_type['id'],
+                share_network_id=client.share_network_id)
+            resource = self._register("share", share['id'], client)
+            client.wait_for_share_status(share['id'],
+                                         constants.STATUS_AVAILABLE)
+        with recorder.measure('delete_share'):
+            client.delete_share(share['id'])
+            client.wait_for_resource_deletion(share_id=share['id'])
+        resource['deleted'] = True
+
+    def _snapshot(self, tenant, recorder):
+        client = tenant['client']
+        with recorder.measure('create_snapshot'):
+            snapshot = client.create_snapshot(tenant['share']['id'])
+            resource = self._register("snapshot", snapshot['id'], client)
+            client.wait_for_snapshot_status(snapshot['id'],
+                                            constants.STATUS_AVAILABLE)
+        with recorder.measure('delete_snapshot'):
+            client.delete_snapshot(snapshot['id'])
+            client.wait_for_resource_deletion(snapshot_id=snapshot['id'])
+        resource['deleted'] = True
+
+    def _access_rule(self, tenant, recorder):
+        client = tenant['client']
+        share_id = tenant['share']['id']
+        with recorder.measure('create_access_rule'):
+            rule = client.create_access_rule(
+                share_id, "ip", '10.%d.%d.%d' % tuple(
+                    random.randint(1, 254) for _ in range(3)))
+            resource = self._register(
+                "access_rule", rule['id'], client, share_id=share_id)
+            client.wait_for_access_rule_status(
+                share_id, rule['id'], constants.RULE_STATE_ACTIVE)
+        with recorder.measure('delete_access_rule'):
+            client.delete_access_rule(share_id, rule['id'])
+            client.wait_for_resource_deletion(
+                rule_id=rule['id'], share_id=share_id)
+        resource['deleted'] = True
+
+    def _replica(self, tenant, recorder):
+        client = tenant['client']
+        with recorder.measure('create_share_replica'):
+            replica = client.create_share_replica(
+                tenant['replicated_share']['id'], self.replica_zone)
+            resource = self._register("share_replica", replica['id'], client)
+            client.wait_for_share_replica_status(
+                replica['id'], constants.STATUS_AVAILABLE)
+        with recorder.measure('delete_share_replica'):
+            client.delete_share_replica(replica['id'])
+            client.wait_for_resource_deletion(replica_id=replica['id'])
+        resource['deleted'] = True
+
+    def _worker(self, tenant, recorder, deadline, counter):
+        operations = sorted(self.mix)
+        weights = [self.mix[operation] for operation in operations]
+        limit = CONF.share.load_benchmark_operations
+        while time.time() < deadline and not (
+                limit and next(counter) >= limit):
+            pick = random.uniform(0, sum(weights))
+            for operation, weight in zip(operations, weights):
+                pick -= weight
+                if pick <= 0:
+                    break
+            try:
+                getattr(self, '_%s' % operation)(tenant, recorder)
+            except Exception:
+                LOG.exception("Load benchmark %s operation failed.",
+                              operation)
+
+    @tc.attr(base.TAG_POSITIVE, base.TAG_API_WITH_BACKEND)
+    def test_multi_tenant_load(self):
+        tenants = self._create_tenants()
+        workers = CONF.share.load_benchmark_workers_per_tenant
+        recorder = benchmark.LoadRecorder(CONF.share.load_benchmark_interval)
+        start = time.time()
+        deadline = start + CONF.share.load_benchmark_duration
+        counter = itertools.count()
+        utils.run_concurrently(
+            self._worker,
+            [(tenant, recorder, deadline, counter)
+             for tenant in tenants for _ in range(workers)])
+
+        report = {
+            'protocol': self.protocol,
+            'tenants': len(tenants),
+            'workers_per_tenant': workers,
+            'duration': time.time() - start,
+            'mix': self.mix,
+            'operations': recorder.summary(),
+            'timeline': recorder.timeline(),
+        }
+        benchmark.write_report(
+            'load', '%s-%dx%d' % (self.protocol, len(tenants), workers),
+            report)
@@ -0,0 +1,176 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from tempest import config
+from testtools import testcase as tc
+
+from manila_tempest_tests.common import benchmark
+from manila_tempest_tests.common import constants
+from manila_tempest_tests.tests.api import base
+from manila_tempest_tests import utils
+
+CONF = config.CONF
+
+
+class ShareLifecycleLatencyTest(base.BaseSharesMixedTest):
+    """Measures the latency of the share lifecycle operations.
+
+    Every worker repeatedly creates a share, snapshots, extends and shrinks
+    it, grants access to it, reverts it to its snapshot and deletes it all,
+    each operation being timed from its request until the resource reaches
+    its final state. The workers run in parallel, at every configured
+    concurrency level, and the latency percentiles of every operation and
+    level are reported as JSON.
+    """
+
+    protocol = "nfs"
+
+    @classmethod
+    def skip_checks(cls):
+        super(ShareLifecycleLatencyTest, cls).skip_checks()
+        if not CONF.share.run_latency_benchmark_tests:
+            raise cls.skipException("Latency benchmark tests are disabled.")
+        if cls.protocol not in CONF.share.enable_protocols:
+            raise cls.skipException("%s tests are disabled." % cls.protocol)
+
+    @classmethod
+    def resource_setup(cls):
+        super(ShareLifecycleLatencyTest, cls).resource_setup()
+        cls.run_snapshots = (CONF.share.run_snapshot_tests and
+                             CONF.share.capability_snapshot_support)
+        cls.run_revert = (
+            cls.run_snapshots and CONF.share.run_revert_to_snapshot_tests and
+            utils.is_microversion_supported(
+                constants.REVERT_TO_SNAPSHOT_MICROVERSION))
+        extra_specs = {}
+        if cls.run_revert:
+            extra_specs[constants.REVERT_TO_SNAPSHOT_SUPPORT] = True
+        cls.share_type = cls._create_share_type(extra_specs)
+        cls.share_size = CONF.share.share_size
+        cls.access_type, cls.access_to = cls._get_access_rule_data()
+
+    @classmethod
+    def _get_access_rule_data(cls):
+        if cls.protocol in CONF.share.enable_ip_rules_for_protocols:
+            return "ip", "10.0.0.1"
+        if cls.protocol in CONF.share.enable_user_rules_for_protocols:
+            return "user", CONF.share.username_for_user_rules
+        return None, None
+
+    def _register(self, resource_type, resource_id):
+        resource = {"type": resource_type, "id": resource_id,
+                    "client": self.shares_v2_client}
+        self.method_resources.insert(0, resource)
+        return resource
+
+    def _lifecycle(self, recorder):
+        """Runs one share lifecycle, recording the latency of every step."""
+        client = self.shares_v2_client
+        size = self.share_size
+
+        # NOTE: resources are registered for cleanup as soon as they are
+        # requested, as they may never become available under load.
+        with recorder.measure('create_share'):
+            share = client.create_share(
+                share_protocol=self.protocol, size=size,
+                share_type_id=self.share_type['id'],
+                share_network_id=client.share_network_id)
+            share_resource = self._register("share", share['id'])
+            client.wait_for_share_status(share['id'],
+                                         constants.STATUS_AVAILABLE)
+        if not self.backends:
+            self.backends.append(self.admin_shares_v2_client.get_share(
+                share['id'])['host'].split('#')[0])
+
+        snapshot = snapshot_resource = None
+        if self.run_snapshots:
+            with recorder.measure('create_snapshot'):
+                snapshot = client.create_snapshot(share['id'])
+                snapshot_resource = self._register("snapshot",
+                                                   snapshot['id'])
+                client.wait_for_snapshot_status(snapshot['id'],
+                                                constants.STATUS_AVAILABLE)
+
+        if CONF.share.run_extend_tests:
+            with recorder.measure('extend_share'):
+                client.extend_share(share['id'], size + 1)
+                client.wait_for_share_status(share['id'],
+                                             constants.STATUS_AVAILABLE)
+            if CONF.share.run_shrink_tests:
+                with recorder.measure('shrink_share'):
+                    client.shrink_share(share['id'], size)
+                    client.wait_for_share_status(share['id'],
+                                                 constants.STATUS_AVAILABLE)
+
+        if self.access_type:
+            with recorder.measure('create_access_rule'):
+                rule = client.create_access_rule(
+                    share['id'], self.access_type, self.access_to)
+                client.wait_for_access_rule_status(
+                    share['id'], rule['id'], constants.RULE_STATE_ACTIVE)
+
+        if self.run_revert:
+            with recorder.measure('revert_to_snapshot'):
+                client.revert_to_snapshot(share['id'], snapshot['id'])
+                client.wait_for_share_status(share['id'],
+                                             constants.STATUS_AVAILABLE)
+
+        if snapshot:
+            with recorder.measure('delete_snapshot'):
+                client.delete_snapshot(snapshot['id'])
+                client.wait_for_resource_deletion(snapshot_id=snapshot['id'])
+            snapshot_resource['deleted'] = True
+
+        with recorder.measure('delete_share'):
+            client.delete_share(share['id'])
+            client.wait_for_resource_deletion(share_id=share['id'])
+        share_resource['deleted'] = True
+
+    def _worker(self, recorder, iterations):
+        for _ in range(iterations):
+            self._lifecycle(recorder)
+
+    @tc.attr(base.TAG_POSITIVE, base.TAG_API_WITH_BACKEND)
+    def test_share_lifecycle_latency(self):
+        iterations = CONF.share.latency_benchmark_iterations
+        self.backends = []
+        levels = {}
+        for concurrency in [int(c) for c in
+                            CONF.share.latency_benchmark_concurrency]:
+            recorder = benchmark.LatencyRecorder()
+            start = time.time()
+            utils.run_concurrently(
+                self._worker, [(recorder, iterations)] * concurrency)
+            duration = time.time() - start
+            levels[str(concurrency)] = {
+                'duration': duration,
+                'lifecycles_per_s': concurrency * iterations / duration,
+                'operations': recorder.summary(),
+            }
+
+        # NOTE: the share type has a random name, the backend identifies
+        # the reports of successive runs instead.
+        backend = self.backends[0] if self.backends else 'unknown'
+        report = {
+            'protocol': self.protocol,
+            'backend': backend,
+            'share_type': self.share_type['name'],
+            'share_size': self.share_size,
+            'microversion': CONF.share.max_api_microversion,
+            'iterations': iterations,
+            'concurrency': levels,
+        }
+        benchmark.write_report(
+            'latency', '%s-%s' % (self.protocol, backend),
+            report)
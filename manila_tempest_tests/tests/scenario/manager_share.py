@@ -15,9 +15,9 @@
 
 from oslo_log import log
 import six
-from six.moves.urllib.request import urlopen
 
 from manila_tempest_tests.common import constants
+from manila_tempest_tests.common import image_cache
 from manila_tempest_tests.common import remote_client
 from manila_tempest_tests.tests.api import base
 from manila_tempest_tests.tests.scenario import manager
@@ -29,8 +29,6 @@ from tempest.lib.common.utils import data_utils
 from tempest.lib.common.utils import test_utils
 from tempest.lib import exceptions
 
-from tempfile import mkstemp
-
 CONF = config.CONF
 LOG = log.getLogger(__name__)
 
@@ -84,7 +82,7 @@ class ShareScenarioTest(manager.NetworkScenarioTest):
             self.flavor_ref = CONF.share.client_vm_flavor_ref
 
         if CONF.share.image_with_share_tools == 'centos':
-            self.image_ref = self._create_centos_based_glance_image()
+            self.image_id = self._create_centos_based_glance_image()
         elif CONF.share.image_with_share_tools:
             images = self.compute_images_client.list_images()["images"]
             for img in images:
@@ -132,19 +130,52 @@ class ShareScenarioTest(manager.NetworkScenarioTest):
         return share_network
 
     def boot_instance(self, wait_until="ACTIVE"):
+        return self.boot_instances(1, wait_until=wait_until)[0]
+
+    def boot_instances(self, count, wait_until="ACTIVE"):
+        """Boots several instances at once, sharing a keypair.
+
+        All the instances are requested before waiting for any of them, so
+        that they boot concurrently.
+        """
         self.keypair = self.create_keypair()
         security_groups = [{'name': self.security_group['name']}]
         create_kwargs = {
             'key_name': self.keypair['name'],
             'security_groups': security_groups,
-            'wait_until': wait_until,
+            'wait_until': "BUILD",
             'networks': [{'uuid': self.network['id']}, ],
         }
-        instance = self.create_server(
-            image_id=self.image_id, flavor=self.flavor_ref, **create_kwargs)
-        return instance
+        instances = [
+            self.create_server(
+                image_id=self.image_id, flavor=self.flavor_ref,
+                **create_kwargs)
+            for i in range(count)]
+        if wait_until == "BUILD":
+            return instances
+        servers_client = self.os_primary.servers_client
+        for instance in instances:
+            waiters.wait_for_server_status(
+                servers_client, instance['id'], wait_until)
+        return [servers_client.show_server(instance['id'])['server']
+                for instance in instances]
 
     def init_remote_client(self, instance):
+        return self.init_remote_clients([instance])[0]
+
+    def init_remote_clients(self, instances):
+        """Returns SSH clients to several instances, set up in parallel.
+
+        Floating IPs are associated to the instances and their SSH servers
+        are awaited concurrently, instead of one instance after the other.
+        """
+        remote_clients = utils.run_concurrently(
+            self._init_remote_client,
+            [(instance, ) for instance in instances])
+        self.share = self.shares_client.get_share(self.share['id'])
+        return remote_clients
+
+    def _init_remote_client(self, instance):
         if self.ipv6_enabled:
             server_ip = self._get_ipv6_server_ip(instance)
         else:
@@ -168,11 +199,15 @@ class ShareScenarioTest(manager.NetworkScenarioTest):
             username=self.ssh_user,
             private_key=self.keypair['private_key'])
 
+        if hasattr(remote_client, 'close'):
+            self.addCleanup(remote_client.close)
+
         # NOTE(u_glide): Workaround for bug #1465682
-        remote_client = remote_client.ssh_client
+        return remote_client.ssh_client
 
-        self.share = self.shares_client.get_share(self.share['id'])
-        return remote_client
+    def exec_commands(self, ssh_client, commands):
+        """Runs several commands on a VM in a single SSH round trip."""
+        return remote_client.exec_commands(ssh_client, commands)
 
     def write_data_to_mounted_share(self, escaped_string, remote_client,
                                     mount_point='/mnt/t1'):
@@ -534,20 +569,35 @@ class ShareScenarioTest(manager.NetworkScenarioTest):
                         share_type['share_type']['id'])
         return share_type
 
+    def _find_glance_image(self, checksum, owner):
+        """Returns the id of an active image of 'owner' with 'checksum'."""
+        if CONF.image_feature_enabled.api_v1:
+            images = self.image_client.list_images(
+                detail=True, checksum=checksum)['images']
+        else:
+            # Community images are only listed when asked for.
+            images = []
+            for params in ({'checksum': checksum, 'owner': owner},
+                           {'checksum': checksum, 'owner': owner,
+                            'visibility': 'community'}):
+                images.extend(
+                    self.image_client.list_images(params=params)['images'])
+        for image in images:
+            if (image.get('checksum') == checksum and
+                    image.get('owner') == owner and
+                    image['status'] == 'active'):
+                return image['id']
+
     def _create_centos_based_glance_image(self):
-        imagepath = mkstemp(suffix='.qcow2')[1]
-        imagefile = open(imagepath, 'wb+')
-        image_response = urlopen('http://cloud.centos.org/centos/7/images/' +
-                                 'CentOS-7-x86_64-GenericCloud.qcow2')
-
-        LOG.info('Downloading CentOS7 image')
-        while True:
-            imagecopy = image_response.read(100 * 1024 * 1024)
-            if imagecopy == '':
-                break
-            imagefile.write(imagecopy)
-
-        imagefile.close()
+        imagepath, checksum = image_cache.get_cache().fetch(
+            CONF.share.centos_image_url, CONF.share.centos_image_checksum)
+
+        owner = CONF.share.centos_image_owner
+        if owner:
+            image_id = self._find_glance_image(checksum, owner)
+            if image_id:
+                LOG.info('Reusing Glance image %s', image_id)
+                return image_id
 
         LOG.info('Creating Glance image using the downloaded image file')
         return self._image_create('centos', 'bare', imagepath, 'qcow2')
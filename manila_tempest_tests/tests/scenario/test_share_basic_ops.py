@@ -150,15 +150,15 @@ class ShareBasicOpsBase(manager.ShareScenarioTest):
         test_data = "Some test data to write"
 
         # Boot two VMs and create share
-        instance1 = self.boot_instance(wait_until="BUILD")
-        instance2 = self.boot_instance(wait_until="BUILD")
+        instance1, instance2 = self.boot_instances(2, wait_until="BUILD")
         self.create_share()
         location = self._get_user_export_locations(self.share)[0]
         instance1 = self.wait_for_active_instance(instance1["id"])
         instance2 = self.wait_for_active_instance(instance2["id"])
+        remote_client_inst1, remote_client_inst2 = self.init_remote_clients(
+            [instance1, instance2])
 
         # Write data to first VM
-        remote_client_inst1 = self.init_remote_client(instance1)
         self.provide_access_to_auxiliary_instance(instance1)
 
         self.mount_share(location, remote_client_inst1)
@@ -167,7 +167,6 @@ class ShareBasicOpsBase(manager.ShareScenarioTest):
         self.write_data_to_mounted_share(test_data, remote_client_inst1)
 
         # Read from second VM
-        remote_client_inst2 = self.init_remote_client(instance2)
         if not CONF.share.override_ip_for_nfs_access or self.ipv6_enabled:
             self.provide_access_to_auxiliary_instance(instance2)
 
@@ -230,24 +229,21 @@ class ShareBasicOpsBase(manager.ShareScenarioTest):
 
         self.mount_share(exports[0], remote_client)
 
-        remote_client.exec_command("sudo mkdir -p /mnt/f1")
-        remote_client.exec_command("sudo mkdir -p /mnt/f2")
-        remote_client.exec_command("sudo mkdir -p /mnt/f3")
-        remote_client.exec_command("sudo mkdir -p /mnt/f4")
-        remote_client.exec_command("sudo mkdir -p /mnt/f1/ff1")
-        remote_client.exec_command("sleep 1")
-        remote_client.exec_command(
-            "sudo dd if=/dev/zero of=/mnt/f1/1m1.bin bs=1M count=1")
-        remote_client.exec_command(
-            "sudo dd if=/dev/zero of=/mnt/f2/1m2.bin bs=1M count=1")
-        remote_client.exec_command(
-            "sudo dd if=/dev/zero of=/mnt/f3/1m3.bin bs=1M count=1")
-        remote_client.exec_command(
-            "sudo dd if=/dev/zero of=/mnt/f4/1m4.bin bs=1M count=1")
-        remote_client.exec_command(
-            "sudo dd if=/dev/zero of=/mnt/f1/ff1/1m5.bin bs=1M count=1")
-        remote_client.exec_command("sudo chmod -R 555 /mnt/f3")
-        remote_client.exec_command("sudo chmod -R 777 /mnt/f4")
+        self.exec_commands(remote_client, [
+            "sudo mkdir -p /mnt/f1",
+            "sudo mkdir -p /mnt/f2",
+            "sudo mkdir -p /mnt/f3",
+            "sudo mkdir -p /mnt/f4",
+            "sudo mkdir -p /mnt/f1/ff1",
+            "sleep 1",
+            "sudo dd if=/dev/zero of=/mnt/f1/1m1.bin bs=1M count=1",
+            "sudo dd if=/dev/zero of=/mnt/f2/1m2.bin bs=1M count=1",
+            "sudo dd if=/dev/zero of=/mnt/f3/1m3.bin bs=1M count=1",
+            "sudo dd if=/dev/zero of=/mnt/f4/1m4.bin bs=1M count=1",
+            "sudo dd if=/dev/zero of=/mnt/f1/ff1/1m5.bin bs=1M count=1",
+            "sudo chmod -R 555 /mnt/f3",
+            "sudo chmod -R 777 /mnt/f4",
+        ])
 
         task_state = (constants.TASK_STATE_DATA_COPYING_COMPLETED
                       if force_host_assisted
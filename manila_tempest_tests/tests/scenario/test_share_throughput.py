@@ -0,0 +1,256 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import math
+
+from oslo_log import log as logging
+from oslo_utils import units
+from tempest import config
+from testtools import testcase as tc
+
+from manila_tempest_tests.common import benchmark
+from manila_tempest_tests.tests.api import base
+from manila_tempest_tests.tests.scenario import manager_share as manager
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+BENCH_DIR = '/mnt/bench'
+SOURCE_FILE = '/tmp/bench-source'
+
+
+class ShareThroughputBase(manager.ShareScenarioTest):
+
+    """Measures the data-plane performance of a share from a guest VM.
+
+    The flow is:
+
+     * Launch an instance
+     * Create a share big enough for all the parallel streams
+     * Configure RW access to the share and mount it
+     * For every block size and number of parallel streams:
+        * write and read files sequentially with dd
+        * write and read files randomly with fio, if the image has it
+     * Create, stat and delete many small files
+     * Report the throughput, IOPS and metadata operation rates, per
+       backend and share type
+     * Unmount share, delete share, terminate the instance
+    """
+
+    # Runtime in seconds of every random I/O measurement.
+    random_io_runtime = 20
+    # Whether fio bypasses the page cache of the guest.
+    direct_io = True
+
+    @classmethod
+    def skip_checks(cls):
+        super(ShareThroughputBase, cls).skip_checks()
+        if not CONF.share.run_throughput_benchmark_tests:
+            raise cls.skipException("Throughput benchmark tests are disabled.")
+
+    def _timed(self, remote_client, command):
+        """Runs 'command' as root on the VM, returns its duration in s."""
+        output = remote_client.exec_command(
+            "sudo sh -c 'start=$(date +%%s%%N); %s; end=$(date +%%s%%N); "
+            "echo $((end - start))'" % command)
+        return int(output.strip().splitlines()[-1]) / 1e9
+
+    @staticmethod
+    def _parallel(commands):
+        """Returns a shell command running 'commands' in parallel."""
+        return ('pids=""; ' +
+                ' '.join('%s & pids="$pids $!";' % c for c in commands) +
+                ' for p in $pids; do wait $p || exit 1; done')
+
+    def _drop_caches(self, remote_client):
+        remote_client.exec_command(
+            "sudo sh -c 'sync; echo 3 > /proc/sys/vm/drop_caches'")
+
+    def _result(self, operation, block_size, streams, total_bytes, seconds,
+                ops=None):
+        if ops is None:
+            ops = total_bytes / block_size
+        return {
+            'operation': operation,
+            'block_size': block_size,
+            'streams': streams,
+            'bytes': total_bytes,
+            'seconds': seconds,
+            'throughput_mib_s': total_bytes / float(units.Mi) / seconds,
+            'iops': ops / seconds,
+        }
+
+    def _sequential(self, remote_client, block_size, streams):
+        file_size = CONF.share.throughput_benchmark_file_size * units.Mi
+        count = file_size // block_size
+        total_bytes = count * block_size * streams
+        files = ['%s/seq%d' % (BENCH_DIR, i) for i in range(streams)]
+
+        write = self._timed(remote_client, self._parallel([
+            'dd if=%s of=%s bs=%d count=%d conv=fsync 2>/dev/null' % (
+                SOURCE_FILE, f, block_size, count) for f in files]))
+        self._drop_caches(remote_client)
+        read = self._timed(remote_client, self._parallel([
+            'dd if=%s of=/dev/null bs=%d 2>/dev/null' % (f, block_size)
+            for f in files]))
+        remote_client.exec_command("sudo rm -f %s" % ' '.join(files))
+        return [
+            self._result('write', block_size, streams, total_bytes, write),
+            self._result('read', block_size, streams, total_bytes, read),
+        ]
+
+    def _random(self, remote_client, block_size, streams):
+        results = []
+        for operation in ('randwrite', 'randread'):
+            self._drop_caches(remote_client)
+            output = remote_client.exec_command(
+                "sudo fio --name=rand --directory=%(dir)s --rw=%(op)s "
+                "--bs=%(bs)d --size=%(size)dM --numjobs=%(streams)d "
+                "--direct=%(direct)d --ioengine=psync --time_based "
+                "--runtime=%(runtime)d --group_reporting "
+                "--output-format=json" % {
+                    'dir': BENCH_DIR, 'op': operation, 'bs': block_size,
+                    'size': CONF.share.throughput_benchmark_file_size,
+                    'streams': streams, 'direct': int(self.direct_io),
+                    'runtime': self.random_io_runtime})
+            # NOTE: fio may print warnings before its JSON output.
+            job = json.loads(output[output.index('{'):])['jobs'][0]
+            stats = job['write' if operation == 'randwrite' else 'read']
+            runtime = stats['runtime'] / 1000.0
+            results.append(self._result(
+                operation, block_size, streams, stats['io_bytes'],
+                runtime, ops=stats['total_ios']))
+        remote_client.exec_command("sudo rm -f %s/rand.*" % BENCH_DIR)
+        return results
+
+    def _metadata(self, remote_client):
+        count = CONF.share.throughput_benchmark_small_files
+        directory = '%s/meta' % BENCH_DIR
+        remote_client.exec_command("sudo mkdir -p %s" % directory)
+        loop = ('i=0; while [ $i -lt %d ]; do %%s %s/f$i; i=$((i + 1)); '
+                'done' % (count, directory))
+        rates = {'files': count}
+        for operation, command in (('create', ': >'),
+                                   ('stat', 'stat -t >/dev/null'),
+                                   ('unlink', 'rm')):
+            seconds = self._timed(remote_client, loop % command)
+            rates['%s_per_s' % operation] = count / seconds
+        return rates
+
+    @tc.attr(base.TAG_POSITIVE, base.TAG_BACKEND)
+    def test_throughput(self):
+        block_sizes = [int(b) for b in
+                       CONF.share.throughput_benchmark_block_sizes]
+        streams_list = [int(s) for s in
+                        CONF.share.throughput_benchmark_streams]
+        needed_gb = int(math.ceil(
+            max(streams_list) * CONF.share.throughput_benchmark_file_size /
+            float(units.Ki)))
+        share_size = max(CONF.share.share_size, needed_gb + 1)
+
+        LOG.debug('Step 1 - create instance')
+        instance = self.boot_instance(wait_until="BUILD")
+
+        LOG.debug('Step 2 - create share of size %s Gb', share_size)
+        share_type = self.get_share_type()
+        share = self.create_share(size=share_size,
+                                  share_type_id=share_type['id'])
+
+        LOG.debug('Step 3 - wait for active instance')
+        instance = self.wait_for_active_instance(instance["id"])
+        remote_client = self.init_remote_client(instance)
+
+        LOG.debug('Step 4 - grant access and mount')
+        self.provide_access_to_auxiliary_instance(instance, share=share)
+        locations = self.get_share_export_locations(share)
+        self.mount_share(locations[0], remote_client)
+        has_fio = remote_client.exec_command(
+            "command -v fio || true").strip()
+        self.exec_commands(remote_client, [
+            "sudo mkdir -p %s" % BENCH_DIR,
+            "dd if=/dev/urandom of=%s bs=%d count=%d 2>/dev/null" % (
+                SOURCE_FILE, units.Mi,
+                CONF.share.throughput_benchmark_file_size),
+        ])
+
+        LOG.debug('Step 5 - sequential and random I/O')
+        sequential, random = [], []
+        for block_size in block_sizes:
+            for streams in streams_list:
+                sequential.extend(
+                    self._sequential(remote_client, block_size, streams))
+                if has_fio:
+                    random.extend(
+                        self._random(remote_client, block_size, streams))
+
+        LOG.debug('Step 6 - metadata operations')
+        metadata = self._metadata(remote_client)
+
+        LOG.debug('Step 7 - report')
+        backend = self.shares_admin_v2_client.get_share(
+            share['id'])['host'].split('#')[0]
+        report = {
+            'protocol': self.protocol,
+            'backend': backend,
+            'share_type': share_type['name'],
+            'share_size': share_size,
+            'file_size_mib': CONF.share.throughput_benchmark_file_size,
+            'sequential': sequential,
+            'random': random,
+            'metadata': metadata,
+        }
+        if not has_fio:
+            report['random_skipped'] = 'fio is not installed on the image'
+        benchmark.write_report(
+            'throughput', '%s-%s-%s' % (
+                self.protocol, backend, share_type['name']), report)
+
+        LOG.debug('Step 8 - unmount')
+        remote_client.exec_command("sudo rm -rf %s" % BENCH_DIR)
+        self.unmount_share(remote_client)
+
+
+class TestShareThroughputNFS(ShareThroughputBase):
+    protocol = "nfs"
+
+    def mount_share(self, location, remote_client, target_dir=None):
+        target_dir = target_dir or "/mnt"
+        remote_client.exec_command(
+            "sudo mount -vt nfs \"%s\" %s" % (location, target_dir)
+        )
+
+
+class TestShareThroughputCIFS(ShareThroughputBase):
+    protocol = "cifs"
+    # NOTE: O_DIRECT is only supported on CIFS mounts with cache=none.
+    direct_io = False
+
+    def mount_share(self, location, remote_client, target_dir=None):
+        location = location.replace("\\", "/")
+        target_dir = target_dir or "/mnt"
+        remote_client.exec_command(
+            "sudo mount.cifs \"%s\" %s -o guest" % (location, target_dir)
+        )
+
+
+# NOTE(u_glide): this function is required to exclude ShareThroughputBase
+# from executed test cases.
+# See: https://docs.python.org/2/library/unittest.html#load-tests-protocol
+# for details.
+def load_tests(loader, tests, _):
+    result = []
+    for test_case in tests:
+        if type(test_case._tests[0]) is ShareThroughputBase:
+            continue
+        result.append(test_case)
+    return loader.suiteClass(result)
@@ -0,0 +1,53 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+import testtools
+
+from manila_tempest_tests.common import events
+
+
+class EventSourceTest(testtools.TestCase):
+
+    def setUp(self):
+        super(EventSourceTest, self).setUp()
+        self.source = events.LocalEventSource()
+
+    def _publish_later(self, resource_id):
+        timer = threading.Timer(
+            0.1, self.source.publish, args=('share', resource_id))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def test_wait_ended_by_event(self):
+        version = self.source.version(['awaited'])
+        self._publish_later('awaited')
+
+        start = time.time()
+        self.assertTrue(self.source.wait(['awaited'], version, 5))
+        self.assertLess(time.time() - start, 5)
+
+    def test_wait_not_ended_by_unrelated_event(self):
+        version = self.source.version(['awaited'])
+        self._publish_later('unrelated')
+
+        start = time.time()
+        self.assertFalse(self.source.wait(['awaited'], version, 0.5))
+        self.assertGreaterEqual(time.time() - start, 0.45)
+
+    def test_wait_ended_by_event_received_before(self):
+        version = self.source.version(['awaited'])
+        self.source.publish('share', 'awaited')
+
+        self.assertTrue(self.source.wait(['awaited'], version, 0))
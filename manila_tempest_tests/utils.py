@@ -13,9 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import functools
 from netaddr import ip
 import random
 import re
+import sys
+import threading
 
 import six
 from tempest import config
@@ -24,17 +28,80 @@ import testtools
 CONF = config.CONF
 
 
-def get_microversion_as_tuple(microversion_str):
-    """Transforms string-like microversion to two-value tuple of integers.
+MICROVERSION_REGEX = re.compile(r"^([1-9]\d*)\.([1-9]\d*|0)$")
+MICROVERSION_CACHE_SIZE = 128
+
 
-    Tuple of integers useful for microversion comparisons.
+def _lru_cache(maxsize=MICROVERSION_CACHE_SIZE):
+    """Memoizes a function of hashable positional arguments.
+
+    Minimal replacement of functools.lru_cache, which is not available on
+    python 2.7. Once 'maxsize' results are cached, the least recently used
+    one is dropped.
+    """
+    def decorator(func):
+        cache = collections.OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            with lock:
+                try:
+                    result = cache.pop(args)
+                except KeyError:
+                    pass
+                else:
+                    cache[args] = result
+                    return result
+            result = func(*args)
+            with lock:
+                cache[args] = result
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+lru_cache = getattr(functools, 'lru_cache', _lru_cache)
+
+
+class MicroVersion(collections.namedtuple('MicroVersion', 'major minor')):
+    """Parsed microversion, comparable with other MicroVersion objects.
+
+    Its string form is the 'x.y' one expected by the API, so it can be passed
+    wherever a microversion string is, e.g. to the share clients.
     """
-    regex = r"^([1-9]\d*)\.([1-9]\d*|0)$"
-    match = re.match(regex, microversion_str)
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, microversion):
+        if isinstance(microversion, cls):
+            return microversion
+        return _parse_microversion(microversion)
+
+    def __str__(self):
+        return '%d.%d' % self
+
+
+@lru_cache(maxsize=MICROVERSION_CACHE_SIZE)
+def _parse_microversion(microversion_str):
+    match = MICROVERSION_REGEX.match(microversion_str)
     if not match:
         raise ValueError(
             "Microversion does not fit template 'x.y' - %s" % microversion_str)
-    return int(match.group(1)), int(match.group(2))
+    return MicroVersion(int(match.group(1)), int(match.group(2)))
+
+
+def get_microversion_as_tuple(microversion_str):
+    """Transforms string-like microversion to two-value tuple of integers.
+
+    Tuple of integers useful for microversion comparisons. Results are
+    cached, and MicroVersion objects are returned as they are.
+    """
+    return MicroVersion.parse(microversion_str)
 
 
 def is_microversion_gt(left, right):
@@ -68,16 +135,18 @@ def is_microversion_lt(left, right):
 
 
 def is_microversion_supported(microversion):
-    bottom = get_microversion_as_tuple(CONF.share.min_api_microversion)
+    share_conf = CONF.share
+    bottom = get_microversion_as_tuple(share_conf.min_api_microversion)
     microversion = get_microversion_as_tuple(microversion)
-    top = get_microversion_as_tuple(CONF.share.max_api_microversion)
+    top = get_microversion_as_tuple(share_conf.max_api_microversion)
     return bottom <= microversion <= top
 
 
 def skip_if_microversion_not_supported(microversion):
     """Decorator for tests that are microversion-specific."""
     if not is_microversion_supported(microversion):
-        reason = ("Skipped. Test requires microversion '%s'." % microversion)
+        reason = ("Skipped. Test requires microversion '%s'." %
+                  (microversion, ))
         return testtools.skip(reason)
     return lambda f: f
 
@@ -86,7 +155,7 @@ def skip_if_microversion_lt(microversion):
     """Decorator for tests that are microversion-specific."""
     if is_microversion_lt(CONF.share.max_api_microversion, microversion):
         reason = ("Skipped. Test requires microversion greater than or "
-                  "equal to '%s'." % microversion)
+                  "equal to '%s'." % (microversion, ))
         return testtools.skip(reason)
     return lambda f: f
 
@@ -177,3 +246,33 @@ def skip_if_manage_not_supported_for_version(
         raise testtools.TestCase.skipException(
             "Share manage tests with multitenancy are disabled for "
             "microversion < 2.49")
+
+
+def run_concurrently(func, args_list):
+    """Calls 'func' with every tuple of 'args_list', each in its own thread.
+
+    :returns: list of the results, in the order of 'args_list'.
+    :raises: the exception of the first failed call, once all the calls
+        are over.
+    """
+    if len(args_list) == 1:
+        return [func(*args_list[0])]
+    results = [None] * len(args_list)
+    errors = [None] * len(args_list)
+
+    def run(index, args):
+        try:
+            results[index] = func(*args)
+        except Exception:
+            errors[index] = sys.exc_info()
+
+    threads = [threading.Thread(target=run, args=(index, args))
+               for index, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for error in errors:
+        if error is not None:
+            six.reraise(*error)
+    return results
@@ -0,0 +1,107 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Micro-benchmark of the microversion helpers of manila_tempest_tests.utils.
+
+Replays the microversion checks made while discovering the tests, i.e. the
+ones of the skip decorators evaluated at import time, with the uncached
+parser and with the cached one, and prints the time taken by both:
+
+    $ python tools/benchmark_microversions.py [--rounds N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+from tempest import config
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from manila_tempest_tests import config as config_share  # noqa
+from manila_tempest_tests import plugin  # noqa
+
+CONF = config.CONF
+
+
+def _uncached_as_tuple(microversion_str):
+    regex = r"^([1-9]\d*)\.([1-9]\d*|0)$"
+    match = re.match(regex, microversion_str)
+    if not match:
+        raise ValueError(
+            "Microversion does not fit template 'x.y' - %s" % microversion_str)
+    return int(match.group(1)), int(match.group(2))
+
+
+def _uncached_is_supported(microversion):
+    bottom = _uncached_as_tuple(CONF.share.min_api_microversion)
+    microversion = _uncached_as_tuple(microversion)
+    top = _uncached_as_tuple(CONF.share.max_api_microversion)
+    return bottom <= microversion <= top
+
+
+def _discovery_microversions():
+    """Returns the microversions the test modules check at import time."""
+    tests_dir = os.path.join(os.path.dirname(__file__), os.pardir,
+                             'manila_tempest_tests', 'tests')
+    pattern = re.compile(
+        r"(?:skip_if_microversion_\w+|is_microversion_\w+)\(\s*['\"]"
+        r"(\d+\.\d+)['\"]")
+    versions = []
+    for root, dirs, files in os.walk(tests_dir):
+        for name in files:
+            if name.endswith('.py'):
+                with open(os.path.join(root, name)) as f:
+                    versions.extend(pattern.findall(f.read()))
+    return versions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=200,
+                        help='Number of simulated test discoveries.')
+    args = parser.parse_args()
+
+    # NOTE: tempest registers the options of installed plugins only, and
+    # the utils module reads them at import time.
+    if config_share.share_group.name not in config._CONF:
+        plugin.ManilaTempestPlugin().register_opts(config._CONF)
+    from manila_tempest_tests import utils
+
+    versions = _discovery_microversions()
+    print("Microversion checks per discovery: %d" % len(versions))
+
+    latest = CONF.share.max_api_microversion
+    benchmarks = (
+        ('is_microversion_supported',
+         lambda version: _uncached_is_supported(version),
+         lambda version: utils.is_microversion_supported(version)),
+        ('is_microversion_lt',
+         lambda version: (
+             _uncached_as_tuple(latest) < _uncached_as_tuple(version)),
+         lambda version: utils.is_microversion_lt(latest, version)),
+    )
+    for name, uncached, cached in benchmarks:
+        baseline = timeit.timeit(
+            lambda: [uncached(v) for v in versions], number=args.rounds)
+        optimized = timeit.timeit(
+            lambda: [cached(v) for v in versions], number=args.rounds)
+        print("%s: uncached %.4fs, cached %.4fs, speedup %.1fx" % (
+            name, baseline, optimized, baseline / optimized))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the latency percentiles of two latency benchmark reports.
+
+The p50, p95 and p99 of every operation and concurrency level are printed
+for both reports, e.g. of two runs against different Manila releases, with
+the rows whose p95 regressed by more than the threshold flagged:
+
+    $ python tools/compare_benchmarks.py OLD.json NEW.json [--threshold 20]
+
+The exit code is 1 if any operation regressed.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+
+PERCENTILES = ('p50', 'p95', 'p99')
+
+
+def _rows(report):
+    rows = {}
+    for concurrency, level in report['concurrency'].items():
+        for operation, summary in level['operations'].items():
+            rows[(int(concurrency), operation)] = summary
+    return rows
+
+
+def _delta(old, new):
+    if not old:
+        return None
+    return 100.0 * (new - old) / old
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('old', help='Reference report.')
+    parser.add_argument('new', help='Compared report.')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='Increase of the p95, in percent, above which '
+                             'an operation is deemed regressed.')
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = _rows(json.load(f))
+    with open(args.new) as f:
+        new = _rows(json.load(f))
+
+    header = '%-4s %-20s %23s %23s %23s' % (
+        'conc', 'operation', 'p50 (s)', 'p95 (s)', 'p99 (s)')
+    print(header)
+    print('-' * len(header))
+    regressed = False
+    for key in sorted(set(old) & set(new)):
+        cells = []
+        for name in PERCENTILES:
+            delta = _delta(old[key][name], new[key][name])
+            cells.append('%7.2f %7.2f %7s' % (
+                old[key][name], new[key][name],
+                '-' if delta is None else '%+.0f%%' % delta))
+        delta = _delta(old[key]['p95'], new[key]['p95'])
+        flag = delta is not None and delta > args.threshold
+        regressed = regressed or flag
+        print('%-4d %-20s %s%s' % (key[0], key[1][:20], ' '.join(cells),
+                                   ' !' if flag else ''))
+    for key in sorted(set(old) ^ set(new)):
+        print('%-4d %-20s only in the %s report' % (
+            key[0], key[1][:20], 'old' if key in old else 'new'))
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the response sizes and latencies of two recorded runs.
+
+Requests are grouped by method and URL template, i.e. their URL with the
+ids replaced, and the mean response size and latency of every group is
+printed for both cassette directories, e.g. recorded against two Manila
+releases:
+
+    $ python tools/compare_cassettes.py OLD_DIR NEW_DIR [--sort latency]
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from manila_tempest_tests.common import cassette  # noqa
+from manila_tempest_tests.common import instrumentation  # noqa
+
+
+def _summarize(directory):
+    groups = collections.defaultdict(list)
+    for entry in cassette.load_entries(directory):
+        method, _, path = entry['signature'].partition(' ')
+        key = '%s %s' % (method, instrumentation.url_template(path))
+        groups[key].append(entry)
+    return dict(
+        (key, {
+            'count': len(entries),
+            'size': sum(e['response_size'] for e in entries) / len(entries),
+            'latency': sum(e['latency'] for e in entries) / len(entries),
+        }) for key, entries in groups.items())
+
+
+def _delta(old, new):
+    if not old:
+        return '-'
+    return '%+.0f%%' % (100.0 * (new - old) / old)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('old', help='Directory of the reference cassettes.')
+    parser.add_argument('new', help='Directory of the compared cassettes.')
+    parser.add_argument('--sort', choices=['name', 'size', 'latency'],
+                        default='name',
+                        help='Sort by name, or by decreasing change of the '
+                             'mean response size or latency.')
+    args = parser.parse_args()
+
+    old, new = _summarize(args.old), _summarize(args.new)
+    rows = []
+    for key in set(old) | set(new):
+        o = old.get(key, {'count': 0, 'size': 0, 'latency': 0})
+        n = new.get(key, {'count': 0, 'size': 0, 'latency': 0})
+        rows.append((key, o, n))
+    if args.sort == 'name':
+        rows.sort(key=lambda row: row[0])
+    else:
+        rows.sort(key=lambda row: abs(row[2][args.sort] - row[1][args.sort]),
+                  reverse=True)
+
+    header = '%-60s %13s %22s %22s' % (
+        'request', 'count', 'mean size (bytes)', 'mean latency (ms)')
+    print(header)
+    print('-' * len(header))
+    for key, o, n in rows:
+        print('%-60s %6d %6d %8d %6d %6s %7.1f %7.1f %6s' % (
+            key[:60], o['count'], n['count'], o['size'], n['size'],
+            _delta(o['size'], n['size']), 1000 * o['latency'],
+            1000 * n['latency'], _delta(o['latency'], n['latency'])))
+
+
+if __name__ == '__main__':
+    main()